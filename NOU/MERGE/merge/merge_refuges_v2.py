@@ -5,58 +5,30 @@ Script per unir dos fitxers JSON de refugis de manera intel·ligent
 Versió actualitzada amb description i remarque com a arrays
 """
 
-import json
-import math
-import re
+import os
+import sys
 from typing import Dict, List, Tuple, Any, Optional
 
-def normalize_name(name: str) -> str:
-    """Normalitza un nom per comparacions més flexibles"""
-    # Convertir a minúscules
-    normalized = name.lower()
-    # Eliminar accents i caràcters especials comuns
-    replacements = {
-        'à': 'a', 'á': 'a', 'â': 'a', 'ã': 'a', 'ä': 'a', 'å': 'a',
-        'è': 'e', 'é': 'e', 'ê': 'e', 'ë': 'e',
-        'ì': 'i', 'í': 'i', 'î': 'i', 'ï': 'i',
-        'ò': 'o', 'ó': 'o', 'ô': 'o', 'õ': 'o', 'ö': 'o',
-        'ù': 'u', 'ú': 'u', 'û': 'u', 'ü': 'u',
-        'ñ': 'n', 'ç': 'c'
-    }
-    
-    for old, new in replacements.items():
-        normalized = normalized.replace(old, new)
-    
-    # Eliminar articles i paraules comunes
-    words_to_remove = ['cabane', 'refuge', 'abri', 'refugi', 'refugio', 'cayolar', 'orri', 'orry']
-    for word in words_to_remove:
-        normalized = re.sub(rf'\b{word}\b', '', normalized)
-    
-    # Eliminar espais extra i caràcters especials
-    normalized = re.sub(r'[^a-z0-9\s]', '', normalized)
-    normalized = re.sub(r'\s+', ' ', normalized).strip()
-    
-    return normalized
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+import numpy as np
 
-def calculate_distance(coord1: Dict, coord2: Dict) -> float:
-    """Calcula la distància entre dues coordenades en km"""
-    lat1, lon1 = math.radians(coord1['lat']), math.radians(coord1['long'])
-    lat2, lon2 = math.radians(coord2['lat']), math.radians(coord2['long'])
-    
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    r = 6371  # Radi de la Terra en km
-    
-    return c * r
+from common.amenities import merge as merge_amenities
+from common.geo import haversine_km_many, refuge_coords, refuges_to_arrays
+from common.json_stream import data_path, iter_refuges, write_refuges
+from common.names import normalize_name
+from common.spatial_index import GridIndex
+from common.assignment import max_weight_matching
+
+# Mode d'emparellament: 'greedy' (el primer candidat acceptable de cada refugi,
+# en ordre) o 'assignment' (emparellament de pes màxim, independent de l'ordre)
+MATCH_MODE = 'greedy'
 
 def are_names_similar(name1: str, name2: str) -> float:
     """Calcula la similitud entre dos noms (0-1)"""
-    norm1 = normalize_name(name1)
-    norm2 = normalize_name(name2)
-    
+    return normalized_names_similarity(normalize_name(name1), normalize_name(name2))
+
+def normalized_names_similarity(norm1: str, norm2: str) -> float:
+    """Calcula la similitud (0-1) entre dos noms ja normalitzats"""
     # Si són exactament iguals després de normalitzar
     if norm1 == norm2:
         return 1.0
@@ -77,19 +49,37 @@ def are_names_similar(name1: str, name2: str) -> float:
     
     return len(intersection) / len(union) if union else 0.0
 
-def find_potential_matches(refugi1: Dict, refuges2: List[Dict], max_distance_km: float = 2.0) -> List[Tuple[int, float, float]]:
-    """Troba possibles coincidències per a un refugi"""
+def find_potential_matches(refugi1: Dict, refuges2: List[Dict], max_distance_km: float = 2.0,
+                           index: Optional[GridIndex] = None,
+                           norm_names2: Optional[List[str]] = None) -> List[Tuple[int, float, float]]:
+    """
+    Troba possibles coincidències per a un refugi.
+    Si es passa un índex espacial de refuges2, només es puntuen els refugis
+    dins de max_distance_km (i els que no tenen coordenades).
+    norm_names2 són els noms de refuges2 ja normalitzats (es calculen si no es passen).
+    """
+    coords1 = refuge_coords(refugi1)
+    norm_name1 = normalize_name(refugi1['name'])
+    
+    if index is not None and coords1 is not None:
+        candidates = index.query(coords1[0], coords1[1], max_distance_km)
+        candidates.extend((j, float('inf')) for j in index.unindexed)
+    else:
+        # Sense índex (o sense coordenades) es comparen tots els refugis,
+        # calculant totes les distàncies en una sola operació
+        if coords1 is not None:
+            lats2, lons2 = refuges_to_arrays(refuges2)
+            distances = np.nan_to_num(haversine_km_many(coords1[0], coords1[1], lats2, lons2), nan=np.inf)
+        else:
+            distances = np.full(len(refuges2), np.inf)
+        candidates = list(enumerate(distances.tolist()))
+    
     matches = []
     
-    for i, refugi2 in enumerate(refuges2):
+    for i, distance in candidates:
         # Calcular similitud de nom
-        name_similarity = are_names_similar(refugi1['name'], refugi2['name'])
-        
-        # Calcular distància geogràfica
-        try:
-            distance = calculate_distance(refugi1['coord'], refugi2['coord'])
-        except (KeyError, TypeError):
-            distance = float('inf')
+        norm_name2 = norm_names2[i] if norm_names2 is not None else normalize_name(refuges2[i]['name'])
+        name_similarity = normalized_names_similarity(norm_name1, norm_name2)
         
         # Si hi ha una similitud mínima de nom o la distància és petita
         if name_similarity > 0.6 or distance < max_distance_km:
@@ -101,6 +91,12 @@ def find_potential_matches(refugi1: Dict, refuges2: List[Dict], max_distance_km:
 
 def merge_info_comp(info1: Dict, info2: Dict) -> Dict:
     """Uneix dos diccionaris info_comp aplicant OR lògic als camps compartits"""
+    # Si tots els camps són serveis 0/1, la unió és una OR de bits
+    try:
+        return merge_amenities(info1, info2)
+    except ValueError:
+        pass
+    
     # Camps que necessiten OR lògic
     or_fields = ['cheminee', 'bois', 'eau', 'matelas']
     
@@ -258,46 +254,96 @@ def complete_refuge_fields(refugi: Dict, from_which_source: str) -> Dict:
     
     return refugi
 
-def main():
-    print("Carregant fitxers JSON...")
-    
-    # Carregar els dos fitxers
-    with open('refusInfo_normalized_types_services.json', 'r', encoding='utf-8') as f:
-        data1 = json.load(f)
-        refuges1 = data1['nodes']
-    
-    with open('refusPyrenees_definitiu.json', 'r', encoding='utf-8') as f:
-        refuges2 = json.load(f)
-    
-    print(f"Refugis en refusInfo: {len(refuges1)}")
-    print(f"Refugis en refusPyrenees: {len(refuges2)}")
-    
-    merged_refuges = []
+def match_kind(name_sim: float, distance: float) -> Optional[str]:
+    """
+    Criteris per acceptar una coincidència: 'certain', 'uncertain' (nom poc
+    semblant però molt a prop) o None si no s'accepta
+    """
+    if name_sim > 0.8 or (name_sim > 0.6 and distance < 1.0):
+        return 'certain'
+    if name_sim > 0.5 and distance < 0.5:
+        return 'uncertain'
+    return None
+
+def match_weight(name_sim: float, distance: float, max_distance_km: float = 2.0) -> float:
+    """
+    Pes d'una parella acceptada per a l'emparellament òptim: la similitud de
+    nom, amb un petit bonus per proximitat (com a desempat)
+    """
+    closeness = 1 - distance / max_distance_km if distance < max_distance_km else 0.0
+    return name_sim + 0.1 * closeness
+
+def greedy_matches(refuges1: List[Dict], refuges2: List[Dict], index: GridIndex,
+                   norm_names2: List[str]) -> Dict[int, Tuple[int, float, float]]:
+    """
+    Emparellament voraç: cada refugi de refuges1, en ordre, es queda la
+    primera coincidència acceptable que encara no s'ha fet servir.
+    Retorna {i: (j, similitud de nom, distància)}.
+    """
+    pairs = {}
     used_indices_2 = set()
-    uncertain_matches = []
-    
-    print("\nBuscant parelles de refugis...")
     
     for i, refugi1 in enumerate(refuges1):
         if i % 100 == 0:
             print(f"Processant refugi {i+1}/{len(refuges1)}")
         
         # Buscar possibles coincidències
-        matches = find_potential_matches(refugi1, refuges2)
+        matches = find_potential_matches(refugi1, refuges2, index=index, norm_names2=norm_names2)
         
-        best_match = None
         for j, name_sim, distance in matches:
-            if j in used_indices_2:
-                continue
-            
-            refugi2 = refuges2[j]
-            
-            # Criteris per acceptar una coincidència
-            if name_sim > 0.8 or (name_sim > 0.6 and distance < 1.0):
-                best_match = j
+            if j not in used_indices_2 and match_kind(name_sim, distance):
+                pairs[i] = (j, name_sim, distance)
+                used_indices_2.add(j)
                 break
-            elif name_sim > 0.5 and distance < 0.5:
-                # Coincidència incerta
+    
+    return pairs
+
+def assignment_matches(refuges1: List[Dict], refuges2: List[Dict], index: GridIndex,
+                       norm_names2: List[str]) -> Dict[int, Tuple[int, float, float]]:
+    """
+    Emparellament òptim: es construeix la matriu dispersa de puntuacions amb
+    totes les parelles acceptables (candidates del blocking espacial) i es
+    resol l'assignació de pes màxim. No depèn de l'ordre dels refugis.
+    Retorna {i: (j, similitud de nom, distància)}.
+    """
+    edges = []
+    details = {}
+    for i, refugi1 in enumerate(refuges1):
+        for j, name_sim, distance in find_potential_matches(refugi1, refuges2, index=index, norm_names2=norm_names2):
+            if match_kind(name_sim, distance):
+                edges.append((i, j, match_weight(name_sim, distance)))
+                details[(i, j)] = (name_sim, distance)
+    
+    print(f"Parelles candidates: {len(edges)}")
+    return {i: (j,) + details[(i, j)] for i, j, _ in max_weight_matching(edges)}
+
+def merge_sources(refuges1: List[Dict], refuges2: List[Dict],
+                  match_mode: str = MATCH_MODE) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Uneix els refugis de refusInfo (refuges1) i refusPyrenees (refuges2).
+    match_mode és 'greedy' o 'assignment' (vegeu MATCH_MODE).
+    Retorna la llista de refugis resultant i les coincidències incertes.
+    """
+    if match_mode not in MATCH_MODES:
+        raise ValueError(f"Mode d'emparellament desconegut: {match_mode} (disponibles: {', '.join(MATCH_MODES)})")
+    
+    # Índex espacial sobre refusPyrenees, construït un sol cop
+    index = GridIndex.from_refuges(refuges2, cell_km=2.0)
+    # Noms normalitzats un sol cop per refugi
+    norm_names2 = [normalize_name(r['name']) for r in refuges2]
+    
+    print(f"\nBuscant parelles de refugis (mode {match_mode})...")
+    pairs = MATCH_MODES[match_mode](refuges1, refuges2, index, norm_names2)
+    
+    merged_refuges = []
+    used_indices_2 = set()
+    uncertain_matches = []
+    
+    for i, refugi1 in enumerate(refuges1):
+        if i in pairs:
+            j, name_sim, distance = pairs[i]
+            refugi2 = refuges2[j]
+            if match_kind(name_sim, distance) == 'uncertain':
                 uncertain_matches.append({
                     'refugi1': refugi1['name'],
                     'refugi2': refugi2['name'],
@@ -308,15 +354,10 @@ def main():
                     'altitude1': refugi1.get('altitude'),
                     'altitude2': refugi2.get('altitude')
                 })
-                best_match = j
-                break
-        
-        if best_match is not None:
             # Unir els refugis
-            refugi2 = refuges2[best_match]
             merged_refugi = merge_refuges(refugi1, refugi2)
             merged_refuges.append(merged_refugi)
-            used_indices_2.add(best_match)
+            used_indices_2.add(j)
         else:
             # Refugi només en document 1
             refugi1_completed = complete_refuge_fields(refugi1.copy(), 'refusInfo')
@@ -343,10 +384,28 @@ def main():
             print(f"  Alt1: {match['altitude1']}, Alt2: {match['altitude2']}")
             print()
     
+    return merged_refuges, uncertain_matches
+
+MATCH_MODES = {
+    'greedy': greedy_matches,
+    'assignment': assignment_matches,
+}
+
+def main():
+    print("Carregant fitxers JSON...")
+    
+    # Carregar els dos fitxers (només els refugis, sense la resta de l'objecte de refusInfo)
+    refuges1 = list(iter_refuges(data_path('refusInfo_normalized_types_services.json'), key='nodes'))
+    refuges2 = list(iter_refuges(data_path('refusPyrenees_definitiu.json')))
+    
+    print(f"Refugis en refusInfo: {len(refuges1)}")
+    print(f"Refugis en refusPyrenees: {len(refuges2)}")
+    
+    merged_refuges, uncertain_matches = merge_sources(refuges1, refuges2)
+    
     # Guardar el resultat
-    output_file = 'data_refugis.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(merged_refuges, f, ensure_ascii=False, indent=2)
+    output_file = data_path('data_refugis.json')
+    write_refuges(output_file, merged_refuges, indent=2)
     
     print(f"\nResultat guardat a: {output_file}")
     
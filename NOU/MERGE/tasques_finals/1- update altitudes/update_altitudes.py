@@ -1,14 +1,24 @@
 import json
-import requests
-import time
+import os
+import sys
 from typing import List, Dict, Optional
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', '..', '..'))
+from common.dem import SRTMTileSet, cross_check_altitudes
+from common.elevation import ElevationCache, OpenElevationClient
+from common.json_stream import data_path, iter_refuges, write_refuges
+
+# On-disk elevation cache: coordinates already looked up are never requested again
+ELEVATION_CACHE_FILE = os.path.join(SCRIPT_DIR, 'elevation_cache.json')
+
+# Local SRTM tiles (.hgt); when this folder exists it is used instead of the API
+DEM_DIR = os.path.join(SCRIPT_DIR, 'dem')
+
 def load_refuges_data(json_file_path: str) -> List[Dict]:
-    """Load refuges data from JSON file"""
+    """Load refuges data from a JSON (array) or JSON Lines file"""
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        return data
+        return list(iter_refuges(json_file_path))
     except Exception as e:
         print(f"Error loading JSON file: {e}")
         return []
@@ -29,39 +39,42 @@ def find_null_altitude_refuges(refuges_data: List[Dict]) -> List[Dict]:
     
     return null_altitude_refuges
 
-def get_elevation_from_api(latitude: float, longitude: float) -> Optional[float]:
-    """Get elevation from Open Elevation API"""
-    try:
-        url = f"https://api.open-elevation.com/api/v1/lookup?locations={latitude},{longitude}"
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'results' in data and len(data['results']) > 0:
-                elevation = data['results'][0].get('elevation')
-                return float(elevation) if elevation is not None else None
-        
-        print(f"API request failed for coordinates ({latitude}, {longitude}): {response.status_code}")
-        return None
-        
-    except Exception as e:
-        print(f"Error getting elevation for coordinates ({latitude}, {longitude}): {e}")
-        return None
-
-def update_altitudes_with_api(refuges_data: List[Dict], null_altitude_refuges: List[Dict]) -> Dict:
-    """Update altitudes using the Open Elevation API"""
-    results = {
+def new_update_results(total_null_altitudes: int) -> Dict:
+    """Empty update results for the given number of refuges with null altitude"""
+    return {
         'updated_refuges': [],
         'failed_updates': [],
         'statistics': {
-            'total_null_altitudes': len(null_altitude_refuges),
+            'total_null_altitudes': total_null_altitudes,
             'successful_updates': 0,
             'failed_updates': 0
         }
     }
+
+def update_altitudes_with_api(refuges_data: List[Dict], null_altitude_refuges: List[Dict],
+                              client=None) -> Dict:
+    """
+    Update altitudes using the Open Elevation API, or any other elevation
+    provider with the same lookup() method (e.g. SRTMTileSet for local DEM tiles).
+    All coordinates are looked up in batches before updating the refuges.
+    """
+    if client is None:
+        client = OpenElevationClient(cache=ElevationCache(ELEVATION_CACHE_FILE))
+    
+    results = new_update_results(len(null_altitude_refuges))
     
     print(f"Updating altitudes for {len(null_altitude_refuges)} refuges...")
     
+    # Look up every valid coordinate at once (batched, concurrent and cached)
+    valid_coords = []
+    for refuge_info in null_altitude_refuges:
+        coord = refuge_info.get('coord', {})
+        if coord.get('lat') is not None and coord.get('long') is not None:
+            valid_coords.append((coord['lat'], coord['long']))
+    elevations = dict(zip(valid_coords, client.lookup(valid_coords)))
+    source = getattr(client, 'name', 'elevation provider')
+    print(f"Elevation lookup stats ({source}): {client.stats}")
+    
     for i, refuge_info in enumerate(null_altitude_refuges):
         print(f"Processing {i+1}/{len(null_altitude_refuges)}: {refuge_info['name']}")
         
@@ -70,8 +83,7 @@ def update_altitudes_with_api(refuges_data: List[Dict], null_altitude_refuges: L
         lon = coord.get('long')
         
         if lat is not None and lon is not None:
-            # Get elevation from API
-            elevation = get_elevation_from_api(lat, lon)
+            elevation = elevations.get((lat, lon))
             
             if elevation is not None:
                 # Update the original data
@@ -94,11 +106,11 @@ def update_altitudes_with_api(refuges_data: List[Dict], null_altitude_refuges: L
                 failed_info = {
                     'name': refuge_info['name'],
                     'coordinates': {'lat': lat, 'long': lon},
-                    'reason': 'API returned null elevation'
+                    'reason': f'No elevation available from {source}'
                 }
                 results['failed_updates'].append(failed_info)
                 results['statistics']['failed_updates'] += 1
-                print(f"  ✗ Failed to get elevation from API")
+                print(f"  ✗ No elevation available from {source}")
         else:
             # Record failed update due to missing coordinates
             failed_info = {
@@ -109,27 +121,76 @@ def update_altitudes_with_api(refuges_data: List[Dict], null_altitude_refuges: L
             results['failed_updates'].append(failed_info)
             results['statistics']['failed_updates'] += 1
             print(f"  ✗ Missing coordinates")
-        
-        # Add delay to avoid overwhelming the API
-        if i < len(null_altitude_refuges) - 1:
-            time.sleep(0.5)  # 500ms delay between requests
     
     return results
 
+def update_altitudes(refuges_data: List[Dict], dem_dir: str = DEM_DIR) -> Optional[Dict]:
+    """
+    Fill the null altitudes of refuges_data in place.
+    Uses local DEM tiles when dem_dir exists, otherwise the Open Elevation API.
+    Returns the update results, or None if no refuge has a null altitude.
+    """
+    # Find refuges with null altitude
+    print("Cercant refugis amb altitud nul·la...")
+    null_altitude_refuges = find_null_altitude_refuges(refuges_data)
+    
+    print(f"Trobats {len(null_altitude_refuges)} refugis amb altitud nul·la")
+    
+    if len(null_altitude_refuges) == 0:
+        print("No hi ha refugis amb altitud nul·la per actualitzar.")
+        return None
+    
+    # Use local DEM tiles when available, otherwise the Open Elevation API
+    if os.path.isdir(dem_dir):
+        print(f"\nIniciant actualització d'altituds amb les tessel·les DEM de {dem_dir}...")
+        provider = SRTMTileSet(dem_dir)
+        
+        # Cross-check the altitudes that come from the sources against the DEM
+        discrepancies = cross_check_altitudes(refuges_data, provider)
+        print(f"Refugis amb altitud diferent del DEM (>100m): {len(discrepancies)}")
+    else:
+        print("\nIniciant actualització d'altituds amb l'API Open Elevation...")
+        provider = None
+        discrepancies = None
+    
+    update_results = update_altitudes_with_api(refuges_data, null_altitude_refuges, client=provider)
+    if discrepancies is not None:
+        update_results['altitude_discrepancies'] = discrepancies
+    
+    return update_results
+
+def print_summary(update_results: Dict):
+    """Print the final summary of an altitude update"""
+    stats = update_results['statistics']
+    print(f"\n{'='*60}")
+    print("RESUM FINAL:")
+    print(f"{'='*60}")
+    print(f"Total refugis amb altitud nul·la: {stats['total_null_altitudes']}")
+    print(f"Actualitzacions exitoses: {stats['successful_updates']}")
+    print(f"Actualitzacions fallides: {stats['failed_updates']}")
+    if stats['total_null_altitudes']:
+        print(f"Percentatge d'èxit: {(stats['successful_updates']/stats['total_null_altitudes']*100):.1f}%")
+
 def save_results(updated_data: List[Dict], update_results: Dict, original_filename: str):
     """Save updated data and results"""
-    # Save updated refuges data
-    output_filename = original_filename.replace('.json', '_updated_altitudes.json')
-    with open(output_filename, 'w', encoding='utf-8') as file:
-        json.dump(updated_data, file, ensure_ascii=False, indent=2)
+    # Save updated refuges data (same format as the input file)
+    root, ext = os.path.splitext(original_filename)
+    output_filename = f"{root}_updated_altitudes{ext}"
+    write_refuges(output_filename, updated_data, indent=2)
     
-    # Save update results
-    results_filename = original_filename.replace('.json', '_altitude_update_results.json')
+    results_filename, summary_filename = save_reports(update_results, original_filename)
+    return output_filename, results_filename, summary_filename
+
+def save_reports(update_results: Dict, original_filename: str):
+    """Save the detailed results (JSON) and the summary report (txt) of an update"""
+    # Save update results (the reports are always JSON/txt, whatever the data format)
+    root = os.path.splitext(original_filename)[0]
+    results_filename = f"{root}_altitude_update_results.json"
     with open(results_filename, 'w', encoding='utf-8') as file:
         json.dump(update_results, file, ensure_ascii=False, indent=2)
     
     # Save summary report
-    summary_filename = original_filename.replace('.json', '_altitude_update_summary.txt')
+    summary_filename = f"{root}_altitude_update_summary.txt"
     with open(summary_filename, 'w', encoding='utf-8') as file:
         file.write("RESUM DE L'ACTUALITZACIÓ D'ALTITUDS\n")
         file.write("=" * 50 + "\n\n")
@@ -138,7 +199,9 @@ def save_results(updated_data: List[Dict], update_results: Dict, original_filena
         file.write(f"Total refugis amb altitud nul·la: {stats['total_null_altitudes']}\n")
         file.write(f"Actualitzacions exitoses: {stats['successful_updates']}\n")
         file.write(f"Actualitzacions fallides: {stats['failed_updates']}\n")
-        file.write(f"Percentatge d'èxit: {(stats['successful_updates']/stats['total_null_altitudes']*100):.1f}%\n\n")
+        if stats['total_null_altitudes']:
+            file.write(f"Percentatge d'èxit: {(stats['successful_updates']/stats['total_null_altitudes']*100):.1f}%\n")
+        file.write("\n")
         
         file.write("REFUGIS ACTUALITZATS EXITOSAMENT:\n")
         file.write("-" * 40 + "\n")
@@ -149,52 +212,44 @@ def save_results(updated_data: List[Dict], update_results: Dict, original_filena
         file.write("-" * 20 + "\n")
         for i, refuge in enumerate(update_results['failed_updates'], 1):
             file.write(f"{i:3d}. {refuge['name']} - Motiu: {refuge['reason']}\n")
-    
-    return output_filename, results_filename, summary_filename
+        
+        if 'altitude_discrepancies' in update_results:
+            file.write(f"\nDISCREPÀNCIES AMB EL DEM:\n")
+            file.write("-" * 25 + "\n")
+            for i, refuge in enumerate(update_results['altitude_discrepancies'], 1):
+                file.write(f"{i:3d}. {refuge['name']} - Altitud: {refuge['altitude']}m, "
+                           f"DEM: {refuge['dem_altitude']}m ({refuge['difference']:+}m)\n")
+    
+    return results_filename, summary_filename
 
 def main():
-    input_file = "data_refugis.json"
+    input_file = data_path("data_refugis.json")
     
     print("Carregant dades dels refugis...")
     refuges_data = load_refuges_data(input_file)
     
     if not refuges_data:
         print("Error: No s'han pogut carregar les dades.")
-        return
+        return 1
     
     print(f"Dades carregades: {len(refuges_data)} refugis")
     
-    # Find refuges with null altitude
-    print("Cercant refugis amb altitud nul·la...")
-    null_altitude_refuges = find_null_altitude_refuges(refuges_data)
-    
-    print(f"Trobats {len(null_altitude_refuges)} refugis amb altitud nul·la")
-    
-    if len(null_altitude_refuges) == 0:
-        print("No hi ha refugis amb altitud nul·la per actualitzar.")
-        return
-    
-    # Update altitudes using API
-    print("\nIniciant actualització d'altituds amb l'API Open Elevation...")
-    update_results = update_altitudes_with_api(refuges_data, null_altitude_refuges)
+    update_results = update_altitudes(refuges_data)
+    if update_results is None:
+        # The data is saved unchanged so that the output matches the input
+        update_results = new_update_results(0)
     
     # Save results
     print("\nGuardant resultats...")
     output_file, results_file, summary_file = save_results(refuges_data, update_results, input_file)
     
     # Print summary
-    stats = update_results['statistics']
-    print(f"\n{'='*60}")
-    print("RESUM FINAL:")
-    print(f"{'='*60}")
-    print(f"Total refugis amb altitud nul·la: {stats['total_null_altitudes']}")
-    print(f"Actualitzacions exitoses: {stats['successful_updates']}")
-    print(f"Actualitzacions fallides: {stats['failed_updates']}")
-    print(f"Percentatge d'èxit: {(stats['successful_updates']/stats['total_null_altitudes']*100):.1f}%")
+    print_summary(update_results)
     print(f"\nFitxers generats:")
     print(f"- Dades actualitzades: {output_file}")
     print(f"- Resultats detallats: {results_file}")
     print(f"- Resum: {summary_file}")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,21 +1,41 @@
 import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.columnar import ABSENT, FLOAT, INT, LIST, NULL, STR, RefugeColumns
 
 # Llegir el fitxer actualitzat
 with open('data_refugis_updated_types.json', 'r', encoding='utf-8') as f:
     data = json.load(f)
 
+# Les verificacions es fan sobre columnes (una operació per camp)
+columns = RefugeColumns.from_refuges(data)
+
+def refuge_name(row):
+    return columns.value(row, 'name', f'Index {row}')
+
+def other_rows(field, condition):
+    """Files amb un valor no codificable al camp que compleixen la condició"""
+    column = columns[field] if field in columns else None
+    if column is None:
+        return np.zeros(len(columns), dtype=bool)
+    mask = np.zeros(len(columns), dtype=bool)
+    for row, value in column.other.items():
+        mask[row] = condition(value)
+    return mask
+
 print("=" * 70)
 print("VERIFICACIÓ COMPLETA DEL FITXER data_refugis_updated_types.json")
 print("=" * 70)
 
 # 1. Verificar tipus
-type_errors = []
-types_as_arrays = []
-for i, refugi in enumerate(data):
-    if isinstance(refugi.get('type'), list):
-        types_as_arrays.append(refugi.get('name', f'Index {i}'))
-    elif not isinstance(refugi.get('type'), (str, type(None))):
-        type_errors.append(refugi.get('name', f'Index {i}'))
+type_kind = columns.kind('type')
+type_arrays = (type_kind == LIST) | other_rows('type', lambda type_val: isinstance(type_val, list))
+types_as_arrays = [refuge_name(i) for i in np.flatnonzero(type_arrays)]
+type_errors = [refuge_name(i) for i in np.flatnonzero(~np.isin(type_kind, (ABSENT, NULL, STR)) & ~type_arrays)]
 
 print("\n1. VERIFICACIÓ CAMP 'TYPE':")
 print("-" * 70)
@@ -29,14 +49,12 @@ else:
 
 # 2. Verificar altituds
 altitude_decimals = []
+altitude_kind = columns.kind('altitude')
+not_int = (altitude_kind == FLOAT) | other_rows('altitude', lambda alt: not isinstance(alt, int))
 altitude_not_int = []
-for i, refugi in enumerate(data):
-    alt = refugi.get('altitude')
-    if alt is not None:
-        if not isinstance(alt, int):
-            altitude_not_int.append((refugi.get('name', f'Index {i}'), alt, type(alt).__name__))
-        elif isinstance(alt, float) and alt != int(alt):
-            altitude_decimals.append((refugi.get('name', f'Index {i}'), alt))
+for i in np.flatnonzero(not_int):
+    alt = columns.value(i, 'altitude')
+    altitude_not_int.append((refuge_name(i), alt, type(alt).__name__))
 
 print("\n2. VERIFICACIÓ CAMP 'ALTITUDE':")
 print("-" * 70)
@@ -51,12 +69,11 @@ else:
             print(f"      - {name}: {alt} (tipus: {tipo})")
 
 # 3. Verificar places
-places_zero_not_fermee = []
-for i, refugi in enumerate(data):
-    places = refugi.get('places')
-    type_val = refugi.get('type')
-    if places == 0 and type_val != 'fermée':
-        places_zero_not_fermee.append((refugi.get('name', f'Index {i}'), type_val))
+places_kind = columns.kind('places')
+places_zero = (np.isin(places_kind, (INT, FLOAT)) & (columns['places'].values == 0)) if 'places' in columns else np.zeros(len(columns), dtype=bool)
+places_zero |= other_rows('places', lambda places: places == 0)
+not_fermee = ~columns['type'].equals('fermée') if 'type' in columns else np.ones(len(columns), dtype=bool)
+places_zero_not_fermee = [(refuge_name(i), columns.value(i, 'type')) for i in np.flatnonzero(places_zero & not_fermee)]
 
 print("\n3. VERIFICACIÓ CAMP 'PLACES':")
 print("-" * 70)
@@ -69,24 +86,31 @@ else:
         print(f"      - {name} (type: {type_val})")
 
 # Comptar places null
-places_null = sum(1 for r in data if r.get('places') is None)
+places_null = int(np.count_nonzero(np.isin(places_kind, (ABSENT, NULL))))
 print(f"   Refugis amb places=null: {places_null}")
 
 # 4. Verificar coordenades
-coord_too_many_decimals = []
-for i, refugi in enumerate(data):
-    coord = refugi.get('coord')
+def too_many_decimals(value):
+    value_str = str(value)
+    return '.' in value_str and len(value_str.split('.')[1]) > 6
+
+# Un float té més de 6 decimals si arrodonir-lo a 6 decimals el canvia.
+# Els valors no numèrics (i les coordenades que no són un diccionari) es comproven un a un.
+flagged = {}
+for field in ('lat', 'long'):
+    column = columns[f'coord.{field}']
+    mask = (column.kind == FLOAT) & (np.round(column.values, 6) != column.values)
+    mask |= other_rows(f'coord.{field}', lambda value: value is not None and too_many_decimals(value))
+    for i in np.flatnonzero(mask):
+        flagged[(i, field)] = column.get(i)
+for i, coord in columns.other_coords.items():
     if coord:
-        lat = coord.get('lat')
-        long = coord.get('long')
-        if lat is not None:
-            lat_str = str(lat)
-            if '.' in lat_str and len(lat_str.split('.')[1]) > 6:
-                coord_too_many_decimals.append((refugi.get('name', f'Index {i}'), 'lat', lat))
-        if long is not None:
-            long_str = str(long)
-            if '.' in long_str and len(long_str.split('.')[1]) > 6:
-                coord_too_many_decimals.append((refugi.get('name', f'Index {i}'), 'long', long))
+        for field in ('lat', 'long'):
+            value = coord.get(field)
+            if value is not None and too_many_decimals(value):
+                flagged[(i, field)] = value
+coord_too_many_decimals = [(refuge_name(i), field, flagged[(i, field)])
+                           for i, field in sorted(flagged, key=lambda key: (key[0], key[1] == 'long'))]
 
 print("\n4. VERIFICACIÓ COORDENADES:")
 print("-" * 70)
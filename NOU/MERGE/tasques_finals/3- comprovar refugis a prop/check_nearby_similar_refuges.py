@@ -1,43 +1,29 @@
 import json
-import math
-from difflib import SequenceMatcher
+import os
+import sys
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    Calcula la distància en metres entre dos punts geogràfics
-    utilitzant la fórmula de Haversine
-    """
-    R = 6371000  # Radi de la Terra en metres
-    
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_phi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    distance = R * c
-    return distance
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.names import significant_words
+from common.similarity import get_metric
+from common.spatial_index import GridIndex
+
+# Mètrica de similitud de noms (vegeu common/similarity.py): sequence, jaro_winkler, levenshtein o token_set
+METRIC = 'sequence'
 
-def text_similarity(text1, text2):
+def text_similarity(text1, text2, metric=METRIC, cutoff=0.0):
     """
-    Calcula la similitud entre dos textos (0-1)
+    Calcula la similitud entre dos textos (0-1).
+    Amb cutoff, retorna 0.0 tan aviat com se sap que no s'hi arriba.
     """
-    return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
+    return get_metric(metric)(text1.lower(), text2.lower(), cutoff)
 
-def have_similar_words(name1, name2, min_word_length=4):
+def have_similar_words(name1, name2, min_word_length=4, metric=METRIC):
     """
     Comprova si dos noms comparteixen paraules semblants
     """
-    # Normalitzar i dividir en paraules
-    words1 = set(name1.lower().split())
-    words2 = set(name2.lower().split())
-    
-    # Filtrar paraules molt comunes o curtes
-    common_words = {'de', 'la', 'le', 'du', 'des', 'el', 'les', 'cabane', 'refuge', 'abri', 'borda', 'borde'}
-    words1 = {w for w in words1 if len(w) >= min_word_length and w not in common_words}
-    words2 = {w for w in words2 if len(w) >= min_word_length and w not in common_words}
+    # Paraules normalitzades, sense les molt comunes o curtes
+    words1 = significant_words(name1, min_word_length)
+    words2 = significant_words(name2, min_word_length)
     
     # Comprovar paraules iguals
     if words1.intersection(words2):
@@ -46,15 +32,15 @@ def have_similar_words(name1, name2, min_word_length=4):
     # Comprovar paraules similars
     for w1 in words1:
         for w2 in words2:
-            if text_similarity(w1, w2) >= 0.75:  # 75% de similitud
+            if text_similarity(w1, w2, metric, cutoff=0.75):  # 75% de similitud
                 return True, {f"{w1}~{w2}"}
     
     return False, set()
 
-def check_nearby_similar_refuges(json_file, max_distance=100, min_name_similarity=0.6):
+def check_nearby_similar_refuges(json_file, max_distance=100, min_name_similarity=0.6, metric=METRIC):
     """
     Busca refugis que estiguin a prop (menys de max_distance metres)
-    i que tinguin noms semblants
+    i que tinguin noms semblants segons la mètrica `metric`
     """
     # Carregar les dades
     with open(json_file, 'r', encoding='utf-8') as f:
@@ -64,53 +50,48 @@ def check_nearby_similar_refuges(json_file, max_distance=100, min_name_similarit
     
     nearby_similar = []
     
-    # Comparar tots els parells de refugis
-    for i in range(len(refuges)):
-        for j in range(i+1, len(refuges)):
-            refuge1 = refuges[i]
-            refuge2 = refuges[j]
-            
-            # Obtenir coordenades
-            lat1 = refuge1['coord']['lat']
-            lon1 = refuge1['coord']['long']
-            lat2 = refuge2['coord']['lat']
-            lon2 = refuge2['coord']['long']
-            
-            # Calcular distància
-            distance = haversine_distance(lat1, lon1, lat2, lon2)
-            
-            # Si estan a prop
-            if distance <= max_distance:
-                name1 = refuge1.get('name', '')
-                name2 = refuge2.get('name', '')
-                
-                # Calcular similitud dels noms
-                similarity = text_similarity(name1, name2)
-                
-                # Comprovar si tenen paraules semblants
-                has_similar, similar_words = have_similar_words(name1, name2)
-                
-                # Si els noms són similars o tenen paraules semblants
-                if similarity >= min_name_similarity or has_similar:
-                    nearby_similar.append({
-                        'refuge1': {
-                            'name': name1,
-                            'coord': refuge1['coord'],
-                            'altitude': refuge1.get('altitude'),
-                            'type': refuge1.get('type'),
-                            'links': refuge1.get('links', [])
-                        },
-                        'refuge2': {
-                            'name': name2,
-                            'coord': refuge2['coord'],
-                            'altitude': refuge2.get('altitude'),
-                            'type': refuge2.get('type'),
-                            'links': refuge2.get('links', [])
-                        },
-                        'distance_m': round(distance, 2),
-                        'name_similarity': round(similarity, 3),
-                        'similar_words': list(similar_words) if has_similar else []
-                    })
+    # Índex espacial: només es generen les parelles a menys de max_distance
+    max_distance_km = max_distance / 1000
+    index = GridIndex.from_refuges(refuges, cell_km=max_distance_km)
+    
+    for i, j, distance_km in index.pairs_within(max_distance_km):
+        refuge1 = refuges[i]
+        refuge2 = refuges[j]
+        distance = distance_km * 1000
+        
+        name1 = refuge1.get('name', '')
+        name2 = refuge2.get('name', '')
+        
+        # Calcular similitud dels noms (s'atura si no pot arribar a min_name_similarity)
+        similarity = text_similarity(name1, name2, metric, cutoff=min_name_similarity)
+        
+        # Comprovar si tenen paraules semblants
+        has_similar, similar_words = have_similar_words(name1, name2, metric=metric)
+        
+        # Si els noms són similars o tenen paraules semblants
+        if similarity >= min_name_similarity or has_similar:
+            if similarity < min_name_similarity:
+                # Parella inclosa per les paraules: cal el valor complet per a l'informe
+                similarity = text_similarity(name1, name2, metric)
+            nearby_similar.append({
+                'refuge1': {
+                    'name': name1,
+                    'coord': refuge1['coord'],
+                    'altitude': refuge1.get('altitude'),
+                    'type': refuge1.get('type'),
+                    'links': refuge1.get('links', [])
+                },
+                'refuge2': {
+                    'name': name2,
+                    'coord': refuge2['coord'],
+                    'altitude': refuge2.get('altitude'),
+                    'type': refuge2.get('type'),
+                    'links': refuge2.get('links', [])
+                },
+                'distance_m': round(distance, 2),
+                'name_similarity': round(similarity, 3),
+                'similar_words': list(similar_words) if has_similar else []
+            })
     
     return nearby_similar
 
@@ -161,7 +142,7 @@ def main():
     
     print("Buscant refugis a prop amb noms semblants...\n")
     
-    results = check_nearby_similar_refuges(input_file, max_distance=100, min_name_similarity=0.6)
+    results = check_nearby_similar_refuges(input_file, max_distance=100, min_name_similarity=0.6, metric=METRIC)
     
     print(f"\nS'han trobat {len(results)} parells de refugis a prop amb noms semblants.")
     
@@ -5,9 +5,18 @@ Script per fer el merge de refugis duplicats identificats a noms_parelles_sembla
 Segueix les normes especificades per combinar la informació de dos refugis en un sol.
 """
 
-import json
+import os
 import re
-from typing import Dict, List, Any, Optional
+import sys
+from typing import Dict, List, Any, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.amenities import merge as merge_amenities
+from common.json_stream import data_path, iter_refuges, write_refuges
+from common.name_index import NameIndex
+
+# Similitud mínima per suggerir un nom semblant quan no es troba el nom exacte
+SUGGESTION_THRESHOLD = 0.6
 
 
 def parse_pairs_file(filepath: str) -> List[tuple]:
@@ -45,21 +54,64 @@ def parse_pairs_file(filepath: str) -> List[tuple]:
     return pairs
 
 
-def find_refuge_by_name(refuges: List[Dict], name: str) -> Optional[int]:
+def build_name_lookup(refuges: List[Dict]) -> Dict[str, List[int]]:
     """
-    Troba l'índex d'un refugi pel seu nom o surname.
-    
-    Returns:
-        Índex del refugi o None si no es troba
+    Diccionari nom/surname -> índexs dels refugis que el tenen (en l'ordre
+    de la llista), construït un sol cop.
     """
+    lookup: Dict[str, List[int]] = {}
     for i, refuge in enumerate(refuges):
-        refuge_name = refuge.get('name', '')
-        refuge_surname = refuge.get('surname', '')
-        
-        if refuge_name == name or refuge_surname == name:
-            return i
-    
-    return None
+        for field in ('name', 'surname'):
+            name = refuge.get(field)
+            if isinstance(name, str) and name:
+                indices = lookup.setdefault(name, [])
+                if not indices or indices[-1] != i:
+                    indices.append(i)
+    return lookup
+
+
+def resolve_pair(lookup: Dict[str, List[int]], name1: str, name2: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Índexs dels dos refugis d'una parella (None si un nom no es troba).
+    Si els dos noms són iguals (el mateix refugi a les dues fonts), el segon
+    és un altre refugi amb aquell nom quan n'hi ha.
+    """
+    candidates1 = lookup.get(name1)
+    candidates2 = lookup.get(name2)
+    idx1 = candidates1[0] if candidates1 else None
+    if not candidates2:
+        return idx1, None
+    idx2 = next((i for i in candidates2 if i != idx1), candidates2[0])
+    return idx1, idx2
+
+
+def group_pairs(index_pairs: List[Tuple[int, int]]) -> List[List[int]]:
+    """
+    Agrupa les parelles d'índexs en grups transitius (A~B i B~C -> A, B, C)
+    amb union-find. Cada grup manté l'ordre en què apareixen els refugis a
+    les parelles, i els grups l'ordre de la seva primera parella.
+    """
+    parent: Dict[int, int] = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for idx1, idx2 in index_pairs:
+        root1, root2 = find(idx1), find(idx2)
+        if root1 != root2:
+            parent[max(root1, root2)] = min(root1, root2)
+
+    groups: Dict[int, List[int]] = {}
+    for pair in index_pairs:
+        group = groups.setdefault(find(pair[0]), [])
+        for idx in pair:
+            if idx not in group:
+                group.append(idx)
+    return list(groups.values())
 
 
 def merge_altitude(alt1: Any, alt2: Any) -> Any:
@@ -100,6 +152,12 @@ def merge_info_comp(info1: Optional[Dict], info2: Optional[Dict]) -> Dict:
     if not info2:
         return info1
     
+    # Si tots els camps són serveis 0/1, la unió és una OR de bits
+    try:
+        return merge_amenities(info1, info2)
+    except ValueError:
+        pass
+    
     result = {}
     all_keys = set(info1.keys()) | set(info2.keys())
     
@@ -308,6 +366,92 @@ def merge_refuges(refuge1: Dict, refuge2: Dict, from_refuges_info: bool = True)
     return merged
 
 
+def refuges_info_first(refuge1: Dict, refuge2: Dict) -> bool:
+    """Determina quin és de refuges.info (té link de refuges.info): True si és refuge1"""
+    if refuge1.get('links'):
+        if any('refuges.info' in link for link in refuge1['links']):
+            return True
+        elif refuge2.get('links') and any('refuges.info' in link for link in refuge2['links']):
+            return False
+    return True
+
+
+def merge_group(refuges: List[Dict], group: List[int]) -> Dict:
+    """Fusiona els refugis d'un grup, un darrere l'altre en l'ordre del grup"""
+    merged = refuges[group[0]]
+    for idx in group[1:]:
+        merged = merge_refuges(merged, refuges[idx], refuges_info_first(merged, refuges[idx]))
+    return merged
+
+
+def merge_duplicate_pairs(refuges: List[Dict], pairs: List[tuple]) -> Tuple[List[Dict], Dict]:
+    """
+    Fusiona les parelles de refugis duplicats. Les parelles que comparteixen
+    un refugi (A~B, B~C) es fusionen en un sol refugi.
+    
+    Returns:
+        (llista final de refugis, resultats amb merged_count, groups, not_found i removed)
+    """
+    not_found = []
+    index_pairs = []
+    
+    # Diccionari de noms i surnames, construït un sol cop
+    lookup = build_name_lookup(refuges)
+    suggestions = None
+    
+    for name1, name2, pair_num in pairs:
+        idx1, idx2 = resolve_pair(lookup, name1, name2)
+        
+        if idx1 is None or idx2 is None:
+            not_found.append((pair_num, name1, name2, idx1, idx2))
+            print(f"   ⚠ Parella #{pair_num}: No trobat - '{name1}' (idx:{idx1}) / '{name2}' (idx:{idx2})")
+            if suggestions is None:
+                # Índex de trigrames per suggerir noms semblants (només si cal)
+                suggestions = NameIndex.from_refuges(refuges)
+            for name, idx in ((name1, idx1), (name2, idx2)):
+                if idx is None:
+                    for _, similar_name, score in suggestions.search(name, SUGGESTION_THRESHOLD, limit=3):
+                        print(f"      Potser '{name}' és '{similar_name}' ({score:.2f})")
+            continue
+        
+        index_pairs.append((idx1, idx2))
+    
+    # Grups transitius; un grup d'un sol refugi (els dos noms són del mateix refugi) no es toca
+    groups = [group for group in group_pairs(index_pairs) if len(group) > 1]
+    merged_refuges = []
+    for group in groups:
+        merged_refuges.append(merge_group(refuges, group))
+        if len(merged_refuges) % 10 == 0:
+            print(f"   Fusionats {len(merged_refuges)} grups...")
+    
+    # Afegir refugis que no s'han fusionat i després els fusionats (una sola passada)
+    indices_to_remove = {idx for group in groups for idx in group}
+    final_refuges = [refuge for i, refuge in enumerate(refuges) if i not in indices_to_remove]
+    final_refuges.extend(merged_refuges)
+    
+    results = {
+        # Les parelles d'un refugi amb si mateix no fusionen res
+        'merged_count': sum(1 for idx1, idx2 in index_pairs if idx1 != idx2),
+        'groups': len(groups),
+        'not_found': not_found,
+        'removed': len(indices_to_remove),
+    }
+    return final_refuges, results
+
+
+def save_not_found_report(not_found: List[tuple], filepath: str = 'parelles_no_trobades.txt'):
+    """
+    Guarda l'informe de parelles no trobades.
+    """
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write("PARELLES NO TROBADES\n")
+        f.write("=" * 80 + "\n\n")
+        for pair_num, name1, name2, idx1, idx2 in not_found:
+            f.write(f"Parella #{pair_num}\n")
+            f.write(f"  Nom 1: {name1} (índex: {idx1})\n")
+            f.write(f"  Nom 2: {name2} (índex: {idx2})\n\n")
+
+
 def main():
     """
     Funció principal que executa el merge de refugis duplicats.
@@ -321,92 +465,44 @@ def main():
     
     # Llegir el fitxer de dades
     print("2. Llegint dades de refugis...")
-    with open('data_refugis_updated_types.json', 'r', encoding='utf-8') as f:
-        refuges = json.load(f)
+    refuges = list(iter_refuges(data_path('data_refugis_updated_types.json')))
     print(f"   Carregats {len(refuges)} refugis\n")
     
     # Processar cada parella
     print("3. Processant parelles i fent merge...")
-    merged_count = 0
-    not_found = []
-    indices_to_remove = set()
-    merged_refuges = []
+    final_refuges, results = merge_duplicate_pairs(refuges, pairs)
+    merged_count = results['merged_count']
+    groups = results['groups']
+    not_found = results['not_found']
+    removed = results['removed']
     
-    for name1, name2, pair_num in pairs:
-        idx1 = find_refuge_by_name(refuges, name1)
-        idx2 = find_refuge_by_name(refuges, name2)
-        
-        if idx1 is None or idx2 is None:
-            not_found.append((pair_num, name1, name2, idx1, idx2))
-            print(f"   ⚠ Parella #{pair_num}: No trobat - '{name1}' (idx:{idx1}) / '{name2}' (idx:{idx2})")
-            continue
-        
-        # Determinar quin és de refuges.info (té link de refuges.info)
-        refuge1 = refuges[idx1]
-        refuge2 = refuges[idx2]
-        
-        from_refuges_info = True
-        if refuge1.get('links'):
-            if any('refuges.info' in link for link in refuge1['links']):
-                from_refuges_info = True
-            elif refuge2.get('links') and any('refuges.info' in link for link in refuge2['links']):
-                from_refuges_info = False
-        
-        # Fer el merge
-        merged = merge_refuges(refuge1, refuge2, from_refuges_info)
-        merged_refuges.append(merged)
-        
-        # Marcar per eliminar
-        indices_to_remove.add(idx1)
-        indices_to_remove.add(idx2)
-        
-        merged_count += 1
-        if merged_count % 10 == 0:
-            print(f"   Processades {merged_count} parelles...")
-    
-    print(f"\n   ✓ Merge completat: {merged_count} parelles")
+    print(f"\n   ✓ Merge completat: {merged_count} parelles en {groups} refugis")
     print(f"   ⚠ No trobades: {len(not_found)} parelles\n")
     
     # Crear la llista final
     print("4. Creant llista final de refugis...")
-    final_refuges = []
-    
-    # Afegir refugis que no s'han fusionat
-    for i, refuge in enumerate(refuges):
-        if i not in indices_to_remove:
-            final_refuges.append(refuge)
-    
-    # Afegir refugis fusionats
-    final_refuges.extend(merged_refuges)
-    
     print(f"   Total refugis originals: {len(refuges)}")
-    print(f"   Total refugis eliminats (fusionats): {len(indices_to_remove)}")
+    print(f"   Total refugis eliminats (fusionats): {removed}")
     print(f"   Total refugis resultants: {len(final_refuges)}")
-    print(f"   (Esperats: {len(refuges)} - {len(indices_to_remove)} + {merged_count} = {len(refuges) - len(indices_to_remove) + merged_count})\n")
+    print(f"   (Esperats: {len(refuges)} - {removed} + {groups} = {len(refuges) - removed + groups})\n")
     
     # Guardar resultats
     print("5. Guardant resultats...")
-    with open('data_refugis_sense_repetits.json', 'w', encoding='utf-8') as f:
-        json.dump(final_refuges, f, ensure_ascii=False, indent=2)
-    print("   ✓ Guardat a data_refugis_sense_repetits.json\n")
+    output_file = data_path('data_refugis_sense_repetits.json')
+    write_refuges(output_file, final_refuges, indent=2)
+    print(f"   ✓ Guardat a {output_file}\n")
     
     # Guardar informe de parelles no trobades
     if not_found:
         print("6. Guardant informe de parelles no trobades...")
-        with open('parelles_no_trobades.txt', 'w', encoding='utf-8') as f:
-            f.write("PARELLES NO TROBADES\n")
-            f.write("=" * 80 + "\n\n")
-            for pair_num, name1, name2, idx1, idx2 in not_found:
-                f.write(f"Parella #{pair_num}\n")
-                f.write(f"  Nom 1: {name1} (índex: {idx1})\n")
-                f.write(f"  Nom 2: {name2} (índex: {idx2})\n\n")
+        save_not_found_report(not_found)
         print(f"   ✓ Informe guardat a parelles_no_trobades.txt\n")
     
     print("=== PROCÉS COMPLETAT ===")
     print(f"\nResum:")
     print(f"  - Parelles processades: {merged_count}/{len(pairs)}")
     print(f"  - Refugis resultants: {len(final_refuges)}")
-    print(f"  - Reducció: {len(refuges)} → {len(final_refuges)} ({len(indices_to_remove)} eliminats)")
+    print(f"  - Reducció: {len(refuges)} → {len(final_refuges)} ({removed} eliminats)")
 
 
 if __name__ == '__main__':
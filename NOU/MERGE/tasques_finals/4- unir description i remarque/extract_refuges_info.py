@@ -1,15 +1,13 @@
-import json
+import os
+import sys
 
-def extract_refuges_info(input_file, output_file):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.json_stream import data_path, iter_refuges, write_refuges
+
+def extract_fields(refuges):
     """
     Extrae solo los campos 'name', 'description' y 'remarque' de cada refugio
     """
-    
-    # Cargar el archivo JSON
-    with open(input_file, 'r', encoding='utf-8') as f:
-        refuges = json.load(f)
-    
-    # Extraer solo los campos requeridos
     extracted_refuges = []
     
     for refuge in refuges:
@@ -29,13 +27,9 @@ def extract_refuges_info(input_file, output_file):
         
         extracted_refuges.append(extracted_refuge)
     
-    # Guardar el resultado en un nuevo archivo JSON
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(extracted_refuges, f, ensure_ascii=False, indent=2)
-    
-    print(f"Procesados {len(extracted_refuges)} refugios")
-    print(f"Resultado guardado en: {output_file}")
-    
+    return extracted_refuges
+
+def print_statistics(extracted_refuges):
     # Mostrar estadísticas
     with_description = sum(1 for r in extracted_refuges if 'description' in r and r['description'])
     with_remarque = sum(1 for r in extracted_refuges if 'remarque' in r and r['remarque'])
@@ -43,8 +37,24 @@ def extract_refuges_info(input_file, output_file):
     print(f"Refugios con descripción: {with_description}")
     print(f"Refugios con remarque: {with_remarque}")
 
+def extract_refuges_info(input_file, output_file):
+    """
+    Extrae solo los campos 'name', 'description' y 'remarque' de cada refugio
+    """
+    
+    # Extraer solo los campos requeridos, leyendo los refugios de uno en uno
+    extracted_refuges = extract_fields(iter_refuges(input_file))
+    
+    # Guardar el resultado en un nuevo archivo (JSON o JSON Lines, según la extensión)
+    write_refuges(output_file, extracted_refuges, indent=2)
+    
+    print(f"Procesados {len(extracted_refuges)} refugios")
+    print(f"Resultado guardado en: {output_file}")
+    
+    print_statistics(extracted_refuges)
+
 if __name__ == "__main__":
-    input_file = "data_refugis_sense_repetits.json"
-    output_file = "refuges_name_description_remarque.json"
+    input_file = data_path("data_refugis_sense_repetits.json")
+    output_file = data_path("refuges_name_description_remarque.json")
     
     extract_refuges_info(input_file, output_file)
\ No newline at end of file
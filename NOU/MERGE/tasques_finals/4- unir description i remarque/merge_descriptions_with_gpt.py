@@ -1,25 +1,19 @@
+import hashlib
 import json
 import os
-from openai import OpenAI
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def merge_descriptions_with_gpt(input_file, output_file):
-    """
-    Uneix els camps description i remarque de cada refugi utilitzant GPT-4
-    """
-    
-    # Configurar el client d'OpenAI (necessita OPENAI_API_KEY en variables d'entorn)
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    
-    # Carregar el fitxer JSON
-    with open(input_file, 'r', encoding='utf-8') as f:
-        refuges = json.load(f)
-    
-    print(f"Total de refugis a processar: {len(refuges)}")
-    
-    merged_refuges = []
-    
-    # Prompt del sistema
-    system_prompt = """Ets un assistent expert en unir i resumir informació sobre refugis de muntanya.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.json_stream import data_path, iter_refuges, write_refuges
+
+MODEL = "gpt-4-turbo-preview"  # o "gpt-4" segons disponibilitat
+
+# Prompt del sistema
+SYSTEM_PROMPT = """Ets un assistent expert en unir i resumir informació sobre refugis de muntanya.
                         La teva tasca és combinar els camps 'description' i 'remarque' en un sol text descriptiu.
 
                         INSTRUCCIONS:
@@ -29,97 +23,296 @@ def merge_descriptions_with_gpt(input_file, output_file):
                         4. NO suprimeixis ni modifiquis dades numèriques, com nombres de places, dates o quantitats.
                         5. El resultat ha de ser un text fluït i comprensible que resumeixi tota la informació de manera natural.
                         6. Respon NOMÉS amb el text unificat, sense explicacions addicionals."""
-    
-    # Processar cada refugi
-    for i, refuge in enumerate(refuges, 1):
-        name = refuge.get('name', 'Sense nom')
-        description = refuge.get('description', '')
-        remarque = refuge.get('remarque', '')
-        
-        # Convertir a string si són llistes
-        if isinstance(description, list):
-            description = ' '.join(str(d) for d in description if d)
-        if isinstance(remarque, list):
-            remarque = ' '.join(str(r) for r in remarque if r)
-        
-        # Si tots dos estan buits, guardar buit
-        if not description and not remarque:
-            merged_refuges.append({
-                'name': name,
-                'description': ''
-            })
-            print(f"[{i}/{len(refuges)}] {name}: Sense descripció ni remarque")
-            continue
-        
-        # Si només un està omplert, usar-lo directament
-        if not description:
-            merged_refuges.append({
-                'name': name,
-                'description': remarque
-            })
-            print(f"[{i}/{len(refuges)}] {name}: Només remarque")
-            continue
-        
-        if not remarque:
-            merged_refuges.append({
-                'name': name,
-                'description': description
-            })
-            print(f"[{i}/{len(refuges)}] {name}: Només description")
-            continue
-        
-        # Si tots dos estan omplerts, enviar a GPT-4
-        user_prompt = f"""Refugi: {name}
+
+
+def join_text(value):
+    """Converteix description/remarque a string si són llistes"""
+    if isinstance(value, list):
+        return ' '.join(str(v) for v in value if v)
+    return value or ''
+
+
+def build_user_prompt(name, description, remarque):
+    return f"""Refugi: {name}
 
 Description: {description}
 
 Remarque: {remarque}
 
 Uneix aquests dos textos en una sola descripció cohesionada."""
-        
+
+
+def cache_key(description, remarque, model=MODEL, system_prompt=SYSTEM_PROMPT):
+    """Hash del contingut que determina la resposta del model"""
+    content = json.dumps([description, remarque, system_prompt, model], ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def load_jsonl(path):
+    """Llegeix un fitxer JSON Lines (ignora l'última línia si ha quedat a mitges)"""
+    entries = []
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return entries
+
+
+class JsonlAppender:
+    """Escriu línies JSON a un fitxer de manera segura entre fils (una línia per crida)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, entry):
+        if not self.path:
+            return
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def load_manifest(path):
+    """
+    Llegeix el manifest de l'execució anterior:
+    {(nom, hash d'entrada): {'description': descripció unida, 'error': bool}}
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    return {(e['name'], e['key']): {'description': e['description'], 'error': bool(e.get('error'))}
+            for e in entries}
+
+
+def diff_inputs(refuges, keys, previous):
+    """
+    Compara les entrades actuals amb les de l'execució anterior.
+    Retorna els índexs dels refugis sense canvis, amb textos canviats i nous,
+    i el nombre de refugis que ja no hi són. Els refugis que a l'execució
+    anterior van acabar amb error compten com a canviats (es tornen a provar).
+    """
+    previous_names = {name for name, _ in previous}
+    current = set()
+    diff = {'unchanged': [], 'changed': [], 'new': []}
+
+    for i, refuge in enumerate(refuges):
+        name = refuge.get('name', 'Sense nom')
+        current.add((name, keys[i]))
+        entry = previous.get((name, keys[i]))
+        if entry is not None and not entry['error']:
+            diff['unchanged'].append(i)
+        elif name in previous_names:
+            diff['changed'].append(i)
+        else:
+            diff['new'].append(i)
+
+    removed = {name for name, _ in previous} - {name for name, _ in current}
+    diff['removed'] = len(removed)
+    return diff
+
+
+def is_rate_limit_error(error):
+    """Detecta errors de límit de peticions (RateLimitError d'OpenAI o HTTP 429)"""
+    return type(error).__name__ == 'RateLimitError' or getattr(error, 'status_code', None) == 429
+
+
+def create_with_retry(client, messages, model=MODEL, max_retries=5, base_delay=2.0):
+    """
+    Crida el model reintentant amb espera exponencial (amb jitter) si hi ha
+    errors de límit de peticions. La resta d'errors es propaguen.
+    """
+    for attempt in range(max_retries + 1):
         try:
             response = client.chat.completions.create(
-                model="gpt-4-turbo-preview",  # o "gpt-4" segons disponibilitat
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                model=model,
+                messages=messages,
                 temperature=0.3,
                 max_tokens=1000
             )
-            
-            merged_description = response.choices[0].message.content.strip()
-            
-            merged_refuges.append({
-                'name': name,
-                'description': merged_description
-            })
-            
-            print(f"[{i}/{len(refuges)}] {name}: Processat correctament")
-            
+            return response.choices[0].message.content.strip()
         except Exception as e:
-            print(f"[{i}/{len(refuges)}] {name}: ERROR - {str(e)}")
-            # En cas d'error, combinar manualment
-            merged_refuges.append({
-                'name': name,
-                'description': f"{description} {remarque}"
-            })
-    
+            if not is_rate_limit_error(e) or attempt == max_retries:
+                raise
+            delay = base_delay * (2 ** attempt) * (1 + random.random())
+            print(f"Límit de peticions, reintent {attempt + 1}/{max_retries} en {delay:.1f}s")
+            time.sleep(delay)
+
+
+def merge_descriptions_with_gpt(input_file, output_file, client=None, max_workers=8,
+                                journal_file=None, cache_file=None, model=MODEL,
+                                incremental=False, manifest_file=None):
+    """
+    Uneix els camps description i remarque de cada refugi utilitzant GPT-4.
+
+    - Les crides al model es fan en paral·lel (max_workers fils).
+    - Cada refugi processat s'afegeix al journal (JSONL) tan bon punt acaba,
+      i en tornar a executar es reprèn des d'allà on s'havia quedat.
+    - Les respostes es guarden en una cache indexada pel hash de
+      (description, remarque, prompt, model), de manera que els refugis
+      que no han canviat no es tornen a enviar.
+    - En mode incremental, es compara cada refugi amb les entrades de
+      l'execució anterior (manifest) pel hash dels seus textos i només es
+      processen els que han canviat; la resta reutilitzen la sortida anterior.
+    - El client es pot injectar (qualsevol objecte amb chat.completions.create).
+      Si no, el d'OpenAI només es crea si hi ha refugis per enviar al model
+      (RuntimeError si falta OPENAI_API_KEY).
+    """
+    if journal_file is None:
+        journal_file = os.path.splitext(output_file)[0] + '.journal.jsonl'
+    if cache_file is None:
+        cache_file = os.path.join(os.path.dirname(os.path.abspath(output_file)), 'description_cache.jsonl')
+    if manifest_file is None:
+        manifest_file = os.path.splitext(output_file)[0] + '.manifest.json'
+
+    # Carregar el fitxer de refugis (array JSON o JSON Lines)
+    refuges = list(iter_refuges(input_file))
+
+    total = len(refuges)
+    print(f"Total de refugis a processar: {total}")
+
+    # Hash de les dades d'entrada de cada refugi
+    keys = [cache_key(join_text(r.get('description', '')), join_text(r.get('remarque', '')), model)
+            for r in refuges]
+
+    results = {}
+    errors = set()
+    stats = {'unchanged': 0, 'journal': 0, 'cache': 0, 'gpt': 0, 'errors': 0}
+
+    # Mode incremental: reutilitzar la sortida anterior dels refugis sense canvis
+    if incremental:
+        previous = load_manifest(manifest_file)
+        diff = diff_inputs(refuges, keys, previous)
+        print(f"Mode incremental: {len(diff['unchanged'])} sense canvis, {len(diff['changed'])} canviats, "
+              f"{len(diff['new'])} nous, {diff['removed']} eliminats")
+        for i in diff['unchanged']:
+            results[i] = previous[(refuges[i].get('name', 'Sense nom'), keys[i])]['description']
+        stats['unchanged'] = len(results)
+
+    # Reprendre des del journal (només entrades sense error i amb les mateixes dades d'entrada)
+    for entry in load_jsonl(journal_file):
+        index = entry.get('index')
+        if (isinstance(index, int) and 0 <= index < total and not entry.get('error')
+                and entry.get('key') == keys[index]):
+            if index not in results:
+                results[index] = entry['description']
+                stats['journal'] += 1
+    if stats['journal']:
+        print(f"Reprenent: {stats['journal']} refugis ja processats al journal")
+
+    cache = {entry['key']: entry['description'] for entry in load_jsonl(cache_file)}
+    journal = JsonlAppender(journal_file)
+    cache_writer = JsonlAppender(cache_file)
+
+    def record(index, name, description, status, error=False):
+        results[index] = description
+        if error:
+            errors.add(index)
+        journal.append({'index': index, 'name': name, 'key': keys[index],
+                        'description': description, 'error': error})
+        print(f"[{index + 1}/{total}] {name}: {status}")
+
+    pending = []
+
+    # Processar cada refugi
+    for i, refuge in enumerate(refuges):
+        if i in results:
+            continue
+
+        name = refuge.get('name', 'Sense nom')
+        description = join_text(refuge.get('description', ''))
+        remarque = join_text(refuge.get('remarque', ''))
+
+        # Si tots dos estan buits, guardar buit
+        if not description and not remarque:
+            record(i, name, '', "Sense descripció ni remarque")
+        # Si només un està omplert, usar-lo directament
+        elif not description:
+            record(i, name, remarque, "Només remarque")
+        elif not remarque:
+            record(i, name, description, "Només description")
+        else:
+            key = keys[i]
+            if key in cache:
+                stats['cache'] += 1
+                record(i, name, cache[key], "Recuperat de la cache")
+            else:
+                pending.append((i, name, description, remarque, key))
+
+    if pending and client is None:
+        # El client d'OpenAI només cal si hi ha refugis per enviar al model
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            raise RuntimeError(f"Cal configurar la variable d'entorn OPENAI_API_KEY per unir {len(pending)} refugis "
+                               f"(exemple: $env:OPENAI_API_KEY='sk-...')")
+        from openai import OpenAI
+
+        client = OpenAI(api_key=api_key)
+
+    # Si tots dos estan omplerts, enviar a GPT-4 en paral·lel
+    def merge_one(item):
+        i, name, description, remarque, key = item
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_user_prompt(name, description, remarque)}
+        ]
+        return create_with_retry(client, messages, model)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(merge_one, item): item for item in pending}
+        for future in as_completed(futures):
+            i, name, description, remarque, key = futures[future]
+            try:
+                merged_description = future.result()
+                cache[key] = merged_description
+                cache_writer.append({'key': key, 'description': merged_description})
+                stats['gpt'] += 1
+                record(i, name, merged_description, "Processat correctament")
+            except Exception as e:
+                stats['errors'] += 1
+                # En cas d'error, combinar manualment (es tornarà a provar en reprendre)
+                record(i, name, f"{description} {remarque}", f"ERROR - {str(e)}", error=True)
+
+    merged_refuges = [
+        {'name': refuge.get('name', 'Sense nom'), 'description': results[i]}
+        for i, refuge in enumerate(refuges)
+    ]
+
     # Guardar el resultat
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(merged_refuges, f, ensure_ascii=False, indent=2)
-    
+    write_refuges(output_file, merged_refuges, indent=2)
+
+    # Guardar el manifest per a la propera execució incremental
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump([{'name': r['name'], 'key': keys[i], 'description': r['description'], 'error': i in errors}
+                   for i, r in enumerate(merged_refuges)], f, ensure_ascii=False)
+
     print(f"\nProcessament completat!")
     print(f"Resultat guardat a: {output_file}")
     print(f"Total refugis processats: {len(merged_refuges)}")
+    print(f"Sense canvis: {stats['unchanged']}, del journal: {stats['journal']}, de la cache: {stats['cache']}, "
+          f"crides a GPT: {stats['gpt']}, errors: {stats['errors']}")
+
+    return merged_refuges
 
 if __name__ == "__main__":
-    input_file = "refuges_name_description_remarque.json"
-    output_file = "data_refuges_description_merged.json"
-    
-    # Verificar que la clau API està configurada
-    if not os.getenv('OPENAI_API_KEY'):
-        print("ERROR: Cal configurar la variable d'entorn OPENAI_API_KEY")
-        print("Exemple: $env:OPENAI_API_KEY='sk-...'")
-    else:
-        merge_descriptions_with_gpt(input_file, output_file)
+    input_file = data_path("refuges_name_description_remarque.json")
+    output_file = data_path("data_refuges_description_merged.json")
+
+    # incremental=True: només es tornen a unir els refugis amb textos canviats
+    # (la clau API només cal si n'hi ha algun que no és al journal ni a la cache)
+    try:
+        merge_descriptions_with_gpt(input_file, output_file, incremental=True)
+    except (ImportError, RuntimeError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    # Els refugis amb error es tornaran a provar a la propera execució
+    manifest = load_manifest(os.path.splitext(output_file)[0] + '.manifest.json')
+    errors = sum(1 for entry in manifest.values() if entry['error'])
+    if errors:
+        print(f"ERROR: {errors} refugis no s'han pogut unir amb GPT")
+        sys.exit(1)
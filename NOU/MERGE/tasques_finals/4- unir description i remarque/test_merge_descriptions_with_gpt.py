@@ -0,0 +1,62 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from merge_descriptions_with_gpt import merge_descriptions_with_gpt
+
+
+class FakeClient:
+    """Client amb la interfície de chat.completions que falla les primeres `failures` crides"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("error de connexió")
+        message = SimpleNamespace(content="descripció unida")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_errors_are_retried_in_incremental_mode(tmp_path):
+    input_file = tmp_path / "refuges.json"
+    output_file = tmp_path / "merged.json"
+    with open(input_file, 'w', encoding='utf-8') as f:
+        json.dump([{'name': 'Refugi 1', 'description': 'd1', 'remarque': 'r1'}], f)
+
+    client = FakeClient(failures=1)
+    first = merge_descriptions_with_gpt(str(input_file), str(output_file), client=client, incremental=True)
+    assert client.calls == 1
+    assert first[0]['description'] == "d1 r1"
+
+    second = merge_descriptions_with_gpt(str(input_file), str(output_file), client=client, incremental=True)
+    assert client.calls == 2
+    assert second[0]['description'] == "descripció unida"
+
+    # Un cop resolt, la tercera execució reutilitza el manifest sense cridar el model
+    third = merge_descriptions_with_gpt(str(input_file), str(output_file), client=client, incremental=True)
+    assert client.calls == 2
+    assert third[0]['description'] == "descripció unida"
+
+
+def test_no_api_key_needed_when_nothing_is_pending(tmp_path, monkeypatch):
+    input_file = tmp_path / "refuges.json"
+    output_file = tmp_path / "merged.json"
+    with open(input_file, 'w', encoding='utf-8') as f:
+        json.dump([{'name': 'Refugi 1', 'description': 'd1', 'remarque': 'r1'},
+                   {'name': 'Refugi 2', 'description': 'd2', 'remarque': ''}], f)
+    merge_descriptions_with_gpt(str(input_file), str(output_file), client=FakeClient(), incremental=True)
+
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    merged = merge_descriptions_with_gpt(str(input_file), str(output_file), incremental=True)
+    assert [r['description'] for r in merged] == ["descripció unida", "d2"]
+
+    # Un refugi nou sí que necessita el model
+    with open(input_file, 'w', encoding='utf-8') as f:
+        json.dump([{'name': 'Refugi 3', 'description': 'd3', 'remarque': 'r3'}], f)
+    with pytest.raises(RuntimeError):
+        merge_descriptions_with_gpt(str(input_file), str(output_file), incremental=True)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compara la càrrega de final_data_refuges.json amb json.load i la del fitxer
+binari (final_data_refuges.bin, generat per export_bundle.py).
+
+Cada mètode s'executa en un procés nou per mesurar la memòria (RSS) que hi
+afegeix la càrrega, i el temps és el millor de REPEATS repeticions.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.bundle import RefugeBundle
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+JSON_FILE = os.path.join(SCRIPT_DIR, '..', '..', '..', '..', 'final_data_refuges.json')
+BUNDLE_FILE = os.path.join(SCRIPT_DIR, 'final_data_refuges.bin')
+REPEATS = 5
+
+
+def load_json():
+    with open(JSON_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def open_bundle():
+    return RefugeBundle(BUNDLE_FILE)
+
+
+def bundle_one_refuge():
+    bundle = RefugeBundle(BUNDLE_FILE)
+    return bundle, bundle.refuge(bundle.n // 2)
+
+
+def bundle_filter():
+    bundle = RefugeBundle(BUNDLE_FILE)
+    return bundle, bundle['info_comp'].query('eau AND cheminee AND NOT manque_un_mur').sum()
+
+
+def bundle_all_refuges():
+    return RefugeBundle(BUNDLE_FILE).to_refuges()
+
+
+METHODS = {
+    'json.load': load_json,
+    'bundle: obrir': open_bundle,
+    'bundle: obrir + 1 refugi': bundle_one_refuge,
+    'bundle: obrir + filtre de serveis': bundle_filter,
+    'bundle: obrir + tots els refugis': bundle_all_refuges,
+}
+
+
+def current_rss_kb():
+    """Memòria resident del procés en KB (None si no es pot saber)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
+    except ImportError:
+        return None
+
+
+def measure(name):
+    """Executa un mètode (en aquest procés) i escriu el temps i la memòria en JSON"""
+    method = METHODS[name]
+    rss_before = current_rss_kb()
+    result = method()
+    rss_after = current_rss_kb()
+    del result
+
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = method()
+        best = min(best, time.perf_counter() - start)
+        del result
+
+    rss = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    print(json.dumps({'time_ms': best * 1000, 'rss_kb': rss}))
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--measure':
+        measure(sys.argv[2])
+        return 0
+
+    if not os.path.exists(BUNDLE_FILE):
+        print(f"No s'ha trobat {BUNDLE_FILE}: executa primer export_bundle.py")
+        return 1
+
+    print(f"JSON:    {os.path.getsize(JSON_FILE) / 1024:8.0f} KB")
+    print(f"Binari:  {os.path.getsize(BUNDLE_FILE) / 1024:8.0f} KB\n")
+    print(f"{'Mètode':36} {'Temps (ms)':>12} {'RSS (KB)':>10}")
+    print("-" * 60)
+    for name in METHODS:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', name],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output)
+        rss = f"{result['rss_kb']:10d}" if result['rss_kb'] is not None else f"{'n/d':>10}"
+        print(f"{name:36} {result['time_ms']:12.2f} {rss}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
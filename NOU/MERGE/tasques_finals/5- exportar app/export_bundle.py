@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exporta final_data_refuges.json al fitxer binari que carrega l'app
+(format de common/bundle.py) i comprova que es llegeix igual que el JSON.
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.bundle import RefugeBundle, write_bundle
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILE = os.path.join(SCRIPT_DIR, '..', '..', '..', '..', 'final_data_refuges.json')
+OUTPUT_FILE = os.path.join(SCRIPT_DIR, 'final_data_refuges.bin')
+
+
+def main():
+    print(f"Llegint {os.path.normpath(INPUT_FILE)}...")
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        refuges = json.load(f)
+
+    size = write_bundle(refuges, OUTPUT_FILE)
+    json_size = os.path.getsize(INPUT_FILE)
+    print(f"Refugis exportats: {len(refuges)}")
+    print(f"Mida JSON: {json_size / 1024:.0f} KB")
+    print(f"Mida binari: {size / 1024:.0f} KB ({size / json_size * 100:.0f}% del JSON)")
+
+    # Verificar que el fitxer binari conté exactament els mateixos refugis
+    with RefugeBundle(OUTPUT_FILE) as bundle:
+        if bundle.to_refuges() != refuges:
+            print("✗ ERROR: el fitxer binari no coincideix amb el JSON")
+            return 1
+    print("✓ El fitxer binari coincideix amb el JSON")
+    print(f"Fitxer generat: {OUTPUT_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parteix final_data_refuges.json en tessel·les de mapa (z/x/y, esquema slippy map)
+perquè l'app només carregui els refugis de la zona visible:
+
+- Zooms baixos (CLUSTER_ZOOMS): cada tessel·la conté el nombre de refugis, el
+  centroide i els clústers de les seves subtessel·les (CLUSTER_DEPTH nivells més avall).
+- Zooms alts (DETAIL_ZOOMS): cada tessel·la conté els refugis complets.
+- tiles/manifest.json llista totes les tessel·les amb el nombre de refugis,
+  el centroide i la mida del fitxer.
+"""
+
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.geo import refuges_to_arrays
+from common.tiles import children_clusters, cluster_summary, partition, tile_bounds, tile_path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILE = os.path.join(SCRIPT_DIR, '..', '..', '..', '..', 'final_data_refuges.json')
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'tiles')
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, 'manifest.json')
+
+# Zooms amb clústers i zooms amb els refugis complets
+CLUSTER_ZOOMS = (4, 5, 6, 7, 8, 9)
+DETAIL_ZOOMS = (10, 12)
+# Els clústers d'una tessel·la de zoom z són les seves subtessel·les de zoom z + CLUSTER_DEPTH (8x8)
+CLUSTER_DEPTH = 3
+
+
+def write_tile(tile, data):
+    """Escriu una tessel·la (JSON compacte) i retorna la seva mida en bytes"""
+    path = os.path.join(OUTPUT_DIR, tile_path(tile))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    return os.path.getsize(path)
+
+
+def export_tiles(refuges):
+    """Escriu totes les tessel·les i retorna el manifest i les mides dels fitxers per zoom"""
+    lats, lons = refuges_to_arrays(refuges)
+    manifest_tiles = {}
+    sizes = {}
+
+    for zoom in CLUSTER_ZOOMS + DETAIL_ZOOMS:
+        sizes[zoom] = []
+        for tile, indices in partition(lats, lons, zoom).items():
+            summary = cluster_summary(lats, lons, indices)
+            data = {'tile': list(tile), 'bounds': tile_bounds(*tile), 'count': summary['count'],
+                    'centroid': summary['centroid']}
+            if zoom in CLUSTER_ZOOMS:
+                data['clusters'] = children_clusters(lats, lons, indices, zoom + CLUSTER_DEPTH)
+            else:
+                data['refuges'] = [refuges[i] for i in indices]
+            size = write_tile(tile, data)
+            sizes[zoom].append(size)
+            manifest_tiles[tile_path(tile)[:-len('.json')]] = {
+                'count': summary['count'],
+                'centroid': summary['centroid'],
+                'bytes': size,
+            }
+
+    with_coords = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+    manifest = {
+        'refuges': len(refuges),
+        'refuges_without_coords': len(refuges) - len(with_coords),
+        'bounds': cluster_summary(lats, lons, with_coords)['bounds'] if len(with_coords) else None,
+        'cluster_zooms': list(CLUSTER_ZOOMS),
+        'cluster_depth': CLUSTER_DEPTH,
+        'detail_zooms': list(DETAIL_ZOOMS),
+        'tiles': manifest_tiles,
+    }
+    return manifest, sizes
+
+
+def main():
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        refuges = json.load(f)
+
+    # Les tessel·les d'una execució anterior poden no existir ara
+    if os.path.isdir(OUTPUT_DIR):
+        shutil.rmtree(OUTPUT_DIR)
+
+    manifest, sizes = export_tiles(refuges)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"Refugis: {manifest['refuges']} ({manifest['refuges_without_coords']} sense coordenades)")
+    print(f"\n{'Zoom':>4} {'Contingut':>10} {'Tessel·les':>11} {'Mitjana (KB)':>13} {'Màxim (KB)':>11}")
+    for zoom, tile_sizes in sizes.items():
+        content = 'clústers' if zoom in CLUSTER_ZOOMS else 'refugis'
+        # Sense refugis amb coordenades no hi ha cap tessel·la
+        average = sum(tile_sizes) / len(tile_sizes) if tile_sizes else 0
+        largest = max(tile_sizes, default=0)
+        print(f"{zoom:>4} {content:>10} {len(tile_sizes):>11} "
+              f"{average / 1024:>13.1f} {largest / 1024:>11.1f}")
+    print(f"\nManifest: {os.path.getsize(MANIFEST_FILE) / 1024:.1f} KB")
+    print(f"Tessel·les generades a: {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Mòduls compartits pels scripts de tractament de dades de refugis
+"""
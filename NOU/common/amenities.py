@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serveis dels refugis (camps 0/1 de `info_comp`) com a conjunts de bits.
+
+Cada servei té una posició fixa (AMENITIES). Un `info_comp` es codifica amb
+dos enters: `bits` (serveis a 1) i `present` (camps que hi són, a 0 o a 1).
+Unir dos refugis és una OR d'enters, i les consultes ("eau AND cheminee AND
+NOT manque_un_mur") es compilen un sol cop i s'avaluen igual sobre un enter
+o sobre un array de NumPy amb els bits de tots els refugis.
+
+'mezzanine/etage' (nom dels fitxers de refusPyrenees) és un àlies de
+'mezzanine_etage': ocupen el mateix bit i es conserva el nom original de la clau.
+"""
+
+import re
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Ordre fix dels bits (el de final_data_refuges.json)
+AMENITIES = ('manque_un_mur', 'cheminee', 'poele', 'couvertures', 'latrines', 'bois', 'eau',
+             'matelas', 'couchage', 'bas_flancs', 'lits', 'mezzanine_etage')
+
+ALIASES = {'mezzanine/etage': 'mezzanine_etage'}
+
+BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(AMENITIES)}
+BITS.update({alias: BITS[name] for alias, name in ALIASES.items()})
+
+Bits = Union[int, np.ndarray]
+
+
+def amenity_bit(name: str) -> int:
+    """Bit d'un servei (accepta els àlies)"""
+    try:
+        return BITS[name]
+    except KeyError:
+        raise ValueError(f"Servei desconegut: {name} (disponibles: {', '.join(AMENITIES)})")
+
+
+def encode(info_comp: Optional[Dict]) -> Tuple[int, int]:
+    """
+    (bits, present) d'un diccionari info_comp.
+    ValueError si té camps desconeguts, valors que no són 0/1 o un camp repetit amb un àlies.
+    """
+    bits = present = 0
+    for name, value in (info_comp or {}).items():
+        bit = amenity_bit(name)
+        if type(value) is not int or value not in (0, 1):
+            raise ValueError(f"Valor no binari a info_comp: {name}={value!r}")
+        if present & bit:
+            raise ValueError(f"Camp repetit a info_comp: {name}")
+        present |= bit
+        if value:
+            bits |= bit
+    return bits, present
+
+
+def decode(bits: int, keys: Iterable[str]) -> Dict[str, int]:
+    """Diccionari info_comp amb les claus donades, en l'ordre fix dels bits"""
+    return {key: 1 if bits & amenity_bit(key) else 0 for key in sorted(keys, key=amenity_bit)}
+
+
+class AmenitySet(NamedTuple):
+    """Serveis d'un refugi: bits a 1 (`bits`) i camps presents (`present`)"""
+    bits: int = 0
+    present: int = 0
+
+    @classmethod
+    def from_info_comp(cls, info_comp: Optional[Dict]) -> 'AmenitySet':
+        return cls(*encode(info_comp))
+
+    def __or__(self, other: 'AmenitySet') -> 'AmenitySet':
+        return AmenitySet(self.bits | other.bits, self.present | other.present)
+
+    def __contains__(self, name: str) -> bool:
+        return bool(self.bits & amenity_bit(name))
+
+    def to_info_comp(self, keys: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Diccionari info_comp amb els camps presents (o amb les claus donades)"""
+        if keys is None:
+            keys = [name for name in AMENITIES if self.present & BITS[name]]
+        return decode(self.bits, keys)
+
+
+def merge(info1: Optional[Dict], info2: Optional[Dict]) -> Dict[str, int]:
+    """
+    Unió OR de dos info_comp: els camps de tots dos, a 1 si algun el té a 1.
+    Les claus surten en l'ordre fix dels bits (i amb el nom que tenien).
+    """
+    merged = AmenitySet.from_info_comp(info1) | AmenitySet.from_info_comp(info2)
+    keys = dict.fromkeys(info1 or {})
+    keys.update(dict.fromkeys(info2 or {}))
+    return merged.to_info_comp(keys)
+
+
+def encode_many(refuges: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Arrays (bits, present) dels info_comp d'una llista de refugis"""
+    bits = np.zeros(len(refuges), dtype=np.uint16)
+    present = np.zeros(len(refuges), dtype=np.uint16)
+    for row, refuge in enumerate(refuges):
+        bits[row], present[row] = encode(refuge.get('info_comp'))
+    return bits, present
+
+
+class AmenityQuery:
+    """
+    Consulta sobre els serveis, p. ex. "has eau AND cheminee AND NOT manque_un_mur".
+    Operadors AND, OR i NOT (en aquest ordre de prioritat de més a menys: NOT,
+    AND, OR), parèntesis, i "has" opcional davant de cada servei. Un camp que
+    no hi és compta com a 0.
+    """
+
+    _TOKEN = re.compile(r'\(|\)|[^\s()]+')
+
+    def __init__(self, text: str):
+        self.text = text
+        self._tokens = self._TOKEN.findall(text)
+        self._pos = 0
+        self._evaluate = self._parse_or()
+        if self._pos != len(self._tokens):
+            self._error(f"no s'esperava '{self._tokens[self._pos]}'")
+        del self._tokens
+
+    @classmethod
+    def parse(cls, text: str) -> 'AmenityQuery':
+        return cls(text)
+
+    def __repr__(self) -> str:
+        return f"AmenityQuery({self.text!r})"
+
+    def __call__(self, bits: Bits) -> Union[bool, np.ndarray]:
+        """Avalua la consulta sobre un enter de bits o sobre un array (màscara booleana)"""
+        return self._evaluate(bits)
+
+    def mask(self, refuges: Sequence[Dict]) -> np.ndarray:
+        """Màscara dels refugis que compleixen la consulta"""
+        bits, _ = encode_many(refuges)
+        return self(bits)
+
+    def filter(self, refuges: Sequence[Dict]) -> List[Dict]:
+        """Refugis que compleixen la consulta, en l'ordre original"""
+        return [refuges[i] for i in np.flatnonzero(self.mask(refuges))]
+
+    # Parser descendent recursiu: or -> and (OR and)*, and -> not (AND not)*,
+    # not -> NOT not | atom, atom -> ( or ) | [has] servei
+
+    def _error(self, message: str):
+        raise ValueError(f"Consulta de serveis no vàlida ({self.text!r}): {message}")
+
+    def _peek(self) -> Optional[str]:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _accept(self, keyword: str) -> bool:
+        token = self._peek()
+        if token is not None and token.upper() == keyword:
+            self._pos += 1
+            return True
+        return False
+
+    def _parse_or(self) -> Callable:
+        terms = [self._parse_and()]
+        while self._accept('OR'):
+            terms.append(self._parse_and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda bits: _reduce(np.logical_or, terms, bits)
+
+    def _parse_and(self) -> Callable:
+        terms = [self._parse_not()]
+        while self._accept('AND'):
+            terms.append(self._parse_not())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda bits: _reduce(np.logical_and, terms, bits)
+
+    def _parse_not(self) -> Callable:
+        if self._accept('NOT'):
+            term = self._parse_not()
+            return lambda bits: np.logical_not(term(bits))
+        return self._parse_atom()
+
+    def _parse_atom(self) -> Callable:
+        if self._accept('('):
+            term = self._parse_or()
+            if not self._accept(')'):
+                self._error("falta ')'")
+            return term
+        self._accept('HAS')
+        token = self._peek()
+        if token is None or token == ')' or token.upper() in ('AND', 'OR', 'NOT'):
+            self._error("s'esperava un servei")
+        self._pos += 1
+        try:
+            bit = amenity_bit(token.lower())
+        except ValueError as e:
+            self._error(str(e))
+        return lambda bits: (bits & bit) != 0
+
+
+def _reduce(operator, terms: List[Callable], bits: Bits):
+    result = terms[0](bits)
+    for term in terms[1:]:
+        result = operator(result, term(bits))
+    return result
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Emparellament bipartit de pes màxim sobre una matriu de puntuacions dispersa.
+
+Les parelles candidates es donen com a arestes (fila, columna, pes) amb pes
+positiu. El graf es divideix en components connexes i cada component (petita,
+perquè les arestes ja venen filtrades pel blocking espacial) es resol amb
+l'algorisme hongarès sobre una matriu densa. Una fila o columna sense aresta
+assignada queda sense parella.
+
+El resultat no depèn de l'ordre en què es processen els refugis, a diferència
+de l'emparellament voraç.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+Edge = Tuple[int, int, float]
+
+
+def linear_sum_assignment_min(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Assignació de cost mínim d'una matriu n x m amb n <= m (algorisme hongarès
+    amb camins augmentadors i potencials, O(n^2 m)). Retorna [(fila, columna)]
+    per a totes les files.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # p[j]: fila (1..n) assignada a la columna j; la columna 0 és fictícia
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            free = ~used[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Desfer el camí augmentador
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    return sorted((int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j])
+
+
+def connected_components(edges: List[Edge]) -> List[List[Edge]]:
+    """Agrupa les arestes per components connexes del graf bipartit"""
+    parent: Dict[Tuple[str, int], Tuple[str, int]] = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for row, col, _ in edges:
+        root_row, root_col = find(('row', row)), find(('col', col))
+        if root_row != root_col:
+            parent[max(root_row, root_col)] = min(root_row, root_col)
+
+    groups: Dict[Tuple[str, int], List[Edge]] = defaultdict(list)
+    for edge in edges:
+        groups[find(('row', edge[0]))].append(edge)
+    return [groups[root] for root in sorted(groups)]
+
+
+def max_weight_matching(edges: Iterable[Edge]) -> List[Edge]:
+    """
+    Emparellament de pes total màxim: cada fila i cada columna com a molt en
+    una aresta. Només es tenen en compte les arestes de pes positiu.
+    Retorna les arestes escollides ordenades per fila.
+    """
+    edges = [edge for edge in edges if edge[2] > 0]
+    matching = []
+    for component in connected_components(edges):
+        rows = sorted({row for row, _, _ in component})
+        cols = sorted({col for _, col, _ in component})
+        if len(rows) == 1 or len(cols) == 1:
+            # Cas trivial: l'aresta de més pes (la primera en cas d'empat)
+            matching.append(max(component, key=lambda e: (e[2], -e[0], -e[1])))
+            continue
+
+        row_pos = {row: k for k, row in enumerate(rows)}
+        col_pos = {col: k for k, col in enumerate(cols)}
+        # Matriu quadrada: les caselles sense aresta valen 0 (= sense parella)
+        size = max(len(rows), len(cols))
+        weights = np.zeros((size, size))
+        for row, col, weight in component:
+            weights[row_pos[row], col_pos[col]] = weight
+
+        for r, c in linear_sum_assignment_min(-weights):
+            if r < len(rows) and c < len(cols) and weights[r, c] > 0:
+                matching.append((rows[r], cols[c], float(weights[r, c])))
+
+    matching.sort()
+    return matching
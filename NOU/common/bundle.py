@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fitxer binari compacte de refugis per a l'app, llegible amb mmap sense copiar.
+
+El fitxer guarda les columnes de `RefugeColumns` (common/columnar.py) tal
+com són a memòria:
+
+    REFUGIS + versió (uint32) + mida de la capçalera (uint32)
+    capçalera JSON: nombre de refugis, layouts, categories, valors que no
+                    encaixen a cap columna i, per a cada array, dtype/offset/mida
+    arrays de NumPy alineats a 8 bytes (codis, bits, float64, offsets, i el
+                    buffer UTF-8 amb tots els textos)
+
+`RefugeBundle` mapeja el fitxer a memòria i crea els arrays amb
+`np.frombuffer` sobre el mapa: obrir-lo només llegeix la capçalera, i cada
+refugi es descodifica quan es demana (`bundle.refuge(i)`). Les consultes
+sobre columnes (`bundle['info_comp'].query(...)`, `bundle['type'].equals(...)`)
+treballen directament sobre el fitxer mapejat.
+"""
+
+import json
+import mmap
+import struct
+from typing import Any, Dict, List, Sequence, Union
+
+import numpy as np
+
+from common.columnar import CategoricalColumn, FlagsColumn, NumericColumn, RefugeColumns, TextColumn
+
+MAGIC = b'REFUGIS'
+VERSION = 1
+_PREFIX = struct.Struct('<7sBI')
+_ALIGN = 8
+
+_COLUMN_TYPES = {cls.__name__: cls for cls in (NumericColumn, CategoricalColumn, TextColumn, FlagsColumn)}
+
+
+def _pad(size: int) -> int:
+    return (-size) % _ALIGN
+
+
+def _layout_to_json(layout):
+    return [[key, list(subkeys) if subkeys is not None else None] for key, subkeys in layout]
+
+
+def _layout_from_json(layout):
+    return tuple((key, tuple(subkeys) if subkeys is not None else None) for key, subkeys in layout)
+
+
+def write_bundle(refuges: Union[Sequence[Dict], RefugeColumns], path: str) -> int:
+    """Escriu els refugis (llista o RefugeColumns) al fitxer binari. Retorna la mida en bytes"""
+    columns = refuges if isinstance(refuges, RefugeColumns) else RefugeColumns.from_refuges(refuges)
+
+    arrays: List[np.ndarray] = []
+    descriptors: Dict[str, Any] = {}
+
+    def add_array(array: np.ndarray) -> int:
+        arrays.append(np.ascontiguousarray(array))
+        return len(arrays) - 1
+
+    for field, column in columns.columns.items():
+        state = {'class': type(column).__name__, 'arrays': {}}
+        for attr, value in vars(column).items():
+            if isinstance(value, np.ndarray):
+                state['arrays'][attr] = add_array(value)
+            elif isinstance(value, (bytes, memoryview)):
+                state['arrays'][attr] = add_array(np.frombuffer(value, dtype=np.uint8))
+        state['other'] = {str(row): value for row, value in column.other.items()}
+        if isinstance(column, CategoricalColumn):
+            state['categories'] = [list(c) if isinstance(c, tuple) else c for c in column.categories]
+        descriptors[field] = state
+
+    layout_index = add_array(columns.layout)
+
+    header = {
+        'n': columns.n,
+        'layouts': [_layout_to_json(layout) for layout in columns.layouts],
+        'layout': layout_index,
+        'other_coords': {str(row): value for row, value in columns.other_coords.items()},
+        'columns': descriptors,
+        'arrays': [],
+    }
+    header_size = 0
+    while True:
+        offset = _PREFIX.size + header_size
+        offset += _pad(offset)
+        entries = []
+        for array in arrays:
+            entries.append([array.dtype.str, offset, array.size])
+            offset += array.nbytes + _pad(array.nbytes)
+        header['arrays'] = entries
+        encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if len(encoded) == header_size:
+            break
+        # Els offsets depenen de la mida de la capçalera: repetir fins que sigui estable
+        header_size = len(encoded)
+
+    with open(path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(b'\0' * _pad(_PREFIX.size + len(encoded)))
+        for array in arrays:
+            f.write(array.tobytes())
+            f.write(b'\0' * _pad(array.nbytes))
+        return f.tell()
+
+
+class RefugeBundle(RefugeColumns):
+    """
+    Lector del fitxer binari: les columnes són vistes sobre el fitxer mapejat a
+    memòria (sense còpia). S'utilitza com RefugeColumns (refuge(i), to_refuges(),
+    value(), columnes...).
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = _PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no és un fitxer de refugis")
+        if version != VERSION:
+            raise ValueError(f"{path}: versió {version} no suportada (s'esperava {VERSION})")
+        header = json.loads(self._mmap[_PREFIX.size:_PREFIX.size + header_size].decode('utf-8'))
+
+        arrays = [np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=size, offset=offset)
+                  for dtype, offset, size in header['arrays']]
+
+        self.n = header['n']
+        self.layouts = [_layout_from_json(layout) for layout in header['layouts']]
+        self.layout = arrays[header['layout']]
+        self.other_coords = {int(row): value for row, value in header['other_coords'].items()}
+        self.columns = {}
+        for field, state in header['columns'].items():
+            column = _COLUMN_TYPES[state['class']].__new__(_COLUMN_TYPES[state['class']])
+            for attr, index in state['arrays'].items():
+                setattr(column, attr, arrays[index])
+            column.other = {int(row): value for row, value in state['other'].items()}
+            if 'categories' in state:
+                column.categories = [tuple(c) if isinstance(c, list) else c for c in state['categories']]
+                column.index_categories()
+            self.columns[field] = column
+
+    def close(self):
+        """Allibera el mapa (si encara hi ha arrays en ús, s'allibera quan deixin d'existir)"""
+        self.columns = {}
+        self.layout = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self) -> 'RefugeBundle':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fitxer de regles de classificació de valors (valor -> grups).
+
+El genera l'etapa de classificació i el llegeixen les etapes següents, en
+lloc de tornar a interpretar l'informe de text. Format (JSON compacte):
+
+    {"schema": "regles-classificacio", "version": 1,
+     "groups": [{"name": "MATELAS", "description": "..."}, ...],
+     "values": {"<value_key(valor)>": {"value": "...", "flags": 5,
+                                       "refuges": ["Nom", ...]}, ...}}
+
+`flags` té el bit i activat si el valor és del grup i de "groups". Les
+claus de "values" són un hash estable del valor (`value_key`), de manera
+que els grups d'un valor es troben amb una sola consulta a un diccionari.
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+SCHEMA = 'regles-classificacio'
+SCHEMA_VERSION = 1
+
+
+def value_key(value: str) -> str:
+    """Clau d'un valor al fitxer de regles (SHA-1 del text en UTF-8, 16 xifres)"""
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
+
+
+class ClassificationRules:
+    """Regles carregades: grups i, per a cada valor, els seus grups i refugis"""
+
+    def __init__(self, groups: List[Dict[str, str]], values: Dict[str, Dict]):
+        self.groups = groups
+        self.group_names = [group['name'] for group in groups]
+        self.values = values
+        self._cache: Dict[int, Tuple[str, ...]] = {}
+
+    @classmethod
+    def build(cls, groups: Mapping[str, str], classified: Iterable[Tuple[str, Iterable[str], List[str]]]
+              ) -> 'ClassificationRules':
+        """
+        Regles a partir de {grup: descripció} i de tuples (valor, grups del
+        valor, noms dels refugis que el tenen).
+        """
+        group_list = [{'name': name, 'description': description} for name, description in groups.items()]
+        bits = {name: 1 << i for i, name in enumerate(groups)}
+        values = {}
+        for value, value_groups, refuges in classified:
+            flags = 0
+            for name in value_groups:
+                flags |= bits[name]
+            values[value_key(value)] = {'value': value, 'flags': flags, 'refuges': list(refuges)}
+        return cls(group_list, values)
+
+    def _names(self, flags: int) -> Tuple[str, ...]:
+        names = self._cache.get(flags)
+        if names is None:
+            names = self._cache[flags] = tuple(name for i, name in enumerate(self.group_names) if flags >> i & 1)
+        return names
+
+    def get(self, value: str) -> Optional[Dict]:
+        """Entrada d'un valor ({'value', 'flags', 'refuges'}) o None si no hi és"""
+        return self.values.get(value_key(value))
+
+    def groups_of(self, value: str) -> Tuple[str, ...]:
+        """Grups d'un valor, en l'ordre dels grups (buit si el valor no hi és)"""
+        entry = self.get(value)
+        return self._names(entry['flags']) if entry else ()
+
+    def group_values(self, group: str) -> Iterator[Dict]:
+        """Entrades dels valors d'un grup"""
+        bit = 1 << self.group_names.index(group)
+        return (entry for entry in self.values.values() if entry['flags'] & bit)
+
+    def save(self, path: str) -> None:
+        data = {'schema': SCHEMA, 'version': SCHEMA_VERSION, 'groups': self.groups, 'values': self.values}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'ClassificationRules':
+        """Llegeix un fitxer de regles. ValueError si no té el format esperat"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get('schema') != SCHEMA:
+            raise ValueError(f"{path}: no és un fitxer de regles de classificació")
+        if data.get('version') != SCHEMA_VERSION:
+            raise ValueError(f"{path}: versió {data.get('version')} no suportada (s'esperava {SCHEMA_VERSION})")
+        return cls(data['groups'], data['values'])
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Magatzem columnar de refugis.
+
+Converteix una llista de refugis (diccionaris, esquema de
+`final_data_refuges.json`) en columnes de NumPy i al revés, sense perdre res:
+
+- Numèriques (`altitude`, `places`, `coord.lat`, `coord.long`): array float64.
+- Categòriques (`type`, `region`, `departement`): codis int32 sobre una llista
+  de categories (una llista de valors es guarda com una categoria tupla).
+- `info_comp`: una màscara de bits uint16 amb els valors (`bits`) i una altra
+  amb els camps presents (`present`), amb l'ordre de bits fix de `common.amenities`.
+- Text (la resta de camps): tots els strings en un sol buffer UTF-8 amb
+  offsets; cada fila apunta a un rang d'strings (un string o una llista).
+
+Cada columna té un array `kind` amb l'estat de cada fila (ABSENT, NULL, INT,
+FLOAT, STR, LIST, DICT o OTHER). Els valors que no encaixen amb el tipus de la
+columna (OTHER) es guarden tal qual a part, i l'ordre de les claus de cada
+refugi es guarda com un "layout" codificat per diccionari, de manera que
+`to_refuges()` retorna exactament la mateixa llista.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from common.amenities import AmenityQuery, AmenitySet, amenity_bit, encode as encode_amenities
+
+# Estat d'un valor dins d'una columna (arrays `kind`, uint8)
+ABSENT, NULL, INT, FLOAT, STR, LIST, DICT, OTHER = range(8)
+
+NUMERIC_FIELDS = ('altitude', 'places')
+CATEGORICAL_FIELDS = ('type', 'region', 'departement')
+COORD_FIELDS = ('lat', 'long')
+
+# Enters més grans no es poden representar exactament en float64
+_MAX_EXACT_INT = 2 ** 53
+
+_MISSING = object()
+
+
+class NumericColumn:
+    """Valors numèrics en float64 (NaN si no n'hi ha)"""
+
+    def __init__(self, values: Sequence[Any]):
+        n = len(values)
+        self.values = np.full(n, np.nan)
+        self.kind = np.zeros(n, dtype=np.uint8)
+        self.other: Dict[int, Any] = {}
+        for row, value in enumerate(values):
+            if value is _MISSING:
+                continue
+            if value is None:
+                self.kind[row] = NULL
+            elif type(value) is int and abs(value) <= _MAX_EXACT_INT:
+                self.kind[row] = INT
+                self.values[row] = value
+            elif type(value) is float:
+                self.kind[row] = FLOAT
+                self.values[row] = value
+            else:
+                self.kind[row] = OTHER
+                self.other[row] = value
+
+    def get(self, row: int, default: Any = None) -> Any:
+        kind = self.kind[row]
+        if kind == INT:
+            return int(self.values[row])
+        if kind == FLOAT:
+            return float(self.values[row])
+        if kind == OTHER:
+            return self.other[row]
+        return default if kind == ABSENT else None
+
+
+class CategoricalColumn:
+    """Valors codificats per diccionari: codis int32 (-1 si no és una categoria)"""
+
+    def __init__(self, values: Sequence[Any]):
+        n = len(values)
+        self.codes = np.full(n, -1, dtype=np.int32)
+        self.kind = np.zeros(n, dtype=np.uint8)
+        self.other: Dict[int, Any] = {}
+        self.categories: List[Any] = []
+        self.positions: Dict[Tuple[type, Any], int] = {}
+        for row, value in enumerate(values):
+            if value is _MISSING:
+                continue
+            if value is None:
+                self.kind[row] = NULL
+                continue
+            key = _category_key(value)
+            if key is None:
+                self.kind[row] = OTHER
+                self.other[row] = value
+                continue
+            self.kind[row] = LIST if isinstance(value, list) else _scalar_kind(value)
+            code = self.positions.get(key)
+            if code is None:
+                code = self.positions[key] = len(self.categories)
+                self.categories.append(tuple(value) if isinstance(value, list) else value)
+            self.codes[row] = code
+
+    def index_categories(self):
+        """Reconstrueix el diccionari categoria -> codi a partir de self.categories"""
+        self.positions = {_category_key(category): code for code, category in enumerate(self.categories)}
+
+    def code(self, value: Any) -> int:
+        """Codi d'un valor (-1 si no hi és)"""
+        return self.positions.get(_category_key(value), -1)
+
+    def equals(self, value: Any) -> np.ndarray:
+        """Màscara de les files amb aquest valor"""
+        code = self.code(value)
+        return self.codes == code if code >= 0 else np.zeros(len(self.codes), dtype=bool)
+
+    def counts(self) -> np.ndarray:
+        """Nombre de files per categoria"""
+        return np.bincount(self.codes[self.codes >= 0], minlength=len(self.categories))
+
+    def get(self, row: int, default: Any = None) -> Any:
+        kind = self.kind[row]
+        if kind == OTHER:
+            return self.other[row]
+        if kind == ABSENT:
+            return default
+        if kind == NULL:
+            return None
+        category = self.categories[self.codes[row]]
+        return list(category) if kind == LIST else category
+
+
+class TextColumn:
+    """
+    Strings (o llistes d'strings) en un sol buffer UTF-8.
+    Les files row_offsets[i]:row_offsets[i+1] són els strings de la fila i;
+    els bytes de l'string k són buffer[string_offsets[k]:string_offsets[k+1]].
+    El buffer pot ser qualsevol objecte amb el protocol de buffer (p. ex. un mmap).
+    """
+
+    def __init__(self, values: Sequence[Any]):
+        n = len(values)
+        self.kind = np.zeros(n, dtype=np.uint8)
+        self.other: Dict[int, Any] = {}
+        row_counts = np.zeros(n, dtype=np.int64)
+        encoded: List[bytes] = []
+        for row, value in enumerate(values):
+            if value is _MISSING:
+                continue
+            if value is None:
+                self.kind[row] = NULL
+            elif isinstance(value, str):
+                self.kind[row] = STR
+                encoded.append(value.encode('utf-8'))
+                row_counts[row] = 1
+            elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+                self.kind[row] = LIST
+                encoded.extend(item.encode('utf-8') for item in value)
+                row_counts[row] = len(value)
+            else:
+                self.kind[row] = OTHER
+                self.other[row] = value
+
+        self.row_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(row_counts, out=self.row_offsets[1:])
+        self.string_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=self.string_offsets[1:])
+        self.buffer = b''.join(encoded)
+
+    def string(self, k: int) -> str:
+        return str(self.buffer[self.string_offsets[k]:self.string_offsets[k + 1]], 'utf-8')
+
+    def lengths(self) -> np.ndarray:
+        """Nombre d'strings de cada fila (0 si és buida, nul·la o absent)"""
+        return np.diff(self.row_offsets)
+
+    def get(self, row: int, default: Any = None) -> Any:
+        kind = self.kind[row]
+        if kind == STR:
+            return self.string(self.row_offsets[row])
+        if kind == LIST:
+            return [self.string(k) for k in range(self.row_offsets[row], self.row_offsets[row + 1])]
+        if kind == OTHER:
+            return self.other[row]
+        return default if kind == ABSENT else None
+
+
+class FlagsColumn:
+    """Diccionari de serveis 0/1 (info_comp) com a màscares de bits (vegeu common/amenities.py)"""
+
+    def __init__(self, values: Sequence[Any]):
+        n = len(values)
+        self.bits = np.zeros(n, dtype=np.uint16)
+        self.present = np.zeros(n, dtype=np.uint16)
+        self.kind = np.zeros(n, dtype=np.uint8)
+        self.other: Dict[int, Any] = {}
+        for row, value in enumerate(values):
+            if value is _MISSING:
+                continue
+            if value is None:
+                self.kind[row] = NULL
+                continue
+            if isinstance(value, dict):
+                try:
+                    self.bits[row], self.present[row] = encode_amenities(value)
+                    self.kind[row] = DICT
+                    continue
+                except ValueError:
+                    pass
+            self.kind[row] = OTHER
+            self.other[row] = value
+
+    def has(self, flag: str) -> np.ndarray:
+        """Màscara de les files amb el camp a 1"""
+        return (self.bits & amenity_bit(flag)) != 0
+
+    def has_field(self, flag: str) -> np.ndarray:
+        """Màscara de les files que tenen el camp (a 0 o a 1)"""
+        return (self.present & amenity_bit(flag)) != 0
+
+    def query(self, query: str) -> np.ndarray:
+        """Màscara de les files que compleixen una consulta (vegeu AmenityQuery)"""
+        return AmenityQuery(query)(self.bits)
+
+    def get(self, row: int, default: Any = None, order: Optional[Sequence[str]] = None) -> Any:
+        kind = self.kind[row]
+        if kind == OTHER:
+            return self.other[row]
+        if kind == ABSENT:
+            return default
+        if kind == NULL:
+            return None
+        if order is None:
+            return AmenitySet(int(self.bits[row]), int(self.present[row])).to_info_comp()
+        bits = int(self.bits[row])
+        return {flag: 1 if bits & amenity_bit(flag) else 0 for flag in order}
+
+
+def _scalar_kind(value: Any) -> int:
+    if isinstance(value, str):
+        return STR
+    return INT if isinstance(value, int) else FLOAT
+
+
+def _category_key(value: Any) -> Optional[Tuple]:
+    """Clau hashable d'un valor categòric, o None si no es pot codificar"""
+    if isinstance(value, (str, int, float)):
+        # El tipus forma part de la clau perquè 1, 1.0 i True no es confonguin
+        return (type(value), value)
+    if isinstance(value, (list, tuple)) and all(isinstance(item, str) for item in value):
+        return (list, tuple(value))
+    return None
+
+
+class RefugeColumns:
+    """Llista de refugis en format columnar (vegeu la documentació del mòdul)"""
+
+    def __init__(self, refuges: Sequence[Dict], categorical: Iterable[str] = CATEGORICAL_FIELDS,
+                 numeric: Iterable[str] = NUMERIC_FIELDS):
+        self.n = len(refuges)
+        categorical, numeric = set(categorical), set(numeric)
+
+        # Ordre de les claus de cada refugi (i de coord i info_comp), codificat per diccionari
+        self.layouts: List[Tuple] = []
+        self.layout = np.zeros(self.n, dtype=np.int32)
+        layout_codes: Dict[Tuple, int] = {}
+
+        fields: Dict[str, List[Any]] = {}
+        coords: Dict[str, List[Any]] = {field: [_MISSING] * self.n for field in COORD_FIELDS}
+        info_comp: List[Any] = [_MISSING] * self.n
+        # Valors de coord que no són un diccionari de lat/long
+        self.other_coords: Dict[int, Any] = {}
+
+        for row, refuge in enumerate(refuges):
+            if not isinstance(refuge, dict):
+                raise ValueError(f"El refugi {row} no és un diccionari")
+            layout = []
+            for key, value in refuge.items():
+                if key == 'coord' and isinstance(value, dict) and set(value) <= set(COORD_FIELDS):
+                    layout.append((key, tuple(value)))
+                    for field, coord in value.items():
+                        coords[field][row] = coord
+                elif key == 'coord':
+                    layout.append((key, None))
+                    self.other_coords[row] = value
+                elif key == 'info_comp':
+                    layout.append((key, tuple(value) if isinstance(value, dict) else None))
+                    info_comp[row] = value
+                else:
+                    layout.append((key, None))
+                    fields.setdefault(key, [_MISSING] * self.n)[row] = value
+            layout = tuple(layout)
+            code = layout_codes.get(layout)
+            if code is None:
+                code = layout_codes[layout] = len(self.layouts)
+                self.layouts.append(layout)
+            self.layout[row] = code
+
+        self.columns: Dict[str, Any] = {}
+        for field, values in fields.items():
+            if field in numeric:
+                self.columns[field] = NumericColumn(values)
+            elif field in categorical:
+                self.columns[field] = CategoricalColumn(values)
+            else:
+                self.columns[field] = TextColumn(values)
+        for field, values in coords.items():
+            self.columns[f'coord.{field}'] = NumericColumn(values)
+        self.columns['info_comp'] = FlagsColumn(info_comp)
+
+    @classmethod
+    def from_refuges(cls, refuges: Sequence[Dict], **kwargs) -> 'RefugeColumns':
+        return cls(refuges, **kwargs)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.columns
+
+    def __getitem__(self, field: str):
+        return self.columns[field]
+
+    def kind(self, field: str) -> np.ndarray:
+        """Estat de cada fila per a un camp (tot ABSENT si cap refugi el té)"""
+        column = self.columns.get(field)
+        return column.kind if column is not None else np.zeros(self.n, dtype=np.uint8)
+
+    def present(self, field: str) -> np.ndarray:
+        """Màscara de les files que tenen el camp"""
+        return self.kind(field) != ABSENT
+
+    def value(self, row: int, field: str, default: Any = None) -> Any:
+        """Valor d'un camp d'una fila (com a `refuge.get(field, default)`)"""
+        column = self.columns.get(field)
+        return column.get(row, default) if column is not None else default
+
+    def refuge(self, row: int) -> Dict:
+        """Reconstrueix el diccionari d'un refugi amb l'ordre original de les claus"""
+        refuge = {}
+        for key, subkeys in self.layouts[self.layout[row]]:
+            if key == 'coord':
+                if subkeys is None:
+                    refuge[key] = self.other_coords[row]
+                else:
+                    refuge[key] = {field: self.columns[f'coord.{field}'].get(row) for field in subkeys}
+            elif key == 'info_comp':
+                refuge[key] = self.columns[key].get(row, order=subkeys)
+            else:
+                refuge[key] = self.columns[key].get(row)
+        return refuge
+
+    def to_refuges(self, rows: Optional[Iterable[int]] = None) -> List[Dict]:
+        """Llista de refugis (tots, o només les files indicades, p. ex. np.flatnonzero(màscara))"""
+        rows = range(self.n) if rows is None else rows
+        return [self.refuge(int(row)) for row in rows]
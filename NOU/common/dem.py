@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Proveïdor d'elevacions offline a partir de tessel·les DEM SRTM (.hgt).
+
+Les tessel·les es llegeixen amb np.memmap (no es carreguen senceres a memòria)
+i les altituds es calculen per interpolació bilineal per a lots sencers de
+coordenades. Té la mateixa interfície `lookup` que OpenElevationClient,
+de manera que es poden intercanviar.
+"""
+
+import math
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .geo import refuge_coords
+
+SRTM_VOID = -32768
+
+
+def tile_name(lat: float, lon: float) -> Optional[str]:
+    """
+    Nom de la tessel·la SRTM que conté el punt (ex: N42E001), o None si les
+    coordenades no són finites (NaN, infinit)
+    """
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        return None
+    lat0 = math.floor(lat)
+    lon0 = math.floor(lon)
+    return (f"{'N' if lat0 >= 0 else 'S'}{abs(lat0):02d}"
+            f"{'E' if lon0 >= 0 else 'W'}{abs(lon0):03d}")
+
+
+class SRTMTileSet:
+    """Conjunt de tessel·les .hgt d'un directori, obertes sota demanda"""
+
+    name = "SRTM DEM tiles"
+
+    def __init__(self, dem_dir: str):
+        self.dem_dir = dem_dir
+        self.tiles: Dict[str, Optional[np.ndarray]] = {}
+        self.stats = {'interpolated': 0, 'missing': 0}
+
+    def _tile(self, name: str) -> Optional[np.ndarray]:
+        if name not in self.tiles:
+            path = os.path.join(self.dem_dir, name + '.hgt')
+            if not os.path.exists(path):
+                self.tiles[name] = None
+            else:
+                # SRTM1 (3601x3601) o SRTM3 (1201x1201), enters de 16 bits big-endian
+                size = int(math.isqrt(os.path.getsize(path) // 2))
+                self.tiles[name] = np.memmap(path, dtype='>i2', mode='r', shape=(size, size))
+        return self.tiles[name]
+
+    def _interpolate(self, tile: np.ndarray, lat0: int, lon0: int,
+                     lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Interpolació bilineal dins d'una tessel·la (NaN si algun veí és buit)"""
+        n = tile.shape[0] - 1
+        # La fila 0 és la vora nord de la tessel·la
+        rows = (lat0 + 1 - lats) * n
+        cols = (lons - lon0) * n
+        r0 = np.clip(np.floor(rows).astype(np.intp), 0, n - 1)
+        c0 = np.clip(np.floor(cols).astype(np.intp), 0, n - 1)
+        dr = rows - r0
+        dc = cols - c0
+
+        corners = np.stack([tile[r0, c0], tile[r0, c0 + 1], tile[r0 + 1, c0], tile[r0 + 1, c0 + 1]]).astype(np.float64)
+        corners[corners == SRTM_VOID] = np.nan
+        top = corners[0] * (1 - dc) + corners[1] * dc
+        bottom = corners[2] * (1 - dc) + corners[3] * dc
+        return top * (1 - dr) + bottom * dr
+
+    def lookup(self, coords: Sequence[Tuple[float, float]]) -> List[Optional[float]]:
+        """Retorna l'elevació de cada coordenada (lat, long), o None si no hi ha dades"""
+        result: List[Optional[float]] = [None] * len(coords)
+
+        # Agrupar per tessel·la per interpolar cada grup en una sola operació
+        by_tile = defaultdict(list)
+        for i, (lat, lon) in enumerate(coords):
+            by_tile[tile_name(lat, lon)].append(i)
+
+        for name, indices in by_tile.items():
+            tile = self._tile(name) if name is not None else None
+            if tile is None:
+                self.stats['missing'] += len(indices)
+                continue
+
+            lats = np.array([coords[i][0] for i in indices], dtype=np.float64)
+            lons = np.array([coords[i][1] for i in indices], dtype=np.float64)
+            elevations = self._interpolate(tile, math.floor(lats[0]), math.floor(lons[0]), lats, lons)
+
+            for i, elevation in zip(indices, elevations.tolist()):
+                if math.isnan(elevation):
+                    self.stats['missing'] += 1
+                else:
+                    result[i] = round(elevation, 1)
+                    self.stats['interpolated'] += 1
+
+        return result
+
+
+def cross_check_altitudes(refuges: List[Dict], provider, tolerance_m: float = 100) -> List[Dict]:
+    """
+    Compara el camp "altitude" dels refugis amb l'elevació del proveïdor i
+    retorna els refugis on la diferència supera tolerance_m metres
+    """
+    checked = []
+    for i, refuge in enumerate(refuges):
+        coords = refuge_coords(refuge)
+        if coords is None or refuge.get('altitude') is None:
+            continue
+        try:
+            checked.append((i, coords, float(refuge['altitude'])))
+        except (TypeError, ValueError):
+            continue
+
+    elevations = provider.lookup([coords for _, coords, _ in checked])
+
+    discrepancies = []
+    for (i, coords, altitude), elevation in zip(checked, elevations):
+        if elevation is not None and abs(altitude - elevation) > tolerance_m:
+            discrepancies.append({
+                'index': i,
+                'name': refuges[i].get('name', 'Unknown'),
+                'coordinates': {'lat': coords[0], 'long': coords[1]},
+                'altitude': altitude,
+                'dem_altitude': elevation,
+                'difference': round(altitude - elevation, 1)
+            })
+    return discrepancies
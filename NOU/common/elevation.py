@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client d'elevacions per lots per a l'API Open Elevation.
+
+- Envia moltes coordenades per petició (POST /api/v1/lookup).
+- Executa un nombre limitat de peticions concurrents, limitades per un
+  token bucket per no saturar l'API.
+- Guarda els resultats en una cache a disc indexada per coordenades
+  arrodonides, de manera que les execucions següents no tornen a demanar-les.
+
+La URL base és configurable per poder provar-lo contra un servidor local.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+OPEN_ELEVATION_URL = "https://api.open-elevation.com/api/v1/lookup"
+
+
+class TokenBucket:
+    """Limitador de ritme: com a molt `rate` peticions per segon amb ràfegues de `capacity`"""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        if rate <= 0:
+            raise ValueError("rate ha de ser positiu")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueja fins que hi ha un token disponible i el consumeix"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ElevationCache:
+    """Cache d'elevacions en un fitxer JSON, indexada per coordenades arrodonides"""
+
+    def __init__(self, path: Optional[str] = None, precision: int = 5):
+        self.path = path
+        self.precision = precision
+        self.values: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.values = json.load(f)
+
+    def key(self, lat: float, lon: float) -> str:
+        return f"{lat:.{self.precision}f},{lon:.{self.precision}f}"
+
+    def get(self, lat: float, lon: float) -> Optional[float]:
+        return self.values.get(self.key(lat, lon))
+
+    def set(self, lat: float, lon: float, elevation: float):
+        with self.lock:
+            self.values[self.key(lat, lon)] = elevation
+
+    def save(self):
+        """Escriu la cache a disc (primer a un fitxer temporal per no deixar-la a mitges)"""
+        if not self.path:
+            return
+        with self.lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.values, f, indent=0, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class OpenElevationClient:
+    """Client per lots, concurrent i amb cache per a l'API Open Elevation"""
+
+    name = "Open Elevation API"
+
+    def __init__(self, base_url: str = OPEN_ELEVATION_URL, batch_size: int = 100,
+                 max_workers: int = 4, requests_per_second: float = 2.0,
+                 timeout: float = 30, retries: int = 2,
+                 cache: Optional[ElevationCache] = None):
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.cache = cache if cache is not None else ElevationCache()
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=max_workers)
+        self.session = requests.Session()
+        self.stats = {'cached': 0, 'fetched': 0, 'failed': 0, 'requests': 0}
+        self.stats_lock = threading.Lock()
+
+    def _fetch_batch(self, batch: Sequence[Tuple[float, float]]) -> List[Optional[float]]:
+        """Demana les elevacions d'un lot de coordenades (None per les que fallen)"""
+        payload = {'locations': [{'latitude': lat, 'longitude': lon} for lat, lon in batch]}
+
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.acquire()
+            with self.stats_lock:
+                self.stats['requests'] += 1
+            try:
+                response = self.session.post(self.base_url, json=payload, timeout=self.timeout)
+                if response.status_code == 200:
+                    results = response.json().get('results', [])
+                    if len(results) == len(batch):
+                        return [float(r['elevation']) if r.get('elevation') is not None else None
+                                for r in results]
+                    print(f"Resposta inesperada de l'API: {len(results)} resultats per {len(batch)} coordenades")
+                else:
+                    print(f"API request failed ({len(batch)} coordenades): {response.status_code}")
+            except (requests.RequestException, ValueError) as e:
+                print(f"Error getting elevations ({len(batch)} coordenades): {e}")
+
+            if attempt < self.retries:
+                time.sleep(2 ** attempt)
+
+        return [None] * len(batch)
+
+    def lookup(self, coords: Sequence[Tuple[float, float]]) -> List[Optional[float]]:
+        """
+        Retorna l'elevació de cada coordenada (lat, long), en el mateix ordre.
+        Les coordenades repetides o ja presents a la cache no es tornen a demanar.
+        """
+        pending = []
+        seen = set()
+        for lat, lon in coords:
+            key = self.cache.key(lat, lon)
+            if self.cache.get(lat, lon) is None and key not in seen:
+                seen.add(key)
+                pending.append((lat, lon))
+
+        self.stats['cached'] += len(coords) - len(pending)
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for batch, elevations in zip(batches, executor.map(self._fetch_batch, batches)):
+                    for (lat, lon), elevation in zip(batch, elevations):
+                        if elevation is None:
+                            self.stats['failed'] += 1
+                        else:
+                            self.stats['fetched'] += 1
+                            self.cache.set(lat, lon, elevation)
+            self.cache.save()
+
+        return [self.cache.get(lat, lon) for lat, lon in coords]
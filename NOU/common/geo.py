@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Funcions geogràfiques compartides (distàncies entre coordenades)
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371  # Radi de la Terra en km
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calcula la distància en km entre dos punts amb la fórmula de Haversine"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+
+    a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def refuge_coords(refuge: Dict) -> Optional[Tuple[float, float]]:
+    """Retorna (lat, long) d'un refugi, o None si no té coordenades vàlides"""
+    try:
+        lat = float(refuge['coord']['lat'])
+        lon = float(refuge['coord']['long'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return lat, lon
+
+
+def points_to_arrays(points: Iterable[Optional[Tuple[float, float]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Converteix una llista de (lat, long) en dos arrays; els punts None queden com a NaN"""
+    points = [p if p is not None else (np.nan, np.nan) for p in points]
+    if not points:
+        return np.empty(0), np.empty(0)
+    coords = np.asarray(points, dtype=np.float64)
+    return coords[:, 0], coords[:, 1]
+
+
+def refuges_to_arrays(refuges: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Arrays de latituds i longituds del camp "coord" dels refugis (NaN si no en té)"""
+    return points_to_arrays(refuge_coords(r) for r in refuges)
+
+
+def haversine_km_many(lat, lon, lats, lons) -> np.ndarray:
+    """
+    Distàncies en km (Haversine) calculades en una sola operació de NumPy.
+    Els arguments s'expandeixen amb broadcasting: un punt contra un array
+    retorna un vector, i lats[:, None] contra lats[None, :] una matriu.
+    Les coordenades NaN donen distància NaN.
+    """
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.subtract(lons, lon))
+
+    a = np.sin(dphi/2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda/2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def within_radius(lat, lon, lats, lons, radius_km: float) -> np.ndarray:
+    """Màscara booleana dels punts a radius_km o menys (els NaN queden a False)"""
+    with np.errstate(invalid='ignore'):
+        return haversine_km_many(lat, lon, lats, lons) <= radius_km
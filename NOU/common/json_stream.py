@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lectura i escriptura de refugis d'un en un, sense carregar tot el fitxer.
+
+- `iter_json_array` recorre els elements d'un array JSON (el fitxer sencer o
+  l'array d'una clau de l'objecte principal, com 'nodes' o 'features')
+  llegint el fitxer per blocs.
+- `iter_json_lines` recorre un fitxer JSON Lines (un refugi per línia).
+- `iter_refuges` tria el lector segons el fitxer (extensió o capçalera).
+- `JsonArrayWriter` escriu els refugis a mesura que arriben, amb exactament
+  el mateix text que `json.dump(llista, ensure_ascii=False, indent=indent)`.
+  `JsonLinesWriter` fa el mateix en format JSON Lines. Tots dos escriuen en
+  un fitxer temporal que només substitueix el definitiu si no hi ha errors
+  (excepte `JsonLinesWriter(..., append=True)`, que afegeix línies al final).
+
+Format JSON Lines dels fitxers intermedis: la primera línia és la capçalera
+`{"$schema": "refugis-jsonl", "version": 1}` (amb `"key": "nodes"` si el
+format d'array era un objecte `{"nodes": [...]}`) i cada línia següent és un
+refugi en JSON compacte. Per això es pot afegir al final d'un fitxer, mirar-ne
+les primeres línies (`head`) o partir-lo per línies i processar cada tros en
+paral·lel (`map_refuges`). `convert` passa d'un format a l'altre.
+
+Els scripts del pipeline obtenen els noms dels fitxers intermedis amb
+`data_path`, que canvia l'extensió `.json` per `.jsonl` si la variable
+d'entorn REFUGIS_FORMAT és `jsonl` (`python pipeline.py --format jsonl`).
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER_START = '-0123456789'
+_NUMBER_CHARS = re.compile(r'[-+.eE0-9]*')
+CHUNK_SIZE = 1 << 16
+
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+# Capçalera dels fitxers JSON Lines
+SCHEMA = 'refugis-jsonl'
+SCHEMA_VERSION = 1
+_HEADER_PREFIX = b'{"$schema": '
+
+# Format dels fitxers intermedis: 'json' (arrays indentats) o 'jsonl'
+FORMAT_ENV = 'REFUGIS_FORMAT'
+FORMATS = ('json', 'jsonl')
+
+
+def data_format() -> str:
+    """Format dels fitxers intermedis segons la variable d'entorn REFUGIS_FORMAT"""
+    value = os.environ.get(FORMAT_ENV, 'json').strip().lower() or 'json'
+    if value not in FORMATS:
+        raise ValueError(f"{FORMAT_ENV}={value}: els formats possibles són {', '.join(FORMATS)}")
+    return value
+
+
+def data_path(path: str, data_format_: Optional[str] = None) -> str:
+    """Nom d'un fitxer intermedi en el format actual: 'x.json' -> 'x.jsonl' en format jsonl"""
+    root, ext = os.path.splitext(path)
+    if (data_format_ or data_format()) == 'jsonl' and ext.lower() == '.json':
+        return root + '.jsonl'
+    return path
+
+
+class _Buffer:
+    """Text d'un fitxer llegit per blocs, amb la posició del parser"""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Afegeix un bloc al buffer (descartant el que ja s'ha llegit). False al final del fitxer"""
+        if self.eof:
+            return False
+        # Si un sol valor no hi cap, els blocs creixen perquè cada intent no torni a començar igual
+        chunk = self.f.read(max(self.chunk_size, len(self.text) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Següent caràcter que no és un espai ('' al final del fitxer)"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else "el final del fitxer"
+            raise ValueError(f"JSON no vàlid: s'esperava {' o '.join(repr(c) for c in chars)} i s'ha trobat {found}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Descodifica el següent valor JSON complet"""
+        self.peek()
+        while True:
+            # Un número al final del buffer pot continuar al bloc següent
+            if self.text[self.pos] in _NUMBER_START:
+                match = _NUMBER_CHARS.match(self.text, self.pos)
+                if match.end() == len(self.text) and self.fill():
+                    continue
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            self.pos = end
+            return value
+
+
+def _iter_array(buffer: _Buffer) -> Iterator[Any]:
+    buffer.expect('[')
+    if buffer.peek() == ']':
+        buffer.pos += 1
+        return
+    while True:
+        yield buffer.value()
+        if buffer.expect(',]') == ']':
+            return
+
+
+def iter_json_array(path: str, key: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Elements d'un array JSON, d'un en un. Amb `key`, el fitxer és un objecte i
+    es recorre l'array d'aquesta clau (la resta de claus es llegeixen i es descarten).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = _Buffer(f, chunk_size)
+        if key is None:
+            yield from _iter_array(buffer)
+            return
+
+        buffer.expect('{')
+        if buffer.peek() != '}':
+            while True:
+                name = buffer.value()
+                buffer.expect(':')
+                if name == key:
+                    yield from _iter_array(buffer)
+                    return
+                buffer.value()
+                if buffer.expect(',}') == '}':
+                    break
+        raise KeyError(f"{path}: no té la clau '{key}'")
+
+
+def make_header(key: Optional[str] = None) -> Dict[str, Any]:
+    header = {'$schema': SCHEMA, 'version': SCHEMA_VERSION}
+    if key is not None:
+        header['key'] = key
+    return header
+
+
+def _parse_header(line: bytes, path: str) -> Optional[Dict[str, Any]]:
+    """Capçalera d'una línia (None si la línia és un refugi)"""
+    if not line.startswith(_HEADER_PREFIX):
+        return None
+    header = json.loads(line)
+    if header.get('$schema') != SCHEMA:
+        raise ValueError(f"{path}: esquema desconegut {header.get('$schema')!r}")
+    if header.get('version', 0) > SCHEMA_VERSION:
+        raise ValueError(f"{path}: versió {header['version']} no suportada (com a molt {SCHEMA_VERSION})")
+    return header
+
+
+def read_header(path: str) -> Optional[Dict[str, Any]]:
+    """Capçalera d'un fitxer JSON Lines (None si no en té o no és JSON Lines)"""
+    with open(path, 'rb') as f:
+        return _parse_header(f.readline(), path)
+
+
+def is_json_lines(path: str) -> bool:
+    """Per l'extensió o, si el fitxer existeix, per la capçalera"""
+    if os.path.splitext(path)[1].lower() in JSON_LINES_EXTENSIONS:
+        return True
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(_HEADER_PREFIX)) == _HEADER_PREFIX
+
+
+def iter_json_lines(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Any]:
+    """
+    Elements d'un fitxer JSON Lines (sense la capçalera; les línies buides
+    s'ignoren). Amb `start`/`end` (offsets en bytes a l'inici d'una línia,
+    vegeu split_line_ranges) només es llegeixen les línies d'aquest tros.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            if end is not None and position >= end:
+                break
+            line_start, position = position, position + len(line)
+            if line_start == 0 and _parse_header(line, path) is not None:
+                continue
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}, byte {line_start}: {e}") from e
+
+
+def iter_refuges(path: str, key: Optional[str] = None) -> Iterator[Any]:
+    """
+    Refugis d'un fitxer JSON (array, o array de `key`) o JSON Lines (per
+    l'extensió o la capçalera). En JSON Lines `key` no cal: és a la capçalera.
+    """
+    if is_json_lines(path):
+        return iter_json_lines(path)
+    return iter_json_array(path, key)
+
+
+def head(path: str, n: int = 10, key: Optional[str] = None) -> List[Any]:
+    """Els primers n refugis d'un fitxer, sense llegir la resta"""
+    refuges = iter_refuges(path, key)
+    try:
+        return list(islice(refuges, n))
+    finally:
+        refuges.close()
+
+
+def split_line_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """
+    Parteix un fitxer JSON Lines en `parts` trossos (start, end) de mida
+    semblant que comencen i acaben a principi de línia (sense la capçalera)
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        first = f.readline()
+        data_start = len(first) if _parse_header(first, path) is not None else 0
+        boundaries = [data_start]
+        for i in range(1, parts):
+            target = data_start + (size - data_start) * i // parts
+            if target <= boundaries[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()  # fins al final de la línia on cau el tall
+            boundaries.append(f.tell())
+    boundaries.append(size)
+    return [(a, b) for a, b in zip(boundaries, boundaries[1:]) if b > a]
+
+
+class _StreamWriter:
+    """Base dels escriptors: fitxer temporal, recompte i gestor de context"""
+
+    def __init__(self, path: str, key: Optional[str] = None):
+        self.path = path
+        self.key = key
+        self.count = 0
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+
+    def write(self, item: Any) -> None:
+        raise NotImplementedError
+
+    def write_all(self, items: Iterable[Any]) -> int:
+        """Escriu tots els elements d'un iterable. Retorna quants se n'han escrit"""
+        for item in items:
+            self.write(item)
+        return self.count
+
+    def _finish(self) -> None:
+        pass
+
+    def close(self) -> None:
+        """Acaba el fitxer i el mou al lloc definitiu"""
+        if self._file.closed:
+            return
+        self._finish()
+        self._file.close()
+        if self._tmp_path:
+            os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Descarta el que s'ha escrit: el fitxer definitiu (si existia) no es toca"""
+        if not self._file.closed:
+            self._file.close()
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonArrayWriter(_StreamWriter):
+    """
+    Escriu un array JSON element a element (mateix format que json.dump amb
+    indent). Amb `key`, l'array és dins d'un objecte: {key: [...]}.
+    """
+
+    def __init__(self, path: str, indent: Optional[int] = 2, key: Optional[str] = None):
+        super().__init__(path, key)
+        self.indent = indent
+        depth = 2 if key is not None else 1
+        if indent is not None:
+            self._newline = '\n' + ' ' * (indent * depth)
+            self._close = '\n' + ' ' * (indent * (depth - 1)) + ']'
+        else:
+            self._newline = ''
+            self._close = ']'
+        self._separator = ',' if indent is not None else ', '
+        self._open = '['
+        self._end = ''
+        if key is not None:
+            outer = '\n' + ' ' * indent if indent is not None else ''
+            self._open = '{' + outer + json.dumps(key, ensure_ascii=False) + ': ['
+            self._end = '\n}' if indent is not None else '}'
+
+    def write(self, item: Any) -> None:
+        text = json.dumps(item, ensure_ascii=False, indent=self.indent)
+        if self.indent is not None:
+            # Els salts de línia dins dels strings estan escapats: tots els '\n' són d'indentació
+            text = text.replace('\n', self._newline)
+        self._file.write((self._open if self.count == 0 else self._separator) + self._newline + text)
+        self.count += 1
+
+    def _finish(self) -> None:
+        if self.count == 0:
+            self._file.write(self._open + ']' + self._end)
+        else:
+            self._file.write(self._close + self._end)
+
+
+class JsonLinesWriter(_StreamWriter):
+    """
+    Escriu la capçalera i un element per línia (JSON compacte).
+
+    Amb `append=True` s'afegeix al final del fitxer (si existeix; la clau és
+    la de la seva capçalera) sense fitxer temporal, línia a línia, de manera
+    que serveix de punt de control: si el procés s'interromp, les línies
+    escrites hi queden, i una última línia a mitges s'elimina en tornar-lo a obrir.
+    """
+
+    def __init__(self, path: str, key: Optional[str] = None, append: bool = False):
+        if not append or not os.path.isfile(path) or os.path.getsize(path) == 0:
+            super().__init__(path, key)
+            if append:
+                # Fitxer nou: es crea directament, no cal esperar al final
+                self._file.close()
+                os.replace(self._tmp_path, path)
+                self._tmp_path = None
+                self._file = open(path, 'w', encoding='utf-8', buffering=1)
+            self._file.write(json.dumps(make_header(key), ensure_ascii=False) + '\n')
+            return
+
+        header = read_header(path)
+        if header is None:
+            raise ValueError(f"{path} no és un fitxer JSON Lines amb capçalera: no s'hi pot afegir")
+        _drop_partial_line(path)
+        self.path = path
+        self.key = header.get('key')
+        self.count = 0
+        self._tmp_path = None
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+
+    def write(self, item: Any) -> None:
+        self._file.write(json.dumps(item, ensure_ascii=False) + '\n')
+        self.count += 1
+
+
+def _drop_partial_line(path: str) -> None:
+    """Elimina l'última línia si no acaba en salt de línia (escriptura interrompuda)"""
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        position = size
+        while position > 0:
+            step = min(CHUNK_SIZE, position)
+            f.seek(position - step)
+            block = f.read(step)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+
+def open_writer(path: str, indent: Optional[int] = 2, key: Optional[str] = None,
+                append: bool = False) -> _StreamWriter:
+    """Escriptor adequat al fitxer (JSON Lines per l'extensió o, per afegir-hi, per la capçalera)"""
+    if os.path.splitext(path)[1].lower() in JSON_LINES_EXTENSIONS or (append and is_json_lines(path)):
+        return JsonLinesWriter(path, key, append)
+    if append:
+        raise ValueError(f"{path}: només es pot afegir a fitxers JSON Lines")
+    return JsonArrayWriter(path, indent, key)
+
+
+def write_refuges(path: str, refuges: Iterable[Any], indent: Optional[int] = 2,
+                  key: Optional[str] = None) -> int:
+    """Escriu tots els refugis d'un iterable. Retorna quants se n'han escrit"""
+    with open_writer(path, indent, key) as writer:
+        return writer.write_all(refuges)
+
+
+def convert(input_path: str, output_path: str, key: Optional[str] = None, indent: Optional[int] = 2) -> int:
+    """
+    Passa un fitxer de refugis d'un format a l'altre (segons l'extensió de la
+    sortida). La clau de l'objecte ({"nodes": [...]}) es conserva a través de
+    la capçalera JSON Lines. Retorna el nombre de refugis.
+    """
+    header = read_header(input_path) if is_json_lines(input_path) else None
+    output_key = header.get('key') if header else key
+    return write_refuges(output_path, iter_refuges(input_path, key), indent, output_key)
+
+
+def _map_range(func: Callable[[Any], Any], path: str, start: int, end: int) -> List[Any]:
+    results = []
+    for refuge in iter_json_lines(path, start, end):
+        result = func(refuge)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def map_refuges(func: Callable[[Any], Any], input_path: str, output_path: str, key: Optional[str] = None,
+                indent: Optional[int] = 2, max_workers: Optional[int] = None, chunks_per_worker: int = 4) -> int:
+    """
+    Aplica `func` a cada refugi (si retorna None, el refugi es descarta) i
+    escriu els resultats en el mateix ordre. Si l'entrada és JSON Lines i hi
+    ha més d'un procés, el fitxer es parteix per línies (split_line_ranges) i
+    cada tros es processa en un procés diferent; `func` ha de ser una funció
+    de nivell de mòdul. Retorna el nombre de refugis escrits.
+    """
+    header = read_header(input_path) if is_json_lines(input_path) else None
+    output_key = header.get('key') if header else key
+    workers = max_workers or os.cpu_count() or 1
+
+    with open_writer(output_path, indent, output_key) as writer:
+        if not is_json_lines(input_path) or workers == 1:
+            writer.write_all(result for result in map(func, iter_refuges(input_path, key)) if result is not None)
+            return writer.count
+
+        ranges = split_line_ranges(input_path, workers * chunks_per_worker)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            starts, ends = [r[0] for r in ranges], [r[1] for r in ranges]
+            for results in executor.map(_map_range, repeat(func), repeat(input_path), starts, ends):
+                writer.write_all(results)
+        return writer.count
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Classificació de textos per paraules clau en una sola passada.
+
+- `KeywordMatcher` compila totes les paraules clau de tots els grups en un
+  sol autòmat d'Aho-Corasick: recorre el text un cop i retorna les etiquetes
+  de totes les paraules que hi apareixen (com `paraula in text`, també si se
+  solapen). Una mateixa paraula pot tenir diverses etiquetes.
+- `KeywordClassifier` hi afegeix les paraules excloses de cada grup: un valor
+  és del grup si conté alguna paraula clau i cap paraula exclosa.
+
+Tots dos guarden el resultat per a cada valor diferent, perquè molts
+refugis comparteixen els mateixos pocs valors.
+"""
+
+from collections import deque
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Mapping, Tuple
+
+
+class KeywordMatcher:
+    """Autòmat d'Aho-Corasick sobre un diccionari etiqueta -> paraules clau"""
+
+    def __init__(self, keywords: Mapping[Hashable, Iterable[str]], lowercase: bool = True):
+        self.lowercase = lowercase
+        self._goto: List[Dict[str, int]] = [{}]
+        self._cache: Dict[str, FrozenSet[Hashable]] = {}
+
+        outputs = [set()]
+        for label, words in keywords.items():
+            for word in words:
+                if lowercase:
+                    word = word.lower()
+                if not word:
+                    continue
+                state = 0
+                for char in word:
+                    if char not in self._goto[state]:
+                        self._goto.append({})
+                        outputs.append(set())
+                        self._goto[state][char] = len(self._goto) - 1
+                    state = self._goto[state][char]
+                outputs[state].add(label)
+
+        # Enllaços de fallada en amplada: cada estat hereta les sortides del seu sufix més llarg
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                outputs[next_state] |= outputs[self._fail[next_state]]
+                queue.append(next_state)
+        self._output = [frozenset(labels) for labels in outputs]
+
+    def _scan(self, text: str) -> FrozenSet[Hashable]:
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text.lower() if self.lowercase else text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return frozenset(found)
+
+    def labels(self, text: str) -> FrozenSet[Hashable]:
+        """Etiquetes de les paraules clau que apareixen a text"""
+        labels = self._cache.get(text)
+        if labels is None:
+            labels = self._cache[text] = self._scan(text)
+        return labels
+
+
+class KeywordClassifier:
+    """
+    Grups de paraules clau amb exclusions:
+    {grup: {'keywords': [...], 'exclude_keywords': [...]}}.
+    `classify` retorna els grups del valor en l'ordre en què s'han definit.
+    """
+
+    def __init__(self, groups: Mapping[str, Mapping[str, Iterable[str]]], lowercase: bool = True):
+        self.groups = list(groups)
+        keywords = {}
+        for name, group in groups.items():
+            keywords[(name, 'keywords')] = group.get('keywords', ())
+            keywords[(name, 'exclude_keywords')] = group.get('exclude_keywords', ())
+        self.matcher = KeywordMatcher(keywords, lowercase)
+        self._cache: Dict[str, Tuple[str, ...]] = {}
+
+    def classify(self, value: str) -> Tuple[str, ...]:
+        """Grups amb alguna paraula clau a value i cap paraula exclosa"""
+        groups = self._cache.get(value)
+        if groups is None:
+            found = self.matcher.labels(value)
+            groups = self._cache[value] = tuple(
+                name for name in self.groups
+                if (name, 'keywords') in found and (name, 'exclude_keywords') not in found)
+        return groups
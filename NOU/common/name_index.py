@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índex de noms de refugis.
+
+- Cerca exacta amb un diccionari nom -> identificador (name i surname).
+- Cerca aproximada amb un índex invertit de trigrames de caràcters: només es
+  puntuen els noms que comparteixen prou trigrames amb el nom buscat, i la
+  similitud és el coeficient de Dice entre els dos conjunts de trigrames.
+
+Els noms es normalitzen (minúscules, sense accents ni paraules genèriques)
+abans de calcular els trigrames.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from common.names import name_trigrams, normalize_name
+
+
+class NameIndex:
+    """Índex de noms amb cerca exacta i aproximada per trigrames"""
+
+    def __init__(self):
+        self.exact: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.ids: List[int] = []
+        self.trigrams: List[frozenset] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+
+    @classmethod
+    def from_names(cls, names: Iterable[str]) -> 'NameIndex':
+        """Índex d'una llista de noms; l'identificador és la posició a la llista"""
+        index = cls()
+        for i, name in enumerate(names):
+            index.add(name, i)
+        return index
+
+    @classmethod
+    def from_refuges(cls, refuges: Sequence[Dict], fields: Sequence[str] = ('name', 'surname')) -> 'NameIndex':
+        """Índex dels camps `fields` dels refugis; l'identificador és la posició del refugi"""
+        index = cls()
+        for i, refuge in enumerate(refuges):
+            for field in fields:
+                name = refuge.get(field)
+                if isinstance(name, str) and name:
+                    index.add(name, i)
+        return index
+
+    def add(self, name: str, item_id: int):
+        """Afegeix un nom. Si el nom ja hi és, la cerca exacta manté el primer identificador"""
+        self.exact.setdefault(name, item_id)
+        entry = len(self.names)
+        grams = name_trigrams(normalize_name(name))
+        self.names.append(name)
+        self.ids.append(item_id)
+        self.trigrams.append(grams)
+        for gram in grams:
+            self.postings[gram].append(entry)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.exact
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get(self, name: str) -> Optional[int]:
+        """Identificador del nom exacte o None"""
+        return self.exact.get(name)
+
+    def search(self, name: str, threshold: float = 0.8, limit: Optional[int] = None) -> List[Tuple[int, str, float]]:
+        """
+        Noms semblants a `name` amb similitud >= threshold.
+        Retorna [(identificador, nom, similitud)] ordenat de més a menys semblant,
+        amb una sola entrada (la millor) per identificador.
+        """
+        grams = name_trigrams(normalize_name(name))
+        if not grams:
+            return []
+
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for entry in self.postings.get(gram, ()):
+                shared[entry] += 1
+
+        best: Dict[int, Tuple[int, str, float]] = {}
+        for entry, count in shared.items():
+            score = 2 * count / (len(grams) + len(self.trigrams[entry]))
+            item_id = self.ids[entry]
+            if score >= threshold and (item_id not in best or score > best[item_id][2]):
+                best[item_id] = (item_id, self.names[entry], score)
+
+        results = sorted(best.values(), key=lambda r: (-r[2], r[0]))
+        return results[:limit] if limit is not None else results
+
+    def find(self, name: str, threshold: Optional[float] = None) -> Optional[int]:
+        """
+        Identificador del nom exacte. Si no hi és i es dona un llindar,
+        el del nom més semblant per sobre del llindar.
+        """
+        item_id = self.exact.get(name)
+        if item_id is None and threshold is not None:
+            results = self.search(name, threshold, limit=1)
+            if results:
+                item_id = results[0][0]
+        return item_id
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Normalització de noms de refugis compartida per tots els scripts d'emparellament.
+
+Els patrons es compilen un sol cop, els accents es treuen amb una sola
+taula de str.translate i els resultats es guarden en una cache LRU
+indexada pel nom original, de manera que cada nom només es normalitza una vegada.
+"""
+
+import re
+from functools import lru_cache
+from typing import FrozenSet
+
+# Taula d'accents (s'aplica després de passar a minúscules)
+ACCENT_TABLE = str.maketrans({
+    'à': 'a', 'á': 'a', 'â': 'a', 'ã': 'a', 'ä': 'a', 'å': 'a',
+    'è': 'e', 'é': 'e', 'ê': 'e', 'ë': 'e',
+    'ì': 'i', 'í': 'i', 'î': 'i', 'ï': 'i',
+    'ò': 'o', 'ó': 'o', 'ô': 'o', 'õ': 'o', 'ö': 'o',
+    'ù': 'u', 'ú': 'u', 'û': 'u', 'ü': 'u',
+    'ñ': 'n', 'ç': 'c'
+})
+
+# Paraules genèriques que no identifiquen el refugi (merge refuges.info + pyrenees-refuges)
+GENERIC_WORDS = ['cabane', 'refuge', 'abri', 'refugi', 'refugio', 'cayolar', 'orri', 'orry']
+
+# Articles i preposicions (merge Completa + Normal de pyrenees-refuges)
+ARTICLES = frozenset(['le', 'la', 'les', 'el', 'los', 'las', 'de', 'du', 'des', 'da', 'del', 'dels', 'de la'])
+
+# Paraules massa comunes per considerar-les semblants (refugis propers)
+COMMON_WORDS = frozenset(['de', 'la', 'le', 'du', 'des', 'el', 'les', 'cabane', 'refuge', 'abri', 'borda', 'borde'])
+
+_GENERIC_WORDS_RE = re.compile(r'\b(?:' + '|'.join(GENERIC_WORDS) + r')\b')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9\s]')
+_SPACES_RE = re.compile(r'\s+')
+
+CACHE_SIZE = 16384
+
+
+def fold_accents(text: str) -> str:
+    """Passa a minúscules i elimina els accents més comuns"""
+    return text.lower().translate(ACCENT_TABLE)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_name(name: str) -> str:
+    """
+    Normalitza un nom per comparacions flexibles: minúscules, sense accents,
+    sense paraules genèriques (cabane, refuge...) ni caràcters especials
+    """
+    normalized = fold_accents(name)
+    normalized = _GENERIC_WORDS_RE.sub('', normalized)
+    normalized = _NON_ALNUM_RE.sub('', normalized)
+    return _SPACES_RE.sub(' ', normalized).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_name_words(name: str) -> str:
+    """
+    Normalitza un nom mantenint els accents: minúscules, espais simples
+    i sense articles ni paraules de dues lletres o menys
+    """
+    if not name:
+        return ""
+
+    words = _SPACES_RE.sub(' ', name.lower().strip()).split()
+    return ' '.join(w for w in words if len(w) > 2 and w not in ARTICLES)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def significant_words(name: str, min_word_length: int = 4) -> FrozenSet[str]:
+    """Paraules del nom (en minúscules) prou llargues i no genèriques"""
+    return frozenset(w for w in name.lower().split()
+                     if len(w) >= min_word_length and w not in COMMON_WORDS)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def name_trigrams(normalized: str) -> FrozenSet[str]:
+    """Trigrames de caràcters d'un nom ja normalitzat (amb un espai de marge a cada extrem)"""
+    padded = f' {normalized} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
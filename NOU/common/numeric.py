@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extracció de números dels camps de text dels refugis (capacitats, altituds).
+
+Els patrons es compilen un sol cop i els resultats es guarden en una cache
+LRU indexada pel text original: els mateixos pocs valors ('', '0', '4',
+'non'...) es repeteixen en milers de refugis i cada un només s'analitza una
+vegada. `map_distinct` aplica una funció a una columna de valors calculant-la
+un sol cop per valor diferent.
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional, Tuple, TypeVar
+
+# Paraules que indiquen que no hi ha places (capacitat 0)
+NEGATIVE_WORDS = ('non', 'nada', 'néant', 'rien')
+
+_NUMBER_RE = re.compile(r'\d+')
+
+CACHE_SIZE = 16384
+
+T = TypeVar('T')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def find_numbers(text: str) -> Tuple[int, ...]:
+    """Tots els enters (seqüències de xifres) d'un text, en ordre"""
+    return tuple(int(number) for number in _NUMBER_RE.findall(text))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def first_number(text: str) -> Optional[int]:
+    """Primer enter d'un text, o None si no n'hi ha cap"""
+    match = _NUMBER_RE.search(text)
+    return int(match.group()) if match else None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def max_number(text: str) -> Optional[int]:
+    """
+    Número més gran d'un text que pot contenir diversos números o text
+    descriptiu ('4 5 2 3' -> 5). 0 si el text és '0' o conté una paraula
+    negativa ('non', 'rien'...), None si és buit o no té cap número.
+    """
+    if not text or text.strip() == '':
+        return None
+
+    text = text.strip().lower()
+    if text == '0':
+        return 0
+    if any(word in text for word in NEGATIVE_WORDS):
+        return 0
+
+    numbers = find_numbers(text)
+    return max(numbers) if numbers else None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_altitude(text: str) -> Optional[int]:
+    """
+    Altitud en metres d'un text ('1520', '1520.5', 'env. 1500 m').
+    None si no hi ha valor o no és positiva.
+    """
+    if not text or text.strip() == '':
+        return None
+
+    try:
+        altitude = int(float(text.strip()))
+        return altitude if altitude > 0 else None
+    except (ValueError, TypeError):
+        number = max_number(text)
+        return number if number and number > 0 else None
+
+
+def map_distinct(func: Callable[[T], Optional[int]], values: Iterable[T]) -> List[Optional[int]]:
+    """
+    Aplica func a una columna de valors (una llista amb el valor de cada
+    refugi) calculant-la només un cop per valor diferent.
+    """
+    values = list(values)
+    results = {value: func(value) for value in dict.fromkeys(values)}
+    return [results[value] for value in values]
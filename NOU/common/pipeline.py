@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Orquestrador de les etapes del tractament de dades.
+
+Cada etapa (`Stage`) declara els fitxers que llegeix i els que genera. A
+partir d'aquestes declaracions:
+
+- Es construeix el graf de dependències (una etapa depèn de les que
+  generen algun dels seus fitxers d'entrada).
+- Es calcula un hash del contingut de les entrades i de l'ordre a
+  executar; si coincideix amb el de l'última execució i les sortides no
+  s'han tocat, l'etapa es salta.
+- Una etapa només es dona per feta si surt amb codi 0 i ha tornat a
+  escriure totes les seves sortides.
+- Les etapes que no depenen entre si (p. ex. la preparació de refuges.info
+  i la de pyrenees-refuges) s'executen en paral·lel, cadascuna en el seu
+  propi procés.
+
+L'estat de l'última execució es guarda en un fitxer JSON.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_hash(path: str) -> Optional[str]:
+    """Hash sha256 del contingut d'un fitxer (None si no existeix)"""
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_mtime(path: str) -> Optional[int]:
+    """Data de modificació d'un fitxer en nanosegons (None si no existeix)"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class Stage:
+    """
+    Una etapa del pipeline.
+
+    - `command`: ordre a executar (llista d'arguments) des de `cwd`.
+      Si és None, l'etapa copia la primera entrada a cada sortida.
+    - `inputs` / `outputs`: fitxers que llegeix i que genera.
+    """
+
+    def __init__(self, name: str, inputs: Sequence[str], outputs: Sequence[str],
+                 command: Optional[Sequence[str]] = None, cwd: Optional[str] = None,
+                 description: str = ''):
+        if not outputs:
+            raise ValueError(f"L'etapa {name} no declara cap sortida")
+        self.name = name
+        self.inputs = [os.path.abspath(p) for p in inputs]
+        self.outputs = [os.path.abspath(p) for p in outputs]
+        self.command = list(command) if command else None
+        self.cwd = cwd
+        self.description = description
+
+    @classmethod
+    def copy(cls, name: str, source: str, *destinations: str) -> 'Stage':
+        """Etapa que copia un fitxer generat a les carpetes de les etapes següents"""
+        return cls(name, [source], list(destinations), description='còpia')
+
+    def signature(self, input_hashes: Dict[str, Optional[str]], root: str) -> str:
+        """Hash de l'ordre i del contingut de totes les entrades (rutes relatives a `root`)"""
+        relative = lambda path: os.path.relpath(path, root)
+        content = json.dumps({
+            'command': [relative(a) if a.startswith(root) else a for a in self.command] if self.command else None,
+            'cwd': relative(self.cwd) if self.cwd else None,
+            'inputs': [[relative(path), input_hashes[path]] for path in self.inputs],
+            'outputs': [relative(path) for path in self.outputs],
+        })
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def execute(self, log_file: Optional[str] = None) -> int:
+        """Executa l'etapa i retorna el codi de sortida"""
+        if self.command is None:
+            for destination in self.outputs:
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.copyfile(self.inputs[0], destination)
+            return 0
+        if log_file:
+            with open(log_file, 'w', encoding='utf-8') as log:
+                return subprocess.run(self.command, cwd=self.cwd, stdout=log,
+                                      stderr=subprocess.STDOUT).returncode
+        return subprocess.run(self.command, cwd=self.cwd).returncode
+
+
+class Pipeline:
+    """Conjunt d'etapes amb les dependències deduïdes dels fitxers que comparteixen"""
+
+    def __init__(self, stages: Sequence[Stage], state_file: str, log_dir: Optional[str] = None):
+        self.stages: Dict[str, Stage] = {}
+        self.producers: Dict[str, str] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Etapa duplicada: {stage.name}")
+            self.stages[stage.name] = stage
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"{output} el generen {self.producers[output]} i {stage.name}")
+                self.producers[output] = stage.name
+        self.state_file = state_file
+        self.root = os.path.dirname(os.path.abspath(state_file))
+        self.log_dir = log_dir
+        self.state = self._load_state()
+        self.state_lock = threading.Lock()
+        self.dependencies = {
+            name: sorted({self.producers[p] for p in stage.inputs if p in self.producers} - {name})
+            for name, stage in self.stages.items()
+        }
+        self.order = self._topological_order()
+
+    def _load_state(self) -> Dict[str, dict]:
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    def _topological_order(self) -> List[str]:
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependència circular a l'etapa {name}")
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def select(self, targets: Optional[Sequence[str]] = None) -> List[str]:
+        """Etapes necessàries per obtenir `targets` (totes si és None), en ordre topològic"""
+        if not targets:
+            return list(self.order)
+        unknown = [t for t in targets if t not in self.stages]
+        if unknown:
+            raise KeyError(f"Etapes desconegudes: {', '.join(unknown)}")
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.dependencies[name])
+        return [name for name in self.order if name in needed]
+
+    def is_up_to_date(self, name: str) -> bool:
+        """Una etapa està al dia si les entrades i les sortides són les de l'última execució"""
+        stage = self.stages[name]
+        input_hashes = {path: file_hash(path) for path in stage.inputs}
+        return self._matches_state(name, stage.signature(input_hashes, self.root))
+
+    def _matches_state(self, name: str, signature: str) -> bool:
+        previous = self.state.get(name)
+        if not previous or previous.get('signature') != signature:
+            return False
+        return all(file_hash(path) == previous['outputs'].get(os.path.relpath(path, self.root))
+                   for path in self.stages[name].outputs)
+
+    def _run_stage(self, name: str) -> str:
+        """Executa una etapa si cal. Retorna 'skipped', 'done' o 'failed'"""
+        stage = self.stages[name]
+        input_hashes = {path: file_hash(path) for path in stage.inputs}
+        missing = [path for path, digest in input_hashes.items() if digest is None]
+        if missing:
+            print(f"[{name}] ERROR: falten entrades: {', '.join(missing)}")
+            return 'failed'
+
+        signature = stage.signature(input_hashes, self.root)
+        if self._matches_state(name, signature):
+            return 'skipped'
+
+        print(f"[{name}] Executant...")
+        log_file = None
+        if self.log_dir and stage.command:
+            os.makedirs(self.log_dir, exist_ok=True)
+            log_file = os.path.join(self.log_dir, f"{name}.log")
+        # Les sortides anteriors són al repositori: un script que falla sense
+        # tornar-les a escriure no les pot fer passar per noves
+        mtimes = {path: file_mtime(path) for path in stage.outputs}
+        returncode = stage.execute(log_file)
+        output_hashes = {path: file_hash(path) for path in stage.outputs}
+        missing = [path for path, digest in output_hashes.items() if digest is None]
+        stale = [path for path in stage.outputs
+                 if output_hashes[path] is not None and file_mtime(path) == mtimes[path]]
+        if returncode != 0 or missing or stale:
+            if returncode != 0:
+                reason = f"codi {returncode}"
+            elif missing:
+                reason = f"no ha generat {', '.join(missing)}"
+            else:
+                reason = f"no ha tornat a escriure {', '.join(stale)}"
+            print(f"[{name}] ERROR: {reason}" + (f" (vegeu {log_file})" if log_file else ''))
+            return 'failed'
+
+        with self.state_lock:
+            self.state[name] = {
+                'signature': signature,
+                'outputs': {os.path.relpath(p, self.root): h for p, h in output_hashes.items()},
+            }
+            self._save_state()
+        print(f"[{name}] Fet")
+        return 'done'
+
+    def run(self, targets: Optional[Sequence[str]] = None, max_workers: int = 2,
+            force: bool = False) -> Dict[str, str]:
+        """
+        Executa les etapes seleccionades respectant les dependències.
+        Les etapes independents s'executen en paral·lel (fins a max_workers alhora).
+        Si una etapa falla, les que en depenen no s'executen.
+        Retorna {etapa: 'skipped' | 'done' | 'failed' | 'blocked'}.
+        """
+        selected = self.select(targets)
+        if force:
+            with self.state_lock:
+                for name in selected:
+                    self.state.pop(name, None)
+
+        status: Dict[str, str] = {}
+        pending = list(selected)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    dependency_status = [status.get(d) for d in self.dependencies[name] if d in selected]
+                    if any(s in ('failed', 'blocked') for s in dependency_status):
+                        status[name] = 'blocked'
+                        pending.remove(name)
+                    elif all(s is not None for s in dependency_status):
+                        running[executor.submit(self._run_stage, name)] = name
+                        pending.remove(name)
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        status[name] = future.result()
+                    except Exception as e:
+                        print(f"[{name}] ERROR: {e}")
+                        status[name] = 'failed'
+
+        return status
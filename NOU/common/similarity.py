@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mètriques de similitud entre cadenes (0-1) amb llindar de tall.
+
+Totes les funcions tenen la forma `metric(a, b, cutoff=0.0)`: si la
+similitud és >= cutoff retornen el valor exacte, i si no retornen 0.0. Així
+poden abandonar el càlcul tan aviat com saben que no arribaran al llindar
+(cotes superiors barates, banda de Levenshtein, etc.).
+
+- `sequence`: `difflib.SequenceMatcher.ratio` (la mètrica original dels scripts),
+  amb `real_quick_ratio` i `quick_ratio` com a cotes superiors.
+- `jaro_winkler`: Jaro-Winkler.
+- `levenshtein`: 1 - distància d'edició / longitud màxima, amb DP en banda.
+- `token_set`: ratio sobre conjunts de paraules (insensible a l'ordre i a
+  paraules repetides), a l'estil de fuzzywuzzy.
+
+`get_metric(nom)` retorna la funció a partir del seu nom.
+"""
+
+from difflib import SequenceMatcher
+from typing import Callable, Dict
+
+Metric = Callable[..., float]
+
+
+def sequence_ratio(a: str, b: str, cutoff: float = 0.0) -> float:
+    """Ratio de SequenceMatcher; descarta primer amb les cotes superiors barates"""
+    matcher = SequenceMatcher(None, a, b)
+    if cutoff > 0 and (matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff):
+        return 0.0
+    ratio = matcher.ratio()
+    return ratio if ratio >= cutoff else 0.0
+
+
+def jaro_winkler(a: str, b: str, cutoff: float = 0.0, prefix_scale: float = 0.1) -> float:
+    """Similitud de Jaro-Winkler (prefix comú de fins a 4 caràcters)"""
+    if a == b:
+        return 1.0
+    len_a, len_b = len(a), len(b)
+    if not len_a or not len_b:
+        return 0.0
+
+    # Cota superior: tots els caràcters de la cadena curta coincideixen sense transposicions
+    shortest = min(len_a, len_b)
+    jaro_bound = (shortest / len_a + shortest / len_b + 1) / 3
+    if jaro_bound + 4 * prefix_scale * (1 - jaro_bound) < cutoff:
+        return 0.0
+
+    window = max(max(len_a, len_b) // 2 - 1, 0)
+    matched_b = [False] * len_b
+    matches_a = []
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len_b, i + window + 1)):
+            if not matched_b[j] and b[j] == char:
+                matched_b[j] = True
+                matches_a.append(char)
+                break
+    matches = len(matches_a)
+    if not matches:
+        return 0.0
+
+    matches_b = [b[j] for j in range(len_b) if matched_b[j]]
+    transpositions = sum(1 for x, y in zip(matches_a, matches_b) if x != y) // 2
+    jaro = (matches / len_a + matches / len_b + (matches - transpositions) / matches) / 3
+
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    score = jaro + prefix * prefix_scale * (1 - jaro)
+    return score if score >= cutoff else 0.0
+
+
+def levenshtein_ratio(a: str, b: str, cutoff: float = 0.0) -> float:
+    """
+    1 - distància de Levenshtein / longitud màxima.
+    Amb cutoff, només es calcula la banda de la matriu on la distància encara
+    pot ser prou petita, i s'atura quan tota una fila supera el màxim permès.
+    """
+    if a == b:
+        return 1.0
+    longest = max(len(a), len(b))
+    if not longest:
+        return 1.0
+    max_distance = int((1 - cutoff) * longest + 1e-9) if cutoff > 0 else longest
+    if abs(len(a) - len(b)) > max_distance:
+        return 0.0
+
+    if len(a) < len(b):
+        a, b = b, a
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= max_distance else too_far
+        row_min = current[0]
+        char = a[i - 1]
+        for j in range(low, high + 1):
+            cost = 0 if b[j - 1] == char else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value if value <= max_distance else too_far
+            if current[j] < row_min:
+                row_min = current[j]
+        if row_min > max_distance:
+            return 0.0
+        previous = current
+
+    distance = previous[len(b)]
+    if distance > max_distance:
+        return 0.0
+    score = 1 - distance / longest
+    return score if score >= cutoff else 0.0
+
+
+def token_set_ratio(a: str, b: str, cutoff: float = 0.0) -> float:
+    """
+    Ratio sobre conjunts de paraules: compara la intersecció ordenada amb
+    cada cadena (intersecció + paraules pròpies) i es queda amb el màxim
+    """
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    if not tokens_a or not tokens_b:
+        return 1.0 if tokens_a == tokens_b else 0.0
+
+    common = ' '.join(sorted(tokens_a & tokens_b))
+    rest_a = ' '.join(sorted(tokens_a - tokens_b))
+    rest_b = ' '.join(sorted(tokens_b - tokens_a))
+    combined_a = f"{common} {rest_a}".strip()
+    combined_b = f"{common} {rest_b}".strip()
+
+    best = 0.0
+    for x, y in ((common, combined_a), (common, combined_b), (combined_a, combined_b)):
+        if x and y:
+            best = max(best, sequence_ratio(x, y, max(cutoff, best)))
+    return best if best >= cutoff else 0.0
+
+
+METRICS: Dict[str, Metric] = {
+    'sequence': sequence_ratio,
+    'jaro_winkler': jaro_winkler,
+    'levenshtein': levenshtein_ratio,
+    'token_set': token_set_ratio,
+}
+
+
+def get_metric(name: str) -> Metric:
+    """Funció de similitud pel seu nom (vegeu METRICS)"""
+    try:
+        return METRICS[name]
+    except KeyError:
+        raise ValueError(f"Mètrica desconeguda: {name} (disponibles: {', '.join(METRICS)})")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índex espacial en graella de latitud/longitud.
+
+Es construeix un sol cop sobre una llista de refugis i permet obtenir
+només els refugis que estan dins d'un radi donat, en comptes de
+comparar cada refugi amb tota la llista.
+"""
+
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .geo import KM_PER_DEGREE_LAT, haversine_km_many, points_to_arrays, refuge_coords
+
+
+class GridIndex:
+    """
+    Agrupa punts en cel·les de mida fixa (en graus) i respon consultes
+    de veïnatge mirant només les cel·les que toquen el radi demanat.
+    """
+
+    def __init__(self, points: Iterable[Optional[Tuple[float, float]]], cell_km: float = 2.0):
+        if cell_km <= 0:
+            raise ValueError("cell_km ha de ser positiu")
+
+        self.cell_deg = cell_km / KM_PER_DEGREE_LAT
+        self.points: List[Optional[Tuple[float, float]]] = list(points)
+        self.lats, self.lons = points_to_arrays(self.points)
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        # Índexs dels punts sense coordenades (no es poden situar a la graella)
+        self.unindexed: List[int] = []
+
+        for i, point in enumerate(self.points):
+            if point is None:
+                self.unindexed.append(i)
+            else:
+                self.cells[self._cell(*point)].append(i)
+
+    @classmethod
+    def from_refuges(cls, refuges: List[Dict], cell_km: float = 2.0) -> 'GridIndex':
+        """Construeix l'índex a partir del camp "coord" dels refugis"""
+        return cls((refuge_coords(r) for r in refuges), cell_km)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def _window(self, lat: float, radius_km: float) -> Tuple[float, float]:
+        """Mida (en graus de latitud i longitud) de la finestra que cobreix el radi"""
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        # Amplada en longitud a la latitud més allunyada de l'equador de la finestra
+        cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+        return dlat, dlat / cos_lat
+
+    def _cells_in(self, row_min: int, row_max: int, col_min: int, col_max: int) -> List[int]:
+        result = []
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                bucket = self.cells.get((row, col))
+                if bucket:
+                    result.extend(bucket)
+        return result
+
+    def candidates(self, lat: float, lon: float, radius_km: float) -> List[int]:
+        """
+        Retorna els índexs dels punts de les cel·les que cobreixen el radi
+        (sense filtrar per distància exacta)
+        """
+        dlat, dlon = self._window(lat, radius_km)
+        row_min, col_min = self._cell(lat - dlat, lon - dlon)
+        row_max, col_max = self._cell(lat + dlat, lon + dlon)
+        return self._cells_in(row_min, row_max, col_min, col_max)
+
+    def query(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """Retorna (índex, distància en km) dels punts a radius_km o menys"""
+        candidates = np.asarray(self.candidates(lat, lon, radius_km), dtype=np.intp)
+        if candidates.size == 0:
+            return []
+
+        distances = haversine_km_many(lat, lon, self.lats[candidates], self.lons[candidates])
+        mask = distances <= radius_km
+        return list(zip(candidates[mask].tolist(), distances[mask].tolist()))
+
+    def pairs_within(self, radius_km: float) -> List[Tuple[int, int, float]]:
+        """
+        Retorna totes les parelles (i, j, distància en km) amb i < j que estan
+        a radius_km o menys, ordenades per (i, j). El cost depèn del nombre de
+        parelles properes, no del quadrat del nombre de punts.
+        """
+        pairs = []
+        for (row, col), members in self.cells.items():
+            # Finestra calculada a la vora de la cel·la més allunyada de l'equador
+            edge_lat = max(abs(row * self.cell_deg), abs((row + 1) * self.cell_deg))
+            dlat, dlon = self._window(edge_lat, radius_km)
+            drow = math.ceil(dlat / self.cell_deg)
+            dcol = math.ceil(dlon / self.cell_deg)
+
+            neighbours = np.asarray(self._cells_in(row - drow, row + drow, col - dcol, col + dcol), dtype=np.intp)
+            members = np.asarray(members, dtype=np.intp)
+
+            # Matriu de distàncies membres x veïns en una sola operació
+            distances = haversine_km_many(self.lats[members, None], self.lons[members, None],
+                                          self.lats[None, neighbours], self.lons[None, neighbours])
+            mask = (distances <= radius_km) & (members[:, None] < neighbours[None, :])
+            rows, cols = np.nonzero(mask)
+            pairs.extend(zip(members[rows].tolist(), neighbours[cols].tolist(), distances[rows, cols].tolist()))
+
+        pairs.sort()
+        return pairs
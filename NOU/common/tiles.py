@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tessel·les de mapa (esquema XYZ / slippy map, el d'OpenStreetMap).
+
+- `tile_xy` calcula la tessel·la de molts punts alhora amb NumPy.
+- `partition` agrupa els punts per tessel·la en una sola ordenació.
+- `cluster_summary` resumeix un grup de punts (nombre, centroide i límits),
+  el que necessita l'app per dibuixar un clúster als nivells de zoom baixos.
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Latitud màxima de la projecció de Web Mercator
+MAX_LAT = 85.05112878
+
+Tile = Tuple[int, int, int]
+
+
+def tile_xy(lats, lons, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Columnes (x) i files (y) de les tessel·les que contenen els punts"""
+    n = 2 ** zoom
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    lons = np.asarray(lons, dtype=np.float64)
+    x = np.floor((lons + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.arcsinh(np.tan(np.radians(lats))) / math.pi) / 2.0 * n)
+    return np.clip(x, 0, n - 1).astype(np.int64), np.clip(y, 0, n - 1).astype(np.int64)
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> Dict[str, float]:
+    """Límits d'una tessel·la en graus (south, west, north, east)"""
+    n = 2 ** zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return {'south': lat(y + 1), 'west': x / n * 360.0 - 180.0,
+            'north': lat(y), 'east': (x + 1) / n * 360.0 - 180.0}
+
+
+def partition(lats, lons, zoom: int) -> Dict[Tile, np.ndarray]:
+    """
+    Agrupa els punts per tessel·la: {(zoom, x, y): índexs dels punts}.
+    Els punts sense coordenades (NaN) no es tenen en compte.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+    x, y = tile_xy(lats[valid], lons[valid], zoom)
+    keys = x * (2 ** zoom) + y
+    order = np.argsort(keys, kind='stable')
+    unique_keys, starts = np.unique(keys[order], return_index=True)
+    groups = np.split(valid[order], starts[1:])
+    n = 2 ** zoom
+    return {(zoom, int(key // n), int(key % n)): group for key, group in zip(unique_keys, groups)}
+
+
+def cluster_summary(lats: np.ndarray, lons: np.ndarray, indices: np.ndarray) -> Dict:
+    """Nombre de punts, centroide i límits d'un grup de punts"""
+    group_lats, group_lons = lats[indices], lons[indices]
+    return {
+        'count': int(len(indices)),
+        'centroid': {'lat': round(float(group_lats.mean()), 6), 'long': round(float(group_lons.mean()), 6)},
+        'bounds': {'south': float(group_lats.min()), 'west': float(group_lons.min()),
+                   'north': float(group_lats.max()), 'east': float(group_lons.max())},
+    }
+
+
+def tile_path(tile: Tile) -> str:
+    """Ruta relativa d'una tessel·la: z/x/y.json"""
+    zoom, x, y = tile
+    return f"{zoom}/{x}/{y}.json"
+
+
+def children_clusters(lats: np.ndarray, lons: np.ndarray, indices: np.ndarray, zoom: int) -> List[Dict]:
+    """Clústers d'un grup de punts: un per tessel·la de nivell `zoom` (amb la tessel·la)"""
+    clusters = []
+    for tile, group in partition(lats[indices], lons[indices], zoom).items():
+        cluster = cluster_summary(lats, lons, indices[group])
+        cluster['tile'] = list(tile)
+        clusters.append(cluster)
+    return clusters
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Eina per als fitxers de refugis en JSON Lines (vegeu common/json_stream.py).
+
+Ús:
+    python json_lines.py head FITXER [-n 5]            # primers refugis, un per línia
+    python json_lines.py info FITXER                   # format, capçalera i nombre de refugis
+    python json_lines.py convert ENTRADA SORTIDA       # JSON <-> JSON Lines (segons l'extensió)
+    python json_lines.py convert refusInfo.json refusInfo.jsonl --key nodes
+
+Per als fitxers JSON amb l'array dins d'un objecte ({"nodes": [...]}) cal
+indicar la clau amb --key; els fitxers JSON Lines la guarden a la capçalera.
+"""
+
+import argparse
+import json
+import sys
+
+from common.json_stream import convert, head, is_json_lines, iter_refuges, read_header
+
+
+def command_head(args):
+    for refuge in head(args.file, args.n, args.key):
+        print(json.dumps(refuge, ensure_ascii=False))
+    return 0
+
+
+def command_info(args):
+    if is_json_lines(args.file):
+        print("Format: JSON Lines")
+        print(f"Capçalera: {json.dumps(read_header(args.file), ensure_ascii=False)}")
+    else:
+        print("Format: JSON")
+    print(f"Refugis: {sum(1 for _ in iter_refuges(args.file, args.key))}")
+    return 0
+
+
+def command_convert(args):
+    count = convert(args.input, args.output, args.key, args.indent)
+    print(f"{count} refugis escrits a {args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Eina per als fitxers de refugis en JSON i JSON Lines")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_head = subparsers.add_parser('head', help="mostra els primers refugis, un per línia")
+    parser_head.add_argument('file')
+    parser_head.add_argument('-n', type=int, default=10, help="nombre de refugis (per defecte 10)")
+    parser_head.add_argument('--key', help="clau de l'array en un fitxer JSON (p. ex. nodes)")
+    parser_head.set_defaults(func=command_head)
+
+    parser_info = subparsers.add_parser('info', help="mostra el format i el nombre de refugis")
+    parser_info.add_argument('file')
+    parser_info.add_argument('--key', help="clau de l'array en un fitxer JSON (p. ex. nodes)")
+    parser_info.set_defaults(func=command_info)
+
+    parser_convert = subparsers.add_parser('convert', help="converteix entre JSON i JSON Lines")
+    parser_convert.add_argument('input')
+    parser_convert.add_argument('output', help="fitxer de sortida (.jsonl per a JSON Lines)")
+    parser_convert.add_argument('--key', help="clau de l'array en un fitxer JSON (p. ex. nodes)")
+    parser_convert.add_argument('--indent', type=int, default=2,
+                                help="indentació de la sortida JSON (per defecte 2)")
+    parser_convert.set_defaults(func=command_convert)
+
+    args = parser.parse_args()
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Executa tot el tractament de dades (passos 1-10 del README) en un sol ordre,
+i n'exporta el resultat per a l'app.
+
+Cada etapa declara els fitxers que llegeix i genera. Les etapes que ja estan
+al dia (mateixes entrades, mateix script i sortides sense tocar) es salten,
+i les dues branques independents (refuges.info i pyrenees-refuges) s'executen
+en paral·lel fins al merge final. Les etapes de còpia mantenen els fitxers
+de cada carpeta sincronitzats amb els de l'etapa anterior, de manera que els
+scripts es poden continuar executant també un a un des de la seva carpeta.
+
+Ús:
+    python pipeline.py                  # executa el que no estigui al dia
+    python pipeline.py merge_v2         # només fins al merge de les dues fonts
+    python pipeline.py --list           # mostra les etapes i si estan al dia
+    python pipeline.py --force types    # torna a executar una etapa (i les anteriors)
+    python pipeline.py --in-memory      # tasques finals en memòria (vegeu run_in_memory)
+    python pipeline.py --format jsonl   # fitxers intermedis en JSON Lines (vegeu common/json_stream.py)
+
+Les sortides de cada script es guarden a `.pipeline_logs/` i l'estat de
+l'última execució a `.pipeline_state.json`.
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+
+from common.json_stream import FORMAT_ENV, FORMATS, data_format, data_path, iter_refuges, write_refuges
+from common.pipeline import Pipeline, Stage
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(ROOT, '.pipeline_state.json')
+LOG_DIR = os.path.join(ROOT, '.pipeline_logs')
+
+PYTHON = sys.executable
+NODE = 'node'
+
+# Carpetes de cada pas
+INFO = os.path.join(ROOT, 'refusInfo')
+INFO_XML = os.path.join(INFO, 'xml_to_json')
+INFO_NORMALIZE = os.path.join(INFO, 'normalize_json')
+INFO_TYPES = os.path.join(INFO, 'types&services_json', 'types')
+INFO_SERVICES = os.path.join(INFO, 'types&services_json', 'services')
+
+PYR = os.path.join(ROOT, 'refusPyrenees')
+PYR_NORMAL = os.path.join(PYR, 'Normal')
+PYR_COMPLETA = os.path.join(PYR, 'Completa (té serveis)')
+PYR_MERGE = os.path.join(PYR, 'Merge')
+PYR_MERGE_CN = os.path.join(PYR_MERGE, 'merge (Completa + Normal)')
+PYR_FILTER = os.path.join(PYR_MERGE, 'Filtrar merge refus guardats per capacitat')
+PYR_NORMALIZE = os.path.join(PYR_MERGE, 'normalize_merge')
+PYR_SERVICES = os.path.join(PYR_MERGE, 'services_merge')
+
+MERGE = os.path.join(ROOT, 'MERGE', 'merge')
+FINALS = os.path.join(ROOT, 'MERGE', 'tasques_finals')
+ALTITUDES = os.path.join(FINALS, '1- update altitudes')
+TYPES = os.path.join(FINALS, '2- definir types')
+DUPLICATES = os.path.join(FINALS, '3- comprovar refugis a prop')
+DESCRIPTIONS = os.path.join(FINALS, '4- unir description i remarque')
+EXPORT = os.path.join(FINALS, '5- exportar app')
+
+# Fitxer final del tractament (arrel del repositori)
+FINAL_DATA = os.path.join(ROOT, '..', 'final_data_refuges.json')
+
+COMMON = os.path.join(ROOT, 'common')
+# Eina de conversió entre els formats JSON i JSON Lines
+FORMAT_TOOL = os.path.join(ROOT, 'json_lines.py')
+
+# Fitxers de refugis intermedis: amb --format jsonl es llegeixen i s'escriuen
+# com a JSON Lines (x.jsonl en lloc de x.json), vegeu common/json_stream.py
+DATA_FILES = {
+    'refusInfo_normalized_with_types.json', 'refusInfo_normalized_types_services.json',
+    'refusPyrinees_norm.json', 'refusPyrineesComp_norm.json', 'refusPyrinees_merged.json',
+    'refusPyrinees_merged_filtered.json', 'refusPyrenees_finished.json',
+    'refusPyrenees_finished_services.json', 'refusPyrenees_definitiu.json',
+    'data_refugis.json', 'data_refugis_updated_altitudes.json', 'data_refugis_updated_types.json',
+    'data_refugis_sense_repetits.json', 'refuges_name_description_remarque.json',
+    'data_refuges_description_merged.json',
+}
+
+
+def common_modules(*names):
+    """Mòduls de common/ que importa un script (un canvi en aquests també invalida l'etapa)"""
+    return [os.path.join(COMMON, '__init__.py')] + [os.path.join(COMMON, f'{name}.py') for name in names]
+
+
+def data_file(path):
+    """Ruta d'un fitxer de DATA_FILES en el format escollit (x.json -> x.jsonl amb --format jsonl)"""
+    return data_path(path) if os.path.basename(path) in DATA_FILES else path
+
+
+def script_stage(name, folder, script, inputs, outputs, interpreter=PYTHON, uses=()):
+    """Etapa que executa un script des de la seva carpeta (l'script també és una entrada)"""
+    script_path = os.path.join(folder, script)
+    return Stage(
+        name,
+        inputs=[script_path] + [data_file(os.path.join(folder, p)) for p in inputs] + list(uses),
+        outputs=[data_file(os.path.join(folder, p)) for p in outputs],
+        command=[interpreter, script_path],
+        cwd=folder,
+    )
+
+
+def copy_stage(name, source, *destinations):
+    """Còpia d'un fitxer a les carpetes de les etapes següents (en el format escollit)"""
+    return Stage.copy(name, data_file(source), *[data_file(d) for d in destinations])
+
+
+def final_stage(name, source, destination):
+    """
+    Còpia del resultat final. En format jsonl, es converteix a l'array JSON
+    que llegeixen l'app i les etapes d'exportació.
+    """
+    if data_format() == 'json':
+        return copy_stage(name, source, destination)
+    source = data_file(source)
+    return Stage(name, inputs=[source, FORMAT_TOOL] + common_modules('json_stream'), outputs=[destination],
+                 command=[PYTHON, FORMAT_TOOL, 'convert', source, destination], cwd=ROOT,
+                 description='conversió a JSON')
+
+
+def build_stages():
+    return [
+        # --- refuges.info ---
+        script_stage('info_xml_to_json', INFO_XML, 'xml_to_json.js',
+                     ['refusInfoCompleta.xml'], ['refusInfo.json'], interpreter=NODE),
+        copy_stage('info_copy_json', os.path.join(INFO_XML, 'refusInfo.json'),
+                   os.path.join(INFO_NORMALIZE, 'refusInfo.json')),
+        script_stage('info_normalize', INFO_NORMALIZE, 'normalize_json.js',
+                     ['refusInfo.json'], ['refusInfo_normalized.json'], interpreter=NODE),
+        copy_stage('info_copy_normalized', os.path.join(INFO_NORMALIZE, 'refusInfo_normalized.json'),
+                   os.path.join(INFO_TYPES, 'refusInfo_normalized.json')),
+        script_stage('info_types', INFO_TYPES, 'refusInfo_normalized_with_types.py',
+                     ['refusInfo_normalized.json'], ['refusInfo_normalized_with_types.json'],
+                     uses=common_modules('json_stream')),
+        copy_stage('info_copy_types', os.path.join(INFO_TYPES, 'refusInfo_normalized_with_types.json'),
+                   os.path.join(INFO_SERVICES, 'refusInfo_normalized_with_types.json')),
+        script_stage('info_services', INFO_SERVICES, 'refusInfo_normalized_types_services.py',
+                     ['refusInfo_normalized_with_types.json'], ['refusInfo_normalized_types_services.json'],
+                     uses=common_modules('json_stream')),
+        copy_stage('info_copy_services', os.path.join(INFO_SERVICES, 'refusInfo_normalized_types_services.json'),
+                   os.path.join(INFO, 'refusInfo_normalized_types_services.json'),
+                   os.path.join(MERGE, 'refusInfo_normalized_types_services.json')),
+
+        # --- pyrenees-refuges ---
+        script_stage('pyr_normalize_normal', PYR_NORMAL, 'refusPyrinees_norm.py',
+                     ['refusPyrinees.geojson'], ['refusPyrinees_norm.json'],
+                     uses=common_modules('json_stream')),
+        script_stage('pyr_normalize_completa', PYR_COMPLETA, 'refusPyrineesCompleta_normalize.py',
+                     ['refusPyrineesCompleta.json'], ['refusPyrineesComp_norm.json'],
+                     uses=common_modules('json_stream')),
+        script_stage('pyr_merge', PYR_MERGE_CN, 'merge_refuges.py',
+                     [os.path.join(PYR_NORMAL, 'refusPyrinees_norm.json'),
+                      os.path.join(PYR_COMPLETA, 'refusPyrineesComp_norm.json')],
+                     ['refusPyrinees_merged.json'], uses=common_modules('json_stream', 'names', 'similarity')),
+        copy_stage('pyr_copy_merged', os.path.join(PYR_MERGE_CN, 'refusPyrinees_merged.json'),
+                   os.path.join(PYR_FILTER, 'refusPyrinees_merged.json')),
+        # refugisPyrinees_refus_guardats.txt és la llista revisada a mà dels refugis guardats
+        script_stage('pyr_filter', PYR_FILTER, 'remove_high_capacity_refuges.py',
+                     ['refusPyrinees_merged.json', 'refugisPyrinees_refus_guardats.txt'],
+                     ['refusPyrinees_merged_filtered.json'],
+                     uses=common_modules('json_stream', 'name_index', 'names')),
+        copy_stage('pyr_copy_filtered', os.path.join(PYR_FILTER, 'refusPyrinees_merged_filtered.json'),
+                   os.path.join(PYR_NORMALIZE, 'refusPyrinees_merged_filtered.json')),
+        script_stage('pyr_normalize', PYR_NORMALIZE, 'refusPyrenees_merged_filtered_normalized.py',
+                     ['refusPyrinees_merged_filtered.json'], ['refusPyrenees_finished.json'],
+                     uses=common_modules('json_stream', 'numeric')),
+        copy_stage('pyr_copy_finished', os.path.join(PYR_NORMALIZE, 'refusPyrenees_finished.json'),
+                   os.path.join(PYR_SERVICES, 'refusPyrenees_finished.json')),
+        script_stage('pyr_classify_couchage', PYR_SERVICES, 'classify_couchage.py',
+                     ['refusPyrenees_finished.json'], ['classificacio_couchage.json', 'classificacio_couchage.txt'],
+                     uses=common_modules('classification_rules', 'json_stream', 'keyword_classifier')),
+        script_stage('pyr_services', PYR_SERVICES, 'refusPyrenees_finished_services.py',
+                     ['refusPyrenees_finished.json', 'classificacio_couchage.json'],
+                     ['refusPyrenees_finished_services.json', 'diccionari_valors_serveis.json'],
+                     uses=common_modules('classification_rules', 'json_stream', 'keyword_classifier')),
+        copy_stage('pyr_copy_services', os.path.join(PYR_SERVICES, 'refusPyrenees_finished_services.json'),
+                   os.path.join(PYR_MERGE, 'refusPyrenees_finished_services.json')),
+        script_stage('pyr_rename', PYR_MERGE, 'canvi_de_noms.py',
+                     ['refusPyrenees_finished_services.json'], ['refusPyrenees_definitiu.json'],
+                     uses=common_modules('json_stream')),
+        copy_stage('pyr_copy_definitiu', os.path.join(PYR_MERGE, 'refusPyrenees_definitiu.json'),
+                   os.path.join(PYR, 'refusPyrenees_definitiu.json'),
+                   os.path.join(MERGE, 'refusPyrenees_definitiu.json')),
+
+        # --- merge de les dues fonts i tasques finals ---
+        script_stage('merge_v2', MERGE, 'merge_refuges_v2.py',
+                     ['refusInfo_normalized_types_services.json', 'refusPyrenees_definitiu.json'],
+                     ['data_refugis.json'],
+                     uses=common_modules('amenities', 'assignment', 'geo', 'json_stream', 'names', 'spatial_index')),
+        copy_stage('copy_data_refugis', os.path.join(MERGE, 'data_refugis.json'),
+                   os.path.join(ALTITUDES, 'data_refugis.json')),
+        script_stage('altitudes', ALTITUDES, 'update_altitudes.py',
+                     ['data_refugis.json'],
+                     ['data_refugis_updated_altitudes.json', 'data_refugis_altitude_update_results.json',
+                      'data_refugis_altitude_update_summary.txt'],
+                     uses=common_modules('dem', 'elevation', 'json_stream')),
+        copy_stage('copy_altitudes', os.path.join(ALTITUDES, 'data_refugis_updated_altitudes.json'),
+                   os.path.join(TYPES, 'data_refugis_updated_altitudes.json')),
+        script_stage('types', TYPES, 'update_types.py',
+                     ['data_refugis_updated_altitudes.json'], ['data_refugis_updated_types.json'],
+                     uses=common_modules('json_stream')),
+        copy_stage('copy_types', os.path.join(TYPES, 'data_refugis_updated_types.json'),
+                   os.path.join(DUPLICATES, 'data_refugis_updated_types.json')),
+        # noms_parelles_semblants.txt és la llista revisada a mà de parelles duplicades
+        script_stage('duplicates', DUPLICATES, 'merge_duplicates.py',
+                     ['data_refugis_updated_types.json', 'noms_parelles_semblants.txt'],
+                     ['data_refugis_sense_repetits.json'],
+                     uses=common_modules('amenities', 'json_stream', 'name_index', 'names')),
+        copy_stage('copy_duplicates', os.path.join(DUPLICATES, 'data_refugis_sense_repetits.json'),
+                   os.path.join(DESCRIPTIONS, 'data_refugis_sense_repetits.json')),
+        script_stage('extract_descriptions', DESCRIPTIONS, 'extract_refuges_info.py',
+                     ['data_refugis_sense_repetits.json'], ['refuges_name_description_remarque.json'],
+                     uses=common_modules('json_stream')),
+        # Els refugis sense canvis es reutilitzen del manifest (o del journal i la cache);
+        # OPENAI_API_KEY només cal si n'hi ha algun per enviar al model
+        script_stage('descriptions', DESCRIPTIONS, 'merge_descriptions_with_gpt.py',
+                     ['refuges_name_description_remarque.json'], ['data_refuges_description_merged.json'],
+                     uses=common_modules('json_stream')),
+        final_stage('copy_final', os.path.join(DESCRIPTIONS, 'data_refuges_description_merged.json'), FINAL_DATA),
+        # --- exportació per a l'app ---
+        script_stage('export_bundle', EXPORT, 'export_bundle.py',
+                     [FINAL_DATA], ['final_data_refuges.bin'],
+                     uses=common_modules('amenities', 'columnar', 'bundle')),
+        script_stage('export_tiles', EXPORT, 'export_tiles.py',
+                     [FINAL_DATA], [os.path.join('tiles', 'manifest.json')],
+                     uses=common_modules('geo', 'tiles')),
+    ]
+
+
+# Etapes que preparen les dues fonts d'entrada del merge
+SOURCE_STAGES = ['info_copy_services', 'pyr_copy_definitiu']
+
+
+def load_script(folder, script):
+    """Importa un script com a mòdul (les carpetes dels passos no són paquets)"""
+    path = os.path.join(folder, script)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(script)[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_in_memory(snapshot_dir=None):
+    """
+    Executa el merge i les tasques finals (altituds, types, duplicats i extracció
+    de descripcions) sobre una sola llista de refugis en memòria: les dues fonts
+    es llegeixen un sol cop i el resultat s'escriu un sol cop al final, a la
+    carpeta del pas 4. Si es dona snapshot_dir, s'hi guarda també el resultat
+    intermedi de cada pas amb el mateix nom de fitxer que en el mode per fitxers.
+    """
+    merge = load_script(MERGE, 'merge_refuges_v2.py')
+    altitudes = load_script(ALTITUDES, 'update_altitudes.py')
+    types = load_script(TYPES, 'update_types.py')
+    duplicates = load_script(DUPLICATES, 'merge_duplicates.py')
+    extract = load_script(DESCRIPTIONS, 'extract_refuges_info.py')
+
+    def snapshot(filename, data):
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+            write_refuges(data_file(os.path.join(snapshot_dir, filename)), data)
+
+    refuges_info = list(iter_refuges(data_file(os.path.join(MERGE, 'refusInfo_normalized_types_services.json')),
+                                     key='nodes'))
+    refuges_pyrenees = list(iter_refuges(data_file(os.path.join(MERGE, 'refusPyrenees_definitiu.json'))))
+
+    refuges, _ = merge.merge_sources(refuges_info, refuges_pyrenees)
+    snapshot('data_refugis.json', refuges)
+
+    update_results = altitudes.update_altitudes(refuges)
+    if update_results is not None:
+        altitudes.save_reports(update_results, os.path.join(ALTITUDES, 'data_refugis.json'))
+        altitudes.print_summary(update_results)
+    snapshot('data_refugis_updated_altitudes.json', refuges)
+
+    types.print_statistics(*types.update_types(refuges))
+    snapshot('data_refugis_updated_types.json', refuges)
+
+    pairs = duplicates.parse_pairs_file(os.path.join(DUPLICATES, 'noms_parelles_semblants.txt'))
+    refuges, results = duplicates.merge_duplicate_pairs(refuges, pairs)
+    print(f"Parelles fusionades: {results['merged_count']}/{len(pairs)}, refugis resultants: {len(refuges)}")
+    if results['not_found']:
+        duplicates.save_not_found_report(results['not_found'],
+                                         os.path.join(DUPLICATES, 'parelles_no_trobades.txt'))
+
+    extracted = extract.extract_fields(refuges)
+    extract.print_statistics(extracted)
+
+    outputs = [(data_file(os.path.join(DESCRIPTIONS, 'data_refugis_sense_repetits.json')), refuges),
+               (data_file(os.path.join(DESCRIPTIONS, 'refuges_name_description_remarque.json')), extracted)]
+    for path, data in outputs:
+        write_refuges(path, data)
+        print(f"Fitxer generat: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa les etapes del tractament de dades de refugis")
+    parser.add_argument('targets', nargs='*', help="etapes a obtenir (per defecte, totes)")
+    parser.add_argument('--list', action='store_true', help="mostra les etapes i si estan al dia")
+    parser.add_argument('--force', action='store_true', help="torna a executar les etapes seleccionades")
+    parser.add_argument('--jobs', type=int, default=2, help="etapes en paral·lel (per defecte 2)")
+    parser.add_argument('--in-memory', action='store_true',
+                        help="prepara les fonts i executa el merge i les tasques finals en memòria")
+    parser.add_argument('--snapshots', metavar='DIR',
+                        help="amb --in-memory, guarda el resultat de cada pas a DIR")
+    parser.add_argument('--format', choices=FORMATS,
+                        help=f"format dels fitxers intermedis (per defecte, ${FORMAT_ENV} o json)")
+    args = parser.parse_args()
+
+    # Els scripts de cada etapa hereten el format de l'entorn
+    if args.format:
+        os.environ[FORMAT_ENV] = args.format
+
+    pipeline = Pipeline(build_stages(), STATE_FILE, log_dir=LOG_DIR)
+    selected = pipeline.select(args.targets)
+
+    if args.list:
+        for name in selected:
+            state = "al dia" if pipeline.is_up_to_date(name) else "pendent"
+            after = f" (després de {', '.join(pipeline.dependencies[name])})" if pipeline.dependencies[name] else ''
+            print(f"{name:24} {state:8}{after}")
+        return 0
+
+    if args.in_memory:
+        status = pipeline.run(SOURCE_STAGES, max_workers=args.jobs, force=args.force)
+        if any(s in ('failed', 'blocked') for s in status.values()):
+            return 1
+        run_in_memory(args.snapshots)
+        return 0
+
+    status = pipeline.run(args.targets, max_workers=args.jobs, force=args.force)
+
+    print("\n" + "=" * 60)
+    print("RESUM")
+    print("=" * 60)
+    for label, key in [("Executades", 'done'), ("Al dia (saltades)", 'skipped'),
+                       ("Amb errors", 'failed'), ("No executades per errors previs", 'blocked')]:
+        names = [name for name in selected if status.get(name) == key]
+        print(f"{label}: {len(names)}" + (f" - {', '.join(names)}" if names and key != 'skipped' else ''))
+
+    return 1 if any(s in ('failed', 'blocked') for s in status.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
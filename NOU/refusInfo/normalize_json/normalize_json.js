@@ -137,4 +137,5 @@ try {
   
 } catch (err) {
   console.error(`Error: ${err.message}`);
+  process.exit(1);
 }
\ No newline at end of file
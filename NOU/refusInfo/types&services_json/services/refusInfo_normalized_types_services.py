@@ -14,16 +14,22 @@ Transformacions aplicades:
 - places_matelas: si no és 0, places_matelas → 1 i afegir info a description
 """
 
-import json
+import os
+import sys
 
-def normalize_info_comp(data):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.json_stream import data_path, iter_refuges, write_refuges
+
+def normalize_info_comp(refugis):
     """
     Normalitza els camps de info_comp segons les regles especificades.
+    Rep i retorna un iterador de refugis (es processen d'un en un).
     """
     refugis_processats = 0
     
-    for refugi in data.get("nodes", []):
+    for refugi in refugis:
         if "info_comp" not in refugi:
+            yield refugi
             continue
             
         info_comp = refugi["info_comp"]
@@ -101,17 +107,19 @@ def normalize_info_comp(data):
                 if (f"Il y a {places_matelas_num} matelas" not in description and 
                     not re.search(rf"Places sur Matelas:\s*{places_matelas_num}", description)):
                     refugi["description"] = description + matelas_info
+        
+        yield refugi
     
     print(f"S'han processat {refugis_processats} refugis.")
-    return data
 
-def rename_and_remove_fields(data):
+def rename_and_remove_fields(refugis):
     """
     Canvia el nom del camp 'derniere_modif' a 'modified_at' i elimina el camp 'id'.
+    Rep i retorna un iterador de refugis.
     """
     refugis_modificats = 0
     
-    for refugi in data.get("nodes", []):
+    for refugi in refugis:
         # Canviar nom del camp derniere_modif a modified_at
         if "derniere_modif" in refugi:
             refugi["modified_at"] = refugi.pop("derniere_modif")
@@ -121,53 +129,45 @@ def rename_and_remove_fields(data):
             del refugi["id"]
             
         refugis_modificats += 1
+        yield refugi
     
     print(f"S'han modificat {refugis_modificats} refugis: canviat 'derniere_modif' → 'modified_at' i eliminat 'id'.")
-    return data
 
 def main():
     """Funció principal."""
-    input_file = "refusInfo_normalized_with_types.json"
-    output_file = "refusInfo_normalized_types_services.json"
+    input_file = data_path("refusInfo_normalized_with_types.json")
+    output_file = data_path("refusInfo_normalized_types_services.json")
     
-    print(f"Carregant dades de {input_file}...")
+    # Els quatre passos s'encadenen: cada refugi els travessa tots i s'escriu
+    # abans de llegir el següent
+    print(f"Processant {input_file} → {output_file}...")
+    refugis = iter_refuges(input_file, key='nodes')
+    refugis = normalize_info_comp(refugis)
+    refugis = rename_and_remove_fields(refugis)
+    refugis = rename_fields(refugis)
+    refugis = normalize_places_field(refugis)
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        write_refuges(output_file, refugis, indent=2, key='nodes')
     except FileNotFoundError:
         print(f"Error: No s'ha trobat el fitxer {input_file}")
-        return
-    except json.JSONDecodeError as e:
+        return 1
+    except ValueError as e:
         print(f"Error al llegir el JSON: {e}")
-        return
-    
-    print("Normalitzant camps info_comp...")
-    normalized_data = normalize_info_comp(data)
-    
-    print("Renombrant camps i eliminant camps innecessaris...")
-    renamed_data = rename_and_remove_fields(normalized_data)
-    
-    print("Renombrant camps 'nom' i 'places_matelas'...")
-    final_data = rename_fields(renamed_data)
-    
-    print("Normalitzant camp 'places'...")
-    final_data = normalize_places_field(final_data)
-    
-    print(f"Guardant dades normalitzades a {output_file}...")
-    try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(final_data, f, ensure_ascii=False, indent=2)
-        print(f"Fitxer {output_file} creat correctament!")
+        return 1
     except Exception as e:
         print(f"Error al guardar el fitxer: {e}")
+        return 1
+    print(f"Fitxer {output_file} creat correctament!")
+    return 0
 
-def rename_fields(data):
+def rename_fields(refugis):
     """
     Canvia el nom del camp 'nom' a 'name' i el camp 'places_matelas' de 'info_comp' a 'matelas'.
+    Rep i retorna un iterador de refugis.
     """
     refugis_modificats = 0
     
-    for refugi in data.get("nodes", []):
+    for refugi in refugis:
         # Canviar nom del camp 'nom' a 'name'
         if "nom" in refugi:
             refugi["name"] = refugi.pop("nom")
@@ -177,17 +177,18 @@ def rename_fields(data):
             refugi["info_comp"]["matelas"] = refugi["info_comp"].pop("places_matelas")
             
         refugis_modificats += 1
+        yield refugi
     
     print(f"S'han modificat {refugis_modificats} refugis: canviat 'nom' → 'name' i 'places_matelas' → 'matelas'.")
-    return data
 
-def normalize_places_field(data):
+def normalize_places_field(refugis):
     """
     Normalitza el camp 'places': si és un string i no un número, el posa a null.
+    Rep i retorna un iterador de refugis.
     """
     refugis_modificats = 0
     
-    for refugi in data.get("nodes", []):
+    for refugi in refugis:
         if "places" in refugi:
             places_val = refugi["places"]
             
@@ -204,9 +205,10 @@ def normalize_places_field(data):
                         # Si no es pot convertir a número, posar null
                         refugi["places"] = None
                         refugis_modificats += 1
+        
+        yield refugi
     
     print(f"S'han normalitzat {refugis_modificats} refugis amb 'places' string convertides a null.")
-    return data
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,17 +1,16 @@
-import json
 import os
+import sys
 
-# Rutas de archivos
-input_json_path = "refusInfo_normalized.json"
-output_json_path = "refusInfo_normalized_with_types.json"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.json_stream import data_path, iter_refuges, open_writer
 
-# Leer el archivo JSON normalizado
-with open(input_json_path, 'r', encoding='utf-8') as file:
-    data = json.load(file)
+# Rutas de archivos (la salida en el formato de los ficheros intermedios, ver common/json_stream.py)
+input_json_path = "refusInfo_normalized.json"
+output_json_path = data_path("refusInfo_normalized_with_types.json")
 
 # Contadores para estadísticas
 stats = {
-    'total_nodes': len(data['nodes']),
+    'total_nodes': 0,
     'type_fermee': 0,
     'type_detruite': 0,
     'type_cabane_ouverte': 0,
@@ -20,43 +19,53 @@ stats = {
 }
 
 # Procesar cada nodo
-for node in data['nodes']:
-    # 1. Manejar el campo "etat" y crear "type"
-    if 'etat' in node:
-        if node['etat'] == "Fermée":
-            node['type'] = "Fermée"
-            del node['etat']
-            stats['type_fermee'] += 1
-        elif node['etat'] == "Détruite":
-            node['type'] = "Détruite"
-            del node['etat']
-            stats['type_detruite'] += 1
-        else:
-            # Si etat no es Fermée ni Détruite
-            node['type'] = "cabane ouverte"
-            
-            # Eliminar etat si es igual que remarque
-            if 'remarque' in node and node['etat'] == node['remarque']:
+def process_nodes(nodes):
+    """Procesa los nodos de uno en uno, a medida que se leen"""
+    for node in nodes:
+        stats['total_nodes'] += 1
+
+        # 1. Manejar el campo "etat" y crear "type"
+        if 'etat' in node:
+            if node['etat'] == "Fermée":
+                node['type'] = "Fermée"
+                del node['etat']
+                stats['type_fermee'] += 1
+            elif node['etat'] == "Détruite":
+                node['type'] = "Détruite"
                 del node['etat']
-                stats['etat_removed_equal_remarque'] += 1
+                stats['type_detruite'] += 1
             else:
-                # Si etat es diferente de remarque, mantener ambos y agregar type
-                pass
+                # Si etat no es Fermée ni Détruite
+                node['type'] = "cabane ouverte"
+            
+                # Eliminar etat si es igual que remarque
+                if 'remarque' in node and node['etat'] == node['remarque']:
+                    del node['etat']
+                    stats['etat_removed_equal_remarque'] += 1
+                else:
+                    # Si etat es diferente de remarque, mantener ambos y agregar type
+                    pass
+                stats['type_cabane_ouverte'] += 1
+        else:
+            # Si no hay campo etat, establecer type por defecto
+            node['type'] = "cabane ouverte"
             stats['type_cabane_ouverte'] += 1
-    else:
-        # Si no hay campo etat, establecer type por defecto
-        node['type'] = "cabane ouverte"
-        stats['type_cabane_ouverte'] += 1
     
-    # 2. Eliminar remarque si es igual que description
-    if 'remarque' in node and 'description' in node:
-        if node['remarque'] == node['description']:
-            del node['remarque']
-            stats['remarque_removed_equal_description'] += 1
+        # 2. Eliminar remarque si es igual que description
+        if 'remarque' in node and 'description' in node:
+            if node['remarque'] == node['description']:
+                del node['remarque']
+                stats['remarque_removed_equal_description'] += 1
+        
+        yield node
 
-# Escribir el resultado al archivo de salida
-with open(output_json_path, 'w', encoding='utf-8') as output_file:
-    json.dump(data, output_file, ensure_ascii=False, indent=2)
+# Leer, procesar y escribir los nodos de uno en uno
+first_node = None
+with open_writer(output_json_path, key='nodes') as writer:
+    for node in process_nodes(iter_refuges(input_json_path, key='nodes')):
+        if first_node is None:
+            first_node = node
+        writer.write(node)
 
 # Mostrar estadísticas
 print("Procesamiento completado!")
@@ -71,7 +80,6 @@ print(f"- Campos 'remarque' eliminados (igual a description): {stats['remarque_r
 
 # Mostrar un ejemplo del primer nodo procesado
 print(f"\nEjemplo del primer nodo procesado:")
-first_node = data['nodes'][0]
 print(f"ID: {first_node['id']}")
 print(f"Nombre: {first_node['nom']}")
 print(f"Type: {first_node['type']}")
@@ -277,4 +277,5 @@ try {
   
 } catch (err) {
   console.error(`Error: ${err.message}`);
+  process.exit(1);
 }
@@ -1,40 +1,49 @@
-import json
-
-# Read the original JSON file
-input_file = r"c:\Users\jordi\Desktop\UNI\TFG\INFO\NOU\refusPyrenees\Completa (té serveis)\refusPyrineesCompleta.json"
-output_file = r"c:\Users\jordi\Desktop\UNI\TFG\INFO\NOU\refusPyrenees\Completa (té serveis)\refusPyrineesComp_norm.json"
+import os
+import sys
+from collections import Counter
 
-# Load the data
-with open(input_file, 'r', encoding='utf-8') as f:
-    data = json.load(f)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.json_stream import data_path, iter_refuges, write_refuges
 
-print(f"Total d'elements originals: {len(data)}")
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Filter out elements with type "Ruine" or "Refuge gardé toute l'année"
-# Also remove the "ideerando" field from all elements
-filtered_data = []
-removed_count = 0
+# Original JSON file and filtered output
+input_file = os.path.join(SCRIPT_DIR, "refusPyrineesCompleta.json")
+output_file = data_path(os.path.join(SCRIPT_DIR, "refusPyrineesComp_norm.json"))
 
-for item in data:
-    if isinstance(item, dict):
-        item_type = item.get('type', '')
-        if item_type not in ["Ruine", "Refuge gardé toute l'année"]:
-            # Create a copy of the item without the "ideerando" field
-            filtered_item = {key: value for key, value in item.items() if key != 'ideerando'}
-            filtered_data.append(filtered_item)
+def filter_items(items, stats):
+    """
+    Filter out elements with type "Ruine" or "Refuge gardé toute l'année" and
+    remove the "ideerando" field, one element at a time, counting them in stats
+    """
+    for item in items:
+        stats['total'] += 1
+        if isinstance(item, dict):
+            item_type = item.get('type', '')
+            if item_type not in ["Ruine", "Refuge gardé toute l'année"]:
+                # Create a copy of the item without the "ideerando" field
+                filtered_item = {key: value for key, value in item.items() if key != 'ideerando'}
+                stats['types'][filtered_item.get('type', '')] += 1
+                stats['has_ideerando'] = stats['has_ideerando'] or 'ideerando' in filtered_item
+            else:
+                stats['removed'] += 1
+                print(f"Eliminat: {item.get('name', 'sense nom')} - Tipus: {item_type}")
+                continue
         else:
-            removed_count += 1
-            print(f"Eliminat: {item.get('name', 'sense nom')} - Tipus: {item_type}")
-    else:
-        # Keep non-dictionary items (shouldn't happen in this case)
-        filtered_data.append(item)
+            # Keep non-dictionary items (shouldn't happen in this case)
+            filtered_item = item
+        if stats['first'] is None:
+            stats['first'] = filtered_item
+        yield filtered_item
 
-print(f"\nElements eliminats: {removed_count}")
-print(f"Elements restants: {len(filtered_data)}")
+# Stream the elements from the original file into the filtered file
+stats = {'total': 0, 'removed': 0, 'first': None, 'types': Counter(), 'has_ideerando': False}
+kept_count = write_refuges(output_file, filter_items(iter_refuges(input_file), stats), indent=4)
+removed_count = stats['removed']
 
-# Save the filtered data to the new file
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(filtered_data, f, ensure_ascii=False, indent=4)
+print(f"\nTotal d'elements originals: {stats['total']}")
+print(f"Elements eliminats: {removed_count}")
+print(f"Elements restants: {kept_count}")
 
 print(f"\nFitxer creat: {output_file}")
 
@@ -44,13 +53,11 @@ print(f"1. Eliminació d'elements amb type='Ruine' o 'Refuge gardé toute l'ann
 print(f"2. Eliminació del camp 'ideerando': ✓")
 
 # Check if ideerando was successfully removed
-has_ideerando = any('ideerando' in item for item in filtered_data if isinstance(item, dict))
+has_ideerando = stats['has_ideerando']
 print(f"3. Camp 'ideerando' completament eliminat: {'✗' if has_ideerando else '✓'}")
 
-# Verify the filtering by counting types in the new file
-from collections import Counter
-types = [item.get('type', '') for item in filtered_data if isinstance(item, dict)]
-type_counts = Counter(types)
+# Verify the filtering by counting types in the new file (counted while streaming)
+type_counts = stats['types']
 
 print("\nTipus restants:")
 for type_name, count in sorted(type_counts.items(), key=lambda x: x[1], reverse=True):
@@ -60,9 +67,10 @@ for type_name, count in sorted(type_counts.items(), key=lambda x: x[1], reverse=
         print(f"  [Buit/Null]: {count}")
 
 # Show sample of first transformed element
-if filtered_data:
+first = stats['first']
+if first is not None:
     print(f"\nMostra del primer element transformat:")
-    sample_keys = list(filtered_data[0].keys()) if isinstance(filtered_data[0], dict) else []
+    sample_keys = list(first.keys()) if isinstance(first, dict) else []
     print(f"- Camps disponibles: {', '.join(sample_keys[:10])}{'...' if len(sample_keys) > 10 else ''}")
     print(f"- NO té 'ideerando': {'ideerando' not in sample_keys}")
-    print(f"- Valor de 'type': {filtered_data[0].get('type', 'N/A') if isinstance(filtered_data[0], dict) else 'N/A'}")
\ No newline at end of file
+    print(f"- Valor de 'type': {first.get('type', 'N/A') if isinstance(first, dict) else 'N/A'}")
\ No newline at end of file
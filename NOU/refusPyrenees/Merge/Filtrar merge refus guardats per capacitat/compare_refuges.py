@@ -3,8 +3,15 @@
 
 import os
 import re
+import sys
 import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.name_index import NameIndex
+
+# Similitud a partir de la qual un nom no guardat es considera una possible variant d'un guardat
+SIMILAR_NAME_THRESHOLD = 0.8
+
 def extract_refuge_names_from_file(file_path):
     """
     Extreu els noms dels refugis d'un fitxer de text
@@ -111,13 +118,19 @@ def main():
     
     # Trobar refugis que estan en alta capacitat però no en guardats
     refuges_no_guardats = []
+    guardats_index = NameIndex.from_names(sorted(refuges_guardats))
     
     for refuge_name in refuges_alta_capacitat:
-        if refuge_name not in refuges_guardats:
+        if refuge_name not in guardats_index:
             refuges_no_guardats.append(refuges_alta_capacitat[refuge_name])
     
     print(f"Refugis no guardats (filtrats): {len(refuges_no_guardats)}")
     
+    # Avisar dels noms no guardats molt semblants a un de guardat (possible errada en el nom)
+    for refuge in refuges_no_guardats:
+        for _, similar_name, score in guardats_index.search(refuge['name'], SIMILAR_NAME_THRESHOLD, limit=1):
+            print(f"  Atenció: '{refuge['name']}' s'assembla al refugi guardat '{similar_name}' ({score:.2f})")
+    
     if not refuges_no_guardats:
         print("Tots els refugis d'alta capacitat ja estan en la llista de guardats.")
         return
@@ -6,6 +6,15 @@ import sys
 import datetime
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.numeric import first_number, map_distinct
+
+def capacity_number(capacity):
+    """Primer número d'un valor de capacitat (0 si no n'hi ha cap)"""
+    if not capacity or not str(capacity).strip():
+        return 0
+    return first_number(str(capacity).strip()) or 0
+
 def find_high_capacity_refuges(json_file_path):
     """
     Troba tots els refugis amb capacitat superior a 15 (estiu o hivern)
@@ -16,38 +25,15 @@ def find_high_capacity_refuges(json_file_path):
         
         high_capacity_refuges = []
         
-        for item in data:
+        # Convertir a números per comparar: el primer número de cada valor
+        # (en cas que hi hagi text addicional), calculat un cop per valor diferent
+        cap_ete_nums = map_distinct(capacity_number, (item.get('cap_ete', '') for item in data))
+        cap_hiver_nums = map_distinct(capacity_number, (item.get('cap_hiver', '') for item in data))
+        
+        for item, cap_ete_num, cap_hiver_num in zip(data, cap_ete_nums, cap_hiver_nums):
             cap_ete = item.get('cap_ete', '')
             cap_hiver = item.get('cap_hiver', '')
             
-            # Convertir a números per comparar
-            cap_ete_num = 0
-            cap_hiver_num = 0
-            
-            # Intentar convertir cap_ete a número
-            if cap_ete and str(cap_ete).strip():
-                try:
-                    # Extraure només números (en cas que hi hagi text addicional)
-                    cap_ete_str = str(cap_ete).strip()
-                    # Buscar el primer número en la cadena
-                    import re
-                    numbers = re.findall(r'\d+', cap_ete_str)
-                    if numbers:
-                        cap_ete_num = int(numbers[0])
-                except:
-                    cap_ete_num = 0
-            
-            # Intentar convertir cap_hiver a número
-            if cap_hiver and str(cap_hiver).strip():
-                try:
-                    cap_hiver_str = str(cap_hiver).strip()
-                    import re
-                    numbers = re.findall(r'\d+', cap_hiver_str)
-                    if numbers:
-                        cap_hiver_num = int(numbers[0])
-                except:
-                    cap_hiver_num = 0
-            
             # Comprovar si alguna capacitat és superior a 15
             if cap_ete_num > 15 or cap_hiver_num > 15:
                 high_capacity_refuges.append({
@@ -1,5 +1,13 @@
-import json
+import os
 import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.json_stream import data_path, iter_refuges, write_refuges
+from common.name_index import NameIndex
+
+# Minimum similarity to suggest a refuge name for a listed name with no exact match
+SUGGESTION_THRESHOLD = 0.6
 
 def extract_refuge_names_from_txt(txt_file_path):
     """Extract refuge names from the text file"""
@@ -20,49 +28,58 @@ def extract_refuge_names_from_txt(txt_file_path):
     
     return refuge_names
 
-def remove_refuges_from_json(json_file_path, refuge_names_to_remove):
-    """Remove refuges from JSON file that match the names in the list"""
-    
-    # Load the JSON file
-    with open(json_file_path, 'r', encoding='utf-8') as file:
-        refuges = json.load(file)
-    
-    print(f"Original number of refuges: {len(refuges)}")
-    
-    # Create a filtered list
-    filtered_refuges = []
-    removed_count = 0
-    
-    for refuge in refuges:
+def filter_refuges(refuges, names_to_remove, refuge_index, stats):
+    """
+    Yield the refuges whose name is not in names_to_remove, one at a time.
+    The names of all refuges are added to refuge_index along the way.
+    """
+    for i, refuge in enumerate(refuges):
+        stats['original'] += 1
         refuge_name = refuge.get('name', '')
+        if isinstance(refuge_name, str) and refuge_name:
+            refuge_index.add(refuge_name, i)
         
         # Check if this refuge should be removed
-        should_remove = False
-        for name_to_remove in refuge_names_to_remove:
-            if refuge_name == name_to_remove:
-                should_remove = True
-                print(f"Removing: {refuge_name}")
-                removed_count += 1
-                break
-        
-        if not should_remove:
-            filtered_refuges.append(refuge)
+        if refuge_name in names_to_remove:
+            print(f"Removing: {refuge_name}")
+            stats['removed'] += 1
+        else:
+            yield refuge
+
+def remove_refuges_from_json(json_file_path, refuge_names_to_remove):
+    """
+    Remove refuges from JSON file that match the names in the list.
+    The refuges are streamed from the input file to the output file.
+    Returns the number of remaining refuges.
+    """
+    names_to_remove = NameIndex.from_names(refuge_names_to_remove)
+    refuge_index = NameIndex()
+    stats = {'original': 0, 'removed': 0}
+    
+    # Save the filtered refuges to a new file as they are read
+    root, ext = os.path.splitext(json_file_path)
+    output_file = f"{root}_filtered{ext}"
+    remaining = write_refuges(output_file, filter_refuges(iter_refuges(json_file_path), names_to_remove,
+                                                          refuge_index, stats), indent=2)
     
-    print(f"Refuges removed: {removed_count}")
-    print(f"Remaining refuges: {len(filtered_refuges)}")
+    print(f"Original number of refuges: {stats['original']}")
+    print(f"Refuges removed: {stats['removed']}")
+    print(f"Remaining refuges: {remaining}")
     
-    # Save the filtered JSON to a new file
-    output_file = json_file_path.replace('.json', '_filtered.json')
-    with open(output_file, 'w', encoding='utf-8') as file:
-        json.dump(filtered_refuges, file, ensure_ascii=False, indent=2)
+    # Listed names that match no refuge (probably a typo in the text file)
+    for name in refuge_names_to_remove:
+        if name not in refuge_index:
+            print(f"Not found: {name}")
+            for _, similar_name, score in refuge_index.search(name, SUGGESTION_THRESHOLD, limit=3):
+                print(f"  Did you mean '{similar_name}'? ({score:.2f})")
     
     print(f"Filtered data saved to: {output_file}")
-    return filtered_refuges
+    return remaining
 
 def main():
     # File paths
     txt_file = "refugisPyrinees_refus_guardats.txt"
-    json_file = "refusPyrinees_merged.json"
+    json_file = data_path("refusPyrinees_merged.json")
     
     # Extract refuge names from the text file
     print("Extracting refuge names from text file...")
@@ -74,7 +91,7 @@ def main():
     
     # Remove these refuges from the JSON file
     print("\nRemoving refuges from JSON file...")
-    filtered_refuges = remove_refuges_from_json(json_file, refuge_names_to_remove)
+    remove_refuges_from_json(json_file, refuge_names_to_remove)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,58 +1,95 @@
-import json
-import re
-from difflib import SequenceMatcher
-
-def normalize_name(name):
-    """Normalize name for comparison - remove accents, convert to lowercase, remove extra spaces"""
-    if not name:
-        return ""
-    
-    # Convert to lowercase and remove extra spaces
-    name = re.sub(r'\s+', ' ', name.lower().strip())
-    
-    # Remove common prefixes/suffixes that might vary
-    prefixes_to_remove = ['refuge', 'cabane', 'refugio', 'cabana', 'chalet', 'abri', 'grange', 'orri', 'cayolar']
-    suffixes_to_remove = ['(ruines)', 'ruines', 'ou', 'de', 'du', 'des', 'da', 'del', 'dels', 'de la', 'del']
-    
-    # Remove articles and common words
-    articles = ['le', 'la', 'les', 'el', 'los', 'las', 'de', 'du', 'des', 'da', 'del', 'dels', 'de la']
-    
-    words = name.split()
-    filtered_words = []
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.json_stream import data_path, iter_refuges, write_refuges
+from common.names import name_trigrams, normalize_name_words as normalize_name
+from common.similarity import get_metric
+
+# Name similarity metric (see common/similarity.py): sequence, jaro_winkler, levenshtein or token_set
+METRIC = 'sequence'
+
+# Name keys (trigrams, prefix) shared by more than this fraction of comp_items
+# are too common to discriminate and are ignored when blocking
+MAX_NAME_KEY_FRACTION = 0.05
+
+def similarity_score(str1, str2, metric=METRIC, cutoff=0.0):
+    """
+    Calculate similarity between two strings.
+    With a cutoff, returns 0.0 as soon as the similarity cannot reach it.
+    """
+    return get_metric(metric)(str1, str2, cutoff)
+
+def clean_altitude(item):
+    return str(item.get('altitude', '')).replace('m', '').strip()
+
+def blocking_keys(name, altitude, cap_ete, cap_hiver):
+    """
+    Blocking keys of an item: name trigrams and prefix (soft keys, ignored if
+    too common), altitude bucket and capacity key (altitude + both capacities).
+    The altitude and capacity keys are the exact values rewarded by the score.
+    """
+    name_keys = [('trigram', t) for t in name_trigrams(name)]
+    if name:
+        name_keys.append(('prefix', name[:4]))
+    exact_keys = [('altitude', altitude), ('capacity', altitude, cap_ete, cap_hiver)]
+    return name_keys, exact_keys
+
+class BlockingIndex:
+    """Inverted index from blocking keys to comp_items positions"""
     
-    for word in words:
-        # Skip articles and very short words
-        if len(word) > 2 and word not in articles:
-            filtered_words.append(word)
+    def __init__(self, comp_items, max_name_key_fraction=MAX_NAME_KEY_FRACTION):
+        self.blocks = defaultdict(list)
+        for j, comp_item in enumerate(comp_items):
+            name_keys, exact_keys = blocking_keys(
+                normalize_name(comp_item.get('name', '')), clean_altitude(comp_item),
+                str(comp_item.get('capete', '')), str(comp_item.get('caphiv', '')))
+            for key in name_keys + exact_keys:
+                self.blocks[key].append(j)
+        self.max_name_block = max(1, int(max_name_key_fraction * len(comp_items)))
     
-    return ' '.join(filtered_words)
-
-def similarity_score(str1, str2):
-    """Calculate similarity between two strings"""
-    return SequenceMatcher(None, str1, str2).ratio()
+    def candidates(self, norm_item):
+        """Positions (in original order) of the comp_items sharing a key with norm_item"""
+        name_keys, exact_keys = blocking_keys(
+            normalize_name(norm_item.get('name', '')), clean_altitude(norm_item),
+            str(norm_item.get('cap_ete', '')), str(norm_item.get('cap_hiver', '')))
+        candidates = set()
+        for key in name_keys:
+            block = self.blocks.get(key, ())
+            if len(block) <= self.max_name_block:
+                candidates.update(block)
+        for key in exact_keys:
+            candidates.update(self.blocks.get(key, ()))
+        return sorted(candidates)
 
-def find_best_match(norm_item, comp_items, threshold=0.6):
-    """Find the best matching item from comp_items for norm_item"""
+def find_best_match(norm_item, comp_items, threshold=0.6, candidates=None, metric=METRIC):
+    """
+    Find the best matching item from comp_items for norm_item.
+    If candidates (positions in comp_items) is given, only those are scored.
+    The name similarity is computed with a cutoff: the minimum value that
+    could still beat the current best score given the other criteria.
+    """
     best_match = None
     best_score = 0
     matching_info = []
     
     norm_name = normalize_name(norm_item.get('name', ''))
-    norm_altitude = str(norm_item.get('altitude', '')).replace('m', '').strip()
+    norm_altitude = clean_altitude(norm_item)
     norm_cap_ete = str(norm_item.get('cap_ete', ''))
     norm_cap_hiver = str(norm_item.get('cap_hiver', ''))
     norm_region = normalize_name(norm_item.get('region', ''))
     
+    if candidates is not None:
+        comp_items = [comp_items[j] for j in candidates]
+    
     for comp_item in comp_items:
         comp_name = normalize_name(comp_item.get('name', ''))
-        comp_altitude = str(comp_item.get('altitude', '')).replace('m', '').strip()
+        comp_altitude = clean_altitude(comp_item)
         comp_capete = str(comp_item.get('capete', ''))
         comp_caphiv = str(comp_item.get('caphiv', ''))
         comp_ville = normalize_name(comp_item.get('ville', ''))
         
-        # Calculate name similarity
-        name_sim = similarity_score(norm_name, comp_name)
-        
         # Check altitude match
         altitude_match = (norm_altitude == comp_altitude and norm_altitude != '') or (norm_altitude == '' and comp_altitude == '')
         
@@ -60,8 +97,17 @@ def find_best_match(norm_item, comp_items, threshold=0.6):
         capete_match = (norm_cap_ete == comp_capete and norm_cap_ete != '') or (norm_cap_ete == '' and comp_capete == '')
         caphiv_match = (norm_cap_hiver == comp_caphiv and norm_cap_hiver != '') or (norm_cap_hiver == '' and comp_caphiv == '')
         
-        # Check region/ville match
-        region_sim = similarity_score(norm_region, comp_ville)
+        # Check region/ville match (only matters above 0.7)
+        region_sim = similarity_score(norm_region, comp_ville, metric, cutoff=0.7)
+        
+        # Skip the name similarity if it cannot reach the score needed to win
+        other_score = 0.15 * altitude_match + 0.1 * capete_match + 0.1 * caphiv_match + 0.05 * (region_sim > 0.7)
+        needed_name_sim = (max(threshold, best_score) - other_score) / 0.6
+        
+        # Calculate name similarity
+        name_sim = similarity_score(norm_name, comp_name, metric, cutoff=max(0.0, needed_name_sim - 1e-9))
+        if name_sim == 0.0 and needed_name_sim > 0:
+            continue
         
         # Calculate total score
         score = name_sim * 0.6  # Name is most important
@@ -82,95 +128,109 @@ def find_best_match(norm_item, comp_items, threshold=0.6):
                 'altitude_match': altitude_match,
                 'capete_match': capete_match,
                 'caphiv_match': caphiv_match,
-                'region_similarity': region_sim,
+                'region_similarity': region_sim or similarity_score(norm_region, comp_ville, metric),
                 'total_score': score
             }
     
     return best_match, best_score, matching_info
 
+def merge_items(norm_items, comp_data, difficult_matches, unmatched_items, stats):
+    """
+    Merge each norm item with its best match in comp_data, one item at a time.
+    Uncertain and unmatched items are appended to the given lists.
+    """
+    # Blocking: only score the comp items that share a key with each norm item
+    blocking_index = BlockingIndex(comp_data)
+    
+    for i, norm_item in enumerate(norm_items):
+        if i % 100 == 0:
+            print(f"Processat {i} elements...")
+        stats['processed'] += 1
+        
+        # Find the best match
+        candidates = blocking_index.candidates(norm_item)
+        stats['compared'] += len(candidates)
+        best_match, score, match_info = find_best_match(norm_item, comp_data, candidates=candidates)
+        
+        # Create the merged item
+        merged_item = norm_item.copy()
+        
+        if best_match:
+            # Add the fields from the complete file
+            merged_item['departement'] = best_match.get('departement', '')
+            merged_item['cheminee'] = best_match.get('cheminee', '')
+            merged_item['bois'] = best_match.get('bois', '')
+            merged_item['eau'] = best_match.get('eau', '')
+            merged_item['couchage'] = best_match.get('couchage', '')
+            
+            stats['matched'] += 1
+            
+            # If the match is uncertain (low score), add to difficult matches
+            if score < 0.8:
+                difficult_matches.append({
+                    'norm_name': norm_item.get('name', ''),
+                    'comp_name': best_match.get('name', ''),
+                    'score': score,
+                    'match_info': match_info,
+                    'norm_altitude': norm_item.get('altitude', ''),
+                    'comp_altitude': best_match.get('altitude', ''),
+                    'norm_region': norm_item.get('region', ''),
+                    'comp_ville': best_match.get('ville', '')
+                })
+        else:
+            # No match found - add empty fields
+            merged_item['departement'] = ''
+            merged_item['cheminee'] = ''
+            merged_item['bois'] = ''
+            merged_item['eau'] = ''
+            merged_item['couchage'] = ''
+            
+            unmatched_items.append({
+                'name': norm_item.get('name', ''),
+                'altitude': norm_item.get('altitude', ''),
+                'region': norm_item.get('region', ''),
+                'cap_ete': norm_item.get('cap_ete', ''),
+                'cap_hiver': norm_item.get('cap_hiver', '')
+            })
+        
+        yield merged_item
+
 # Load the JSON files
-norm_file = r"c:\Users\jordi\Desktop\UNI\TFG\INFO\NOU\refusPyrenees\Normal\refusPyrinees_norm.json"
-comp_file = r"c:\Users\jordi\Desktop\UNI\TFG\INFO\NOU\refusPyrenees\Completa (té serveis)\refusPyrineesComp_norm.json"
-output_file = r"c:\Users\jordi\Desktop\UNI\TFG\INFO\NOU\refusPyrenees\refusPyrinees_merged.json"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PYRENEES_DIR = os.path.join(SCRIPT_DIR, '..', '..')
+norm_file = data_path(os.path.join(PYRENEES_DIR, 'Normal', 'refusPyrinees_norm.json'))
+comp_file = data_path(os.path.join(PYRENEES_DIR, 'Completa (té serveis)', 'refusPyrineesComp_norm.json'))
+output_file = data_path(os.path.join(SCRIPT_DIR, 'refusPyrinees_merged.json'))
 
+# The comp items are indexed, so they are loaded; the norm items are streamed
 print("Carregant fitxers...")
-with open(norm_file, 'r', encoding='utf-8') as f:
-    norm_data = json.load(f)
-
-with open(comp_file, 'r', encoding='utf-8') as f:
-    comp_data = json.load(f)
-
-print(f"Fitxer norm: {len(norm_data)} elements")
+comp_data = list(iter_refuges(comp_file))
 print(f"Fitxer comp: {len(comp_data)} elements")
 
 # Merge the data
-merged_data = []
-matched_count = 0
 difficult_matches = []
 unmatched_items = []
+stats = {'processed': 0, 'matched': 0, 'compared': 0}
 
 print("\nProcessant emparellaments...")
 
-for i, norm_item in enumerate(norm_data):
-    if i % 100 == 0:
-        print(f"Processat {i}/{len(norm_data)} elements...")
-    
-    # Find the best match
-    best_match, score, match_info = find_best_match(norm_item, comp_data)
-    
-    # Create the merged item
-    merged_item = norm_item.copy()
-    
-    if best_match:
-        # Add the fields from the complete file
-        merged_item['departement'] = best_match.get('departement', '')
-        merged_item['cheminee'] = best_match.get('cheminee', '')
-        merged_item['bois'] = best_match.get('bois', '')
-        merged_item['eau'] = best_match.get('eau', '')
-        merged_item['couchage'] = best_match.get('couchage', '')
-        
-        matched_count += 1
-        
-        # If the match is uncertain (low score), add to difficult matches
-        if score < 0.8:
-            difficult_matches.append({
-                'norm_name': norm_item.get('name', ''),
-                'comp_name': best_match.get('name', ''),
-                'score': score,
-                'match_info': match_info,
-                'norm_altitude': norm_item.get('altitude', ''),
-                'comp_altitude': best_match.get('altitude', ''),
-                'norm_region': norm_item.get('region', ''),
-                'comp_ville': best_match.get('ville', '')
-            })
-    else:
-        # No match found - add empty fields
-        merged_item['departement'] = ''
-        merged_item['cheminee'] = ''
-        merged_item['bois'] = ''
-        merged_item['eau'] = ''
-        merged_item['couchage'] = ''
-        
-        unmatched_items.append({
-            'name': norm_item.get('name', ''),
-            'altitude': norm_item.get('altitude', ''),
-            'region': norm_item.get('region', ''),
-            'cap_ete': norm_item.get('cap_ete', ''),
-            'cap_hiver': norm_item.get('cap_hiver', '')
-        })
-    
-    merged_data.append(merged_item)
-
-# Save the merged data
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(merged_data, f, ensure_ascii=False, indent=4)
+# Save the merged data as it is produced
+write_refuges(output_file, merge_items(iter_refuges(norm_file), comp_data,
+                                       difficult_matches, unmatched_items, stats), indent=4)
+matched_count = stats['matched']
+compared_count = stats['compared']
 
 print(f"\nResultats:")
-print(f"Total elements processats: {len(norm_data)}")
+print(f"Total elements processats: {stats['processed']}")
 print(f"Elements emparellats: {matched_count}")
 print(f"Elements no emparellats: {len(unmatched_items)}")
 print(f"Emparellaments amb baixa confiança: {len(difficult_matches)}")
 
+total_comparisons = stats['processed'] * len(comp_data)
+print(f"\nComparacions fetes: {compared_count} de {total_comparisons} "
+      f"({total_comparisons - compared_count} descartades pel blocking, "
+      f"{(total_comparisons - compared_count) / total_comparisons * 100:.1f}%)")
+
 print(f"\nFitxer resultat creat: {output_file}")
 
 # Show difficult matches
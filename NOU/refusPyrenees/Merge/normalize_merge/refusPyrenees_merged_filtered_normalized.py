@@ -1,72 +1,28 @@
-import json
-import re
+import os
+import sys
 from typing import Union, Optional
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.json_stream import data_path, iter_refuges, write_refuges
+from common.numeric import find_numbers, max_number, parse_altitude
+
 def refusPyrenees_merged_filtered_normalized():
     """
     Normalitza el fitxer refusPyrinees_merged_filtered.json:
     - Converteix "altitude" a número. Si no hi ha o és 0, posa null.
     - Converteix "cap_ete" i "cap_hiver" en un sol camp "places" amb el valor més gran.
-    - Extreu números de strings complexos i frases.
+    - Extreu números de strings complexos i frases (common/numeric.py: cada
+      valor diferent s'analitza un sol cop).
     - Guarda el resultat com refusPyrenees_finished.json
     """
     
-    def extract_max_number_from_string(text: str) -> Optional[int]:
-        """
-        Extreu el número més gran d'un string que pot contenir múltiples números o text descriptiu.
-        Retorna None si no troba cap número vàlid.
-        """
-        if not text or text.strip() == '':
-            return None
-            
-        # Casos especials coneguts
-        text = text.strip().lower()
-        
-        # Si és exactament "0", retornem 0
-        if text == '0':
-            return 0
-            
-        # Si conté "non", "nada", "néant", etc., retornem 0
-        negative_words = ['non', 'nada', 'néant', 'rien']
-        if any(word in text for word in negative_words):
-            return 0
-            
-        # Buscar tots els números en el text
-        numbers = re.findall(r'\d+', text)
-        
-        if not numbers:
-            return None
-            
-        # Convertir a enters i retornar el màxim
-        try:
-            int_numbers = [int(num) for num in numbers]
-            return max(int_numbers)
-        except ValueError:
-            return None
-    
-    def normalize_altitude(altitude_str: str) -> Optional[int]:
-        """
-        Normalitza el camp altitude.
-        Retorna None si no hi ha valor o és 0.
-        """
-        if not altitude_str or altitude_str.strip() == '':
-            return None
-            
-        try:
-            alt = int(float(altitude_str.strip()))
-            return alt if alt > 0 else None
-        except (ValueError, TypeError):
-            # Intentar extreure número del string
-            number = extract_max_number_from_string(altitude_str)
-            return number if number and number > 0 else None
-    
     def calculate_places(cap_ete: str, cap_hiver: str) -> Optional[int]:
         """
         Calcula el camp "places" a partir de cap_ete i cap_hiver.
         Retorna el valor més gran entre els dos, o None si no hi ha cap número vàlid.
         """
-        ete_places = extract_max_number_from_string(cap_ete)
-        hiver_places = extract_max_number_from_string(cap_hiver)
+        ete_places = max_number(cap_ete)
+        hiver_places = max_number(cap_hiver)
         
         # Si cap dels dos té valor, retornem None
         if ete_places is None and hiver_places is None:
@@ -82,18 +38,12 @@ def refusPyrenees_merged_filtered_normalized():
         return max(ete_places, hiver_places)
     
     # Llegir el fitxer original
-    input_file = r'refusPyrinees_merged_filtered.json'
-    output_file = r'refusPyrenees_finished.json'
-    
-    print("Llegint el fitxer original...")
-    with open(input_file, 'r', encoding='utf-8') as f:
-        refuges = json.load(f)
-    
-    print(f"Processant {len(refuges)} refugis...")
+    input_file = data_path('refusPyrinees_merged_filtered.json')
+    output_file = data_path('refusPyrenees_finished.json')
     
     # Estadístiques per fer seguiment
     stats = {
-        'total_refuges': len(refuges),
+        'total_refuges': 0,
         'altitude_nulls': 0,
         'altitude_converted': 0,
         'places_nulls': 0,
@@ -101,61 +51,62 @@ def refusPyrenees_merged_filtered_normalized():
         'casos_especials': []
     }
     
-    normalized_refuges = []
-    
-    for i, refuge in enumerate(refuges):
-        # Crear una còpia del refugi
-        normalized_refuge = refuge.copy()
-        
-        # Normalitzar altitude
-        original_altitude = refuge.get('altitude', '')
-        normalized_altitude = normalize_altitude(original_altitude)
-        
-        if normalized_altitude is None:
-            stats['altitude_nulls'] += 1
-        else:
-            stats['altitude_converted'] += 1
+    def normalize_refuges(refuges):
+        """Normalitza els refugis d'un en un, a mesura que es llegeixen"""
+        for i, refuge in enumerate(refuges):
+            stats['total_refuges'] += 1
             
-        normalized_refuge['altitude'] = normalized_altitude
-        
-        # Calcular places
-        cap_ete = refuge.get('cap_ete', '')
-        cap_hiver = refuge.get('cap_hiver', '')
-        places = calculate_places(cap_ete, cap_hiver)
-        
-        if places is None:
-            stats['places_nulls'] += 1
-        else:
-            stats['places_calculated'] += 1
-        
-        # Eliminar els camps originals i afegir el nou
-        if 'cap_ete' in normalized_refuge:
-            del normalized_refuge['cap_ete']
-        if 'cap_hiver' in normalized_refuge:
-            del normalized_refuge['cap_hiver']
+            # Crear una còpia del refugi
+            normalized_refuge = refuge.copy()
             
-        normalized_refuge['places'] = places
-        
-        # Detectar casos especials per a la verificació
-        if (cap_ete and cap_ete not in ['', ' ', '0']) or (cap_hiver and cap_hiver not in ['', ' ', '0']):
-            if len(re.findall(r'\d+', cap_ete + ' ' + cap_hiver)) > 2:  # Més de 2 números
-                stats['casos_especials'].append({
-                    'nom': refuge.get('name', 'Unknown'),
-                    'cap_ete': cap_ete,
-                    'cap_hiver': cap_hiver,
-                    'places_calculat': places
-                })
-        
-        normalized_refuges.append(normalized_refuge)
-        
-        # Mostrar progrés cada 100 refugis
-        if (i + 1) % 100 == 0:
-            print(f"Processat {i + 1}/{len(refuges)} refugis...")
+            # Normalitzar altitude
+            original_altitude = refuge.get('altitude', '')
+            normalized_altitude = parse_altitude(original_altitude)
+            
+            if normalized_altitude is None:
+                stats['altitude_nulls'] += 1
+            else:
+                stats['altitude_converted'] += 1
+                
+            normalized_refuge['altitude'] = normalized_altitude
+            
+            # Calcular places
+            cap_ete = refuge.get('cap_ete', '')
+            cap_hiver = refuge.get('cap_hiver', '')
+            places = calculate_places(cap_ete, cap_hiver)
+            
+            if places is None:
+                stats['places_nulls'] += 1
+            else:
+                stats['places_calculated'] += 1
+            
+            # Eliminar els camps originals i afegir el nou
+            if 'cap_ete' in normalized_refuge:
+                del normalized_refuge['cap_ete']
+            if 'cap_hiver' in normalized_refuge:
+                del normalized_refuge['cap_hiver']
+                
+            normalized_refuge['places'] = places
+            
+            # Detectar casos especials per a la verificació
+            if (cap_ete and cap_ete not in ['', ' ', '0']) or (cap_hiver and cap_hiver not in ['', ' ', '0']):
+                if len(find_numbers(cap_ete)) + len(find_numbers(cap_hiver)) > 2:  # Més de 2 números
+                    stats['casos_especials'].append({
+                        'nom': refuge.get('name', 'Unknown'),
+                        'cap_ete': cap_ete,
+                        'cap_hiver': cap_hiver,
+                        'places_calculat': places
+                    })
+            
+            yield normalized_refuge
+            
+            # Mostrar progrés cada 100 refugis
+            if (i + 1) % 100 == 0:
+                print(f"Processat {i + 1} refugis...")
     
-    # Guardar el resultat
-    print(f"Guardant el resultat a {output_file}...")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(normalized_refuges, f, ensure_ascii=False, indent=2)
+    # Llegir, normalitzar i guardar els refugis d'un en un
+    print(f"Processant {input_file} i guardant el resultat a {output_file}...")
+    write_refuges(output_file, normalize_refuges(iter_refuges(input_file)), indent=2)
     
     # Mostrar estadístiques
     print("\n" + "="*60)
@@ -176,8 +127,8 @@ def refusPyrenees_merged_filtered_normalized():
     
     print(f"\nFitxer guardat amb èxit: {output_file}")
     
-    # Verificacions adicionals
-    verify_normalization(normalized_refuges)
+    # Verificacions adicionals (tornant a llegir el resultat en streaming)
+    verify_normalization(iter_refuges(output_file))
 
 def verify_normalization(refuges):
     """
@@ -189,8 +140,13 @@ def verify_normalization(refuges):
     
     altitude_issues = []
     places_issues = []
+    places_distribution = {}
+    null_places = 0
+    total = 0
     
+    # Una sola passada: els refugis poden venir d'un iterador
     for refuge in refuges:
+        total += 1
         name = refuge.get('name', 'Unknown')
         
         # Verificar altitude
@@ -202,6 +158,12 @@ def verify_normalization(refuges):
         places = refuge.get('places')
         if places is not None and (not isinstance(places, int) or places < 0):
             places_issues.append(f"{name}: places={places}")
+        
+        # Distribució de places
+        if places is None:
+            null_places += 1
+        else:
+            places_distribution[places] = places_distribution.get(places, 0) + 1
     
     print(f"Problemes amb altitude: {len(altitude_issues)}")
     if altitude_issues[:5]:  # Mostrar només els primers 5
@@ -214,19 +176,9 @@ def verify_normalization(refuges):
             print(f"  - {issue}")
     
     # Mostrar distribució de places
-    places_distribution = {}
-    null_places = 0
-    
-    for refuge in refuges:
-        places = refuge.get('places')
-        if places is None:
-            null_places += 1
-        else:
-            places_distribution[places] = places_distribution.get(places, 0) + 1
-    
     print(f"\nDistribució de places:")
     print(f"  Places null: {null_places}")
-    print(f"  Places amb valor: {len(refuges) - null_places}")
+    print(f"  Places amb valor: {total - null_places}")
     
     # Mostrar les places més comunes
     sorted_places = sorted(places_distribution.items(), key=lambda x: x[1], reverse=True)
@@ -242,30 +194,6 @@ def test_edge_cases():
     print("TESTANT CASOS ESPECIALS")
     print("="*60)
     
-    def extract_max_number_from_string(text: str) -> Optional[int]:
-        if not text or text.strip() == '':
-            return None
-            
-        text = text.strip().lower()
-        
-        if text == '0':
-            return 0
-            
-        negative_words = ['non', 'nada', 'néant', 'rien']
-        if any(word in text for word in negative_words):
-            return 0
-            
-        numbers = re.findall(r'\d+', text)
-        
-        if not numbers:
-            return None
-            
-        try:
-            int_numbers = [int(num) for num in numbers]
-            return max(int_numbers)
-        except ValueError:
-            return None
-    
     # Casos de test basats en l'anàlisi
     test_cases = [
         ('3 4', 4),
@@ -295,7 +223,7 @@ def test_edge_cases():
     
     errors = 0
     for input_text, expected in test_cases:
-        result = extract_max_number_from_string(input_text)
+        result = max_number(input_text)
         if result != expected:
             print(f"ERROR: '{input_text}' → {result} (esperat: {expected})")
             errors += 1
@@ -313,4 +241,5 @@ if __name__ == "__main__":
         print("\n✅ Tots els tests han passat. Procedint amb la normalització...")
         refusPyrenees_merged_filtered_normalized()
     else:
-        print("\n❌ Hi ha errors en els tests. Revisa la implementació.")
\ No newline at end of file
+        print("\n❌ Hi ha errors en els tests. Revisa la implementació.")
+        sys.exit(1)
\ No newline at end of file
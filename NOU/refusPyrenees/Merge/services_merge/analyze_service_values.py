@@ -2,8 +2,40 @@
 # -*- coding: utf-8 -*-
 
 import json
+import os
+import sys
 from collections import defaultdict
 
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.columnar import NULL, OTHER, RefugeColumns
+
+def count_values(column):
+    """
+    Compta els valors d'una columna categòrica agrupats per str(valor), amb
+    None com a string buit. Retorna {valor: comptador} en ordre de primera aparició.
+    """
+    kind = column.kind
+    counts = column.counts()
+    # Fila de la primera aparició de cada categoria, per mantenir l'ordre original
+    coded = np.flatnonzero(column.codes >= 0)
+    codes, first_index = np.unique(column.codes[coded], return_index=True)
+    first_row = np.empty(len(column.categories), dtype=np.int64)
+    first_row[codes] = coded[first_index]
+
+    entries = [(first_row[code], str(list(category) if isinstance(category, tuple) else category), int(counts[code]))
+               for code, category in enumerate(column.categories)]
+    null_rows = np.flatnonzero(kind == NULL)
+    if len(null_rows):
+        entries.append((null_rows[0], "", len(null_rows)))
+    entries.extend((row, str(column.other[row]), 1) for row in np.flatnonzero(kind == OTHER))
+
+    values = defaultdict(int)
+    for _, value, count in sorted(entries, key=lambda entry: entry[0]):
+        values[value] += count
+    return values
+
 def analyze_service_values(json_file_path, output_file_path):
     """
     Analitza tots els valors dels paràmetres de serveis en el fitxer JSON
@@ -13,9 +45,6 @@ def analyze_service_values(json_file_path, output_file_path):
     # Paràmetres a analitzar
     parameters = ["cheminee", "bois", "eau", "couchage"]
     
-    # Diccionari per emmagatzemar els valors únics de cada paràmetre
-    values_dict = {param: defaultdict(int) for param in parameters}
-    
     try:
         # Llegir el fitxer JSON
         with open(json_file_path, 'r', encoding='utf-8') as f:
@@ -24,15 +53,11 @@ def analyze_service_values(json_file_path, output_file_path):
         total_refuges = len(data)
         print(f"Analitzant {total_refuges} refugis...")
         
-        # Analitzar cada refugi
-        for refuge in data:
-            for param in parameters:
-                if param in refuge:
-                    value = refuge[param]
-                    # Convertir None a string buit per consistència
-                    if value is None:
-                        value = ""
-                    values_dict[param][str(value)] += 1
+        # Analitzar cada paràmetre com una columna codificada per diccionari
+        # (None es compta com a string buit per consistència)
+        columns = RefugeColumns.from_refuges(data, categorical=parameters)
+        values_dict = {param: count_values(columns[param]) if param in columns else defaultdict(int)
+                       for param in parameters}
         
         # Escriure els resultats al fitxer de text
         with open(output_file_path, 'w', encoding='utf-8') as f:
@@ -1,155 +1,159 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
+import os
 import re
+import sys
 from collections import defaultdict
 
-def classify_couchage_values(json_file, output_file):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.classification_rules import ClassificationRules
+from common.json_stream import data_path, iter_refuges
+from common.keyword_classifier import KeywordClassifier
+
+# Grups de classificació
+COUCHAGE_GROUPS = {
+    "MATELAS": {
+        "keywords": ["matelas", "matelas", "mousse"],
+        "exclude_keywords": ["sans matelas", "sans matela", "pas de matelas"],
+        "description": "Valors que contenen informació sobre matalassos"
+    },
+    "BAS FLANCS": {
+        "keywords": ["bas flanc", "bas-flanc", "bat-flanc", "bas flancs", "bat flancs", "bat-flancs"],
+        "exclude_keywords": ["sans bas flanc", "pas de bas flanc"],
+        "description": "Valors que contenen informació sobre bat-flancs o bas-flancs"
+    },
+    "SOL/TERRE": {
+        "keywords": ["sol", "terre", "béton", "beton", "par terre", "au sol", "dalles", "plancher"],
+        "exclude_keywords": [],
+        "description": "Valors relacionats amb dormir al terra, sol o superfícies dures"
+    },
+    "LITS": {
+        "keywords": ["lit", "lits", "superposé", "superpose", "couchette", "sommier"],
+        "exclude_keywords": [],
+        "description": "Valors relacionats amb llits i estructures de dormir"
+    },
+    "MEZZANINE/ÉTAGE": {
+        "keywords": ["mezzanine", "étage", "etage", "grenier", "plancher", "en haut"],
+        "exclude_keywords": [],
+        "description": "Valors relacionats amb dormir en alçada o mezzanines"
+    },
+    "NÉGATIF": {
+        "keywords": ["non", "néant", "neant", "rien", "aucun", "négatif", "nada", "pas de"],
+        "exclude_keywords": [],
+        "description": "Valors que indiquen absència de couchage"
+    },
+    "NUMÉRIC": {
+        "keywords": [],
+        "exclude_keywords": [],
+        "description": "Valors purament numèrics",
+        "special": "numeric"
+    }
+}
+
+# Regles que llegeix refusPyrenees_finished_services.py i informe per revisar-les
+RULES_FILE = "classificacio_couchage.json"
+REPORT_FILE = "classificacio_couchage.txt"
+
+def classify_couchage_values(json_file):
     """
     Classifica els valors del camp COUCHAGE en grups i troba els refugis
-    que contenen cada valor.
+    que contenen cada valor. Retorna les regles (ClassificationRules).
     """
+    # Diccionari per emmagatzemar els valors i els refugis que els contenen
+    couchage_values = defaultdict(list)
     
-    try:
-        # Llegir el fitxer JSON original
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Diccionari per emmagatzemar els valors i els refugis que els contenen
-        couchage_values = defaultdict(list)
-        
-        # Recopilar tots els valors de couchage amb els noms dels refugis
-        for refuge in data:
-            couchage_value = refuge.get("couchage", "")
-            if couchage_value is None:
-                couchage_value = ""
-            refuge_name = refuge.get("name", "Nom desconegut")
-            couchage_values[str(couchage_value)].append(refuge_name)
-        
-        # Definir grups de classificació
-        groups = {
-            "MATELAS": {
-                "keywords": ["matelas", "matelas", "mousse"],
-                "exclude_keywords": ["sans matelas", "sans matela", "pas de matelas"],
-                "description": "Valors que contenen informació sobre matalassos"
-            },
-            "BAS FLANCS": {
-                "keywords": ["bas flanc", "bas-flanc", "bat-flanc", "bas flancs", "bat flancs", "bat-flancs"],
-                "exclude_keywords": ["sans bas flanc", "pas de bas flanc"],
-                "description": "Valors que contenen informació sobre bat-flancs o bas-flancs"
-            },
-            "SOL/TERRE": {
-                "keywords": ["sol", "terre", "béton", "beton", "par terre", "au sol", "dalles", "plancher"],
-                "exclude_keywords": [],
-                "description": "Valors relacionats amb dormir al terra, sol o superfícies dures"
-            },
-            "LITS": {
-                "keywords": ["lit", "lits", "superposé", "superpose", "couchette", "sommier"],
-                "exclude_keywords": [],
-                "description": "Valors relacionats amb llits i estructures de dormir"
-            },
-            "MEZZANINE/ÉTAGE": {
-                "keywords": ["mezzanine", "étage", "etage", "grenier", "plancher", "en haut"],
-                "exclude_keywords": [],
-                "description": "Valors relacionats amb dormir en alçada o mezzanines"
-            },
-            "NÉGATIF": {
-                "keywords": ["non", "néant", "neant", "rien", "aucun", "négatif", "nada", "pas de"],
-                "exclude_keywords": [],
-                "description": "Valors que indiquen absència de couchage"
-            },
-            "NUMÉRIC": {
-                "keywords": [],
-                "exclude_keywords": [],
-                "description": "Valors purament numèrics",
-                "special": "numeric"
-            }
-        }
-        
-        # Classificar cada valor en grups
-        classified_groups = {group_name: defaultdict(list) for group_name in groups.keys()}
-        
+    # Recopilar tots els valors de couchage amb els noms dels refugis (llegint-los d'un en un)
+    for refuge in iter_refuges(json_file):
+        couchage_value = refuge.get("couchage", "")
+        if couchage_value is None:
+            couchage_value = ""
+        refuge_name = refuge.get("name", "Nom desconegut")
+        couchage_values[str(couchage_value)].append(refuge_name)
+    
+    # Classificar cada valor en grups: totes les paraules clau i excloses dels
+    # grups es busquen alhora (una passada per valor diferent)
+    classifier = KeywordClassifier({group_name: group_info for group_name, group_info in COUCHAGE_GROUPS.items()
+                                    if group_info.get("special") != "numeric"})
+    
+    def classified():
         for couchage_value, refuge_names in couchage_values.items():
-            value_lower = couchage_value.lower()
+            value_groups = list(classifier.classify(couchage_value))
             
-            for group_name, group_info in groups.items():
-                if group_name == "NUMÉRIC":
-                    # Classificació especial per valors numèrics
-                    if couchage_value.strip().isdigit() or re.match(r'^\d+$', couchage_value.strip()):
-                        classified_groups[group_name][couchage_value].extend(refuge_names)
-                    continue
-                
-                # Comprovar paraules excloses
-                excluded = False
-                for exclude_word in group_info["exclude_keywords"]:
-                    if exclude_word.lower() in value_lower:
-                        excluded = True
-                        break
-                
-                if not excluded:
-                    # Comprovar paraules incloses
-                    for keyword in group_info["keywords"]:
-                        if keyword.lower() in value_lower:
-                            classified_groups[group_name][couchage_value].extend(refuge_names)
-                            break
+            # Classificació especial per valors numèrics
+            if couchage_value.strip().isdigit() or re.match(r'^\d+$', couchage_value.strip()):
+                value_groups.append("NUMÉRIC")
+            yield couchage_value, value_groups, refuge_names
+    
+    descriptions = {group_name: group_info["description"] for group_name, group_info in COUCHAGE_GROUPS.items()}
+    return ClassificationRules.build(descriptions, classified())
+
+def write_report(rules, output_file):
+    """Escriu l'informe de text de la classificació a partir de les regles"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("CLASSIFICACIÓ DELS VALORS DEL CAMP COUCHAGE\n")
+        f.write("=" * 60 + "\n\n")
         
-        # Escriure els resultats
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("CLASSIFICACIÓ DELS VALORS DEL CAMP COUCHAGE\n")
-            f.write("=" * 60 + "\n\n")
-            
-            for group_name, group_data in classified_groups.items():
-                if group_data:  # Només mostrar grups que tenen valors
-                    f.write(f"GRUP: {group_name}\n")
-                    f.write("-" * 40 + "\n")
-                    f.write(f"Descripció: {groups[group_name]['description']}\n")
-                    f.write(f"Total de valors diferents: {len(group_data)}\n\n")
+        for group in rules.groups:
+            group_data = sorted((entry["value"], entry["refuges"]) for entry in rules.group_values(group["name"]))
+            if group_data:  # Només mostrar grups que tenen valors
+                f.write(f"GRUP: {group['name']}\n")
+                f.write("-" * 40 + "\n")
+                f.write(f"Descripció: {group['description']}\n")
+                f.write(f"Total de valors diferents: {len(group_data)}\n\n")
+                
+                for i, (couchage_value, refuge_names) in enumerate(group_data, 1):
+                    display_value = couchage_value if couchage_value != "" else "[BUIT]"
+                    f.write(f"{i:2d}. VALOR: '{display_value}'\n")
+                    f.write(f"    Nombre de refugis: {len(refuge_names)}\n")
+                    f.write(f"    Refugis:\n")
                     
-                    for i, (couchage_value, refuge_names) in enumerate(sorted(group_data.items()), 1):
-                        display_value = couchage_value if couchage_value != "" else "[BUIT]"
-                        f.write(f"{i:2d}. VALOR: '{display_value}'\n")
-                        f.write(f"    Nombre de refugis: {len(refuge_names)}\n")
-                        f.write(f"    Refugis:\n")
-                        
-                        # Mostrar fins a 10 refugis per valor, ordenats alfabèticament
-                        sorted_refuges = sorted(set(refuge_names))
-                        for j, refuge_name in enumerate(sorted_refuges[:10]):
-                            f.write(f"      - {refuge_name}\n")
-                        
-                        if len(sorted_refuges) > 10:
-                            f.write(f"      ... i {len(sorted_refuges) - 10} refugis més\n")
-                        
-                        f.write("\n")
+                    # Mostrar fins a 10 refugis per valor, ordenats alfabèticament
+                    sorted_refuges = sorted(set(refuge_names))
+                    for j, refuge_name in enumerate(sorted_refuges[:10]):
+                        f.write(f"      - {refuge_name}\n")
                     
-                    f.write("=" * 60 + "\n\n")
-        
-        # Estadístiques generals
-        total_values = len(couchage_values)
-        total_refuges = sum(len(refuges) for refuges in couchage_values.values())
-        
-        print(f"Classificació completada!")
-        print(f"- Total de valors únics de couchage: {total_values}")
-        print(f"- Total de refugis analitzats: {total_refuges}")
-        print(f"- Grups creats: {len([g for g in classified_groups if classified_groups[g]])}")
-        print(f"- Fitxer guardat com: {output_file}")
-        
-        # Resum de grups
-        print("\nResum per grups:")
-        for group_name, group_data in classified_groups.items():
-            if group_data:
-                total_refuges_group = sum(len(refuges) for refuges in group_data.values())
-                print(f"- {group_name}: {len(group_data)} valors únics, {total_refuges_group} refugis")
-        
-    except FileNotFoundError:
-        print(f"Error: No s'ha trobat el fitxer {json_file}")
-    except json.JSONDecodeError:
-        print(f"Error: El fitxer {json_file} no és un JSON vàlid")
-    except Exception as e:
-        print(f"Error inesperat: {e}")
+                    if len(sorted_refuges) > 10:
+                        f.write(f"      ... i {len(sorted_refuges) - 10} refugis més\n")
+                    
+                    f.write("\n")
+                
+                f.write("=" * 60 + "\n\n")
+
+def print_summary(rules):
+    """Estadístiques generals i resum per grups"""
+    group_refuges = {group_name: [len(entry["refuges"]) for entry in rules.group_values(group_name)]
+                     for group_name in rules.group_names}
+    total_values = len(rules.values)
+    total_refuges = sum(len(entry["refuges"]) for entry in rules.values.values())
+    
+    print(f"Classificació completada!")
+    print(f"- Total de valors únics de couchage: {total_values}")
+    print(f"- Total de refugis analitzats: {total_refuges}")
+    print(f"- Grups creats: {len([g for g in group_refuges if group_refuges[g]])}")
+    print(f"- Regles guardades com: {RULES_FILE}")
+    print(f"- Informe guardat com: {REPORT_FILE}")
+    
+    # Resum de grups
+    print("\nResum per grups:")
+    for group_name, counts in group_refuges.items():
+        if counts:
+            print(f"- {group_name}: {len(counts)} valors únics, {sum(counts)} refugis")
 
 if __name__ == "__main__":
-    input_file = "refusPyrenees_finished.json"
-    output_file = "classificacio_couchage.txt"
+    input_file = data_path("refusPyrenees_finished.json")
     
-    classify_couchage_values(input_file, output_file)
\ No newline at end of file
+    try:
+        rules = classify_couchage_values(input_file)
+        rules.save(RULES_FILE)
+        write_report(rules, REPORT_FILE)
+        print_summary(rules)
+    except FileNotFoundError:
+        print(f"Error: No s'ha trobat el fitxer {input_file}")
+        sys.exit(1)
+    except ValueError:
+        print(f"Error: El fitxer {input_file} no és un JSON vàlid")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error inesperat: {e}")
+        sys.exit(1)
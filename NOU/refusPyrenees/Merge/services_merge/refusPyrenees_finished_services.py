@@ -2,228 +2,224 @@
 # -*- coding: utf-8 -*-
 
 import json
+import os
 import re
+import sys
+from collections import Counter
+from functools import lru_cache
 
-def parse_classification_file(classification_file):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common.classification_rules import ClassificationRules
+from common.json_stream import data_path, iter_refuges, write_refuges
+from common.keyword_classifier import KeywordMatcher
+
+# Regles de classificació dels valors de couchage (les escriu classify_couchage.py)
+CLASSIFICATION_RULES_FILE = "classificacio_couchage.json"
+
+# Grups de les regles que posen couchage a 0 i grups de llits (camp que activen)
+ZERO_COUCHAGE_GROUPS = frozenset(['SOL/TERRE', 'NÉGATIF'])
+BED_GROUP_FIELDS = {
+    'MATELAS': 'matelas',
+    'BAS FLANCS': 'bas_flancs',
+    'LITS': 'lits',
+    'MEZZANINE/ÉTAGE': 'mezzanine/etage',
+}
+
+def load_classification_rules(rules_file):
     """
-    Parseja el fitxer de classificació dels valors de couchage
-    i retorna un diccionari amb els noms dels refugis agrupats per categoria
+    Carrega les regles de classificació dels valors de couchage
+    (valor -> grups). Retorna None si no es poden llegir.
     """
-    groups = {
-        'MATELAS': set(),
-        'BAS FLANCS': set(),
-        'SOL/TERRE': set(),
-        'LITS': set(),
-        'MEZZANINE/ÉTAGE': set(),
-        'NÉGATIF': set(),
-        'NUMÉRIC': set(),
-        'NUMÉRIC_0': set()  # Grup especial per als valors numèrics "0"
-    }
-    
     try:
-        with open(classification_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        current_group = None
-        current_valor = None
-        in_refugis_section = False
-        
-        lines = content.split('\n')
-        for line in lines:
-            line = line.strip()
-            
-            # Detectar grup actual
-            if line.startswith('GRUP: '):
-                current_group = line.replace('GRUP: ', '').strip()
-                in_refugis_section = False
-                continue
-            
-            # Detectar valor actual
-            if line.startswith('VALOR: '):
-                current_valor = line.split("'")[1] if "'" in line else ""
-                in_refugis_section = False
-                continue
-            
-            # Detectar inici de secció de refugis
-            if line == 'Refugis:':
-                in_refugis_section = True
-                continue
-            
-            # Processar noms de refugis
-            if in_refugis_section and line.startswith('- '):
-                refuge_name = line[2:].strip()  # Eliminar "- "
-                if current_group and refuge_name:
-                    groups[current_group].add(refuge_name)
-                    
-                    # Afegir també al grup especial NUMÉRIC_0 si correspon
-                    if current_group == 'NUMÉRIC' and current_valor == '0':
-                        groups['NUMÉRIC_0'].add(refuge_name)
-            
-            # Finalitzar secció de refugis si trobem línies que no són refugis
-            elif in_refugis_section and line and not line.startswith('- ') and not line.startswith('      '):
-                # Línies com "... i 14 refugis més" ens fan sortir de la secció de refugis
-                in_refugis_section = False
-        
-        # Convertir sets a llistes per facilitar la depuració
-        for group in groups:
-            groups[group] = list(groups[group])
-        
-        print(f"Grups processats des del fitxer de classificació:")
-        for group, refuges in groups.items():
-            print(f"- {group}: {len(refuges)} refugis")
-        
-        return groups
-        
+        rules = ClassificationRules.load(rules_file)
     except FileNotFoundError:
-        print(f"Error: No s'ha trobat el fitxer {classification_file}")
-        return {}
-    except Exception as e:
+        print(f"Error: No s'ha trobat el fitxer {rules_file}")
+        return None
+    except ValueError as e:
         print(f"Error processant el fitxer de classificació: {e}")
-        return {}
+        return None
+    
+    print(f"Regles carregades des del fitxer de classificació:")
+    for group_name in rules.group_names:
+        entries = list(rules.group_values(group_name))
+        print(f"- {group_name}: {len(entries)} valors, {sum(len(entry['refuges']) for entry in entries)} refugis")
+    
+    return rules
+
+# Camps de serveis que es binaritzen a partir del seu valor
+SERVICE_FIELDS = ("cheminee", "bois", "eau")
+
+# Valors que han de ser 0 per cada camp
+ZERO_VALUES = {
+    "cheminee": frozenset(["", "Non", "non"]),
+    "bois": frozenset(["", "Non", "non", "?", "à apporter", "Pas de bois à proximité"]),
+    "eau": frozenset(["", "Non", "non", "?", "Pas de source ", "Pas à proximité immédiate", "Non. "]),
+}
+
+# Valors d'eau que necessiten info_eau
+EAU_INFO_VALUES = frozenset([
+    "A la source distante de 100 m ",
+    "abreuvoir (eau captée) en contrebas",
+    "Source sous la cabane près du ",
+    "ruisseau à proximité ",
+    "Oui + source à proximité",
+    "source en amont",
+    "Source à 5min difficilement tr",
+    "Torrent à proximité",
+    "15min",
+    "Source à environ 500m au sud sur le GR",
+    "sí, a 160m",
+    "Ruisseau proche",
+    "A proximité ",
+    "pas en hiver. ",
+    "Source captée à 5mn vers l'Est",
+    "Oui mais le robinet à l'intéri",
+    "Torrent"
+])
+
+# Diccionari de valors: cada valor diferent i com s'ha classificat (per revisar-lo)
+VALUE_DICTIONARY_FILE = "diccionari_valors_serveis.json"
 
-def process_services(input_file, output_file):
+def classify_service_value(field, value):
+    """
+    Classifica un valor d'un camp de serveis (cheminee, bois o eau).
+    Retorna els camps que en resulten: {camp: 0 o 1} i, per a l'eau,
+    "info_eau": True si el text original s'ha de conservar a info_eau.
+    """
+    classification = {field: 0 if value in ZERO_VALUES[field] else 1}
+    if field == "eau" and classification[field] == 1 and value in EAU_INFO_VALUES:
+        classification["info_eau"] = True
+    return classification
+
+def build_value_dictionary(refuges, rules=None):
+    """
+    Recull els valors diferents de cada camp de serveis (i de couchage, si hi
+    ha regles) i classifica cada valor un sol cop. Els valors de couchage
+    guarden la classificació que s'hi aplica (classify_couchage_with_rules).
+    Retorna {camp: {valor: classificació}} i {camp: Counter(valor -> nombre de refugis)}.
+    """
+    fields = SERVICE_FIELDS + ("couchage",) if rules is not None else SERVICE_FIELDS
+    counts = {field: Counter() for field in fields}
+    for refuge in refuges:
+        for field, field_counts in counts.items():
+            field_counts[refuge.get(field, "")] += 1
+    
+    value_dictionary = {field: {value: classify_service_value(field, value) for value in counts[field]}
+                        for field in SERVICE_FIELDS}
+    if rules is not None:
+        value_dictionary["couchage"] = {value: classify_couchage_with_rules(value, rules)
+                                        for value in counts["couchage"]}
+    return value_dictionary, counts
+
+def save_value_dictionary(value_dictionary, counts, output_file):
+    """
+    Escriu el diccionari de valors: per cada camp, cada valor diferent amb el
+    nombre de refugis que el tenen i la classificació que se li aplica
+    (de més a menys refugis). Per al couchage, "source" indica si la
+    classificació ve de les regles de classify_couchage.py o dels patrons
+    per valor (classify_couchage_value).
+    """
+    dictionary = {}
+    for field, field_counts in counts.items():
+        entries = []
+        for value, count in field_counts.most_common():
+            entries.append({"value": value, "refuges": count, **value_dictionary[field][value]})
+        dictionary[field] = entries
+    
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(dictionary, f, ensure_ascii=False, indent=2)
+
+def process_services(refuges, stats, value_dictionary):
     """
     Processa els serveis dels refugis segons les especificacions:
     - Normalitza els valors de cheminee, bois i eau a 0 o 1
     - Afegeix info_eau quan sigui necessari
     - Mou tots els camps de serveis a "info_comp"
     - Elimina els camps originals del nivell principal
+    Els valors es classifiquen amb el diccionari de build_value_dictionary
+    (un valor que no hi sigui es classifica en aquell moment).
+    Rep i retorna un iterador de refugis (es processen d'un en un) i acumula
+    les estadístiques a stats (vegeu new_services_stats).
     """
     
-    # Valors que han de ser 0 per cada camp
-    cheminee_zero_values = ["", "Non", "non"]
-    bois_zero_values = ["", "Non", "non", "?", "à apporter", "Pas de bois à proximité"]
-    eau_zero_values = ["", "Non", "non", "?", "Pas de source ", "Pas à proximité immédiate", "Non. "]
-    
-    # Valors d'eau que necessiten info_eau
-    eau_info_values = [
-        "A la source distante de 100 m ",
-        "abreuvoir (eau captée) en contrebas",
-        "Source sous la cabane près du ",
-        "ruisseau à proximité ",
-        "Oui + source à proximité",
-        "source en amont",
-        "Source à 5min difficilement tr",
-        "Torrent à proximité",
-        "15min",
-        "Source à environ 500m au sud sur le GR",
-        "sí, a 160m",
-        "Ruisseau proche",
-        "A proximité ",
-        "pas en hiver. ",
-        "Source captée à 5mn vers l'Est",
-        "Oui mais le robinet à l'intéri",
-        "Torrent"
-    ]
-    
-    try:
-        # Llegir el fitxer JSON d'entrada
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        processed_count = 0
-        info_eau_count = 0
-        
-        # Processar cada refugi
-        for refuge in data:
-            # Obtenir els valors originals
-            cheminee_original = refuge.get("cheminee", "")
-            bois_original = refuge.get("bois", "")
-            eau_original = refuge.get("eau", "")
-            couchage_original = refuge.get("couchage", "")
-            
-            # Processar cheminee
-            if cheminee_original in cheminee_zero_values:
-                cheminee_processed = 0
-            else:
-                cheminee_processed = 1
-            
-            # Processar bois
-            if bois_original in bois_zero_values:
-                bois_processed = 0
-            else:
-                bois_processed = 1
+    # Processar cada refugi
+    for refuge in refuges:
+        # Obtenir els valors originals i la seva classificació
+        info_comp = {}
+        for field in SERVICE_FIELDS:
+            value = refuge.get(field, "")
+            classification = value_dictionary[field].get(value)
+            if classification is None:
+                classification = value_dictionary[field][value] = classify_service_value(field, value)
+            info_comp[field] = classification[field]
             
-            # Processar eau
-            if eau_original in eau_zero_values:
-                eau_processed = 0
-            else:
-                eau_processed = 1
-                # Afegir info_eau si el valor està en la llista específica
-                if eau_original in eau_info_values:
-                    refuge["info_eau"] = eau_original
-                    info_eau_count += 1
-            
-            # Crear el camp info_comp amb els valors processats
-            refuge["info_comp"] = {
-                "cheminee": cheminee_processed,
-                "bois": bois_processed,
-                "eau": eau_processed,
-                "couchage": couchage_original  # No es toca
-            }
-            
-            # Eliminar els camps originals del nivell principal
-            if "cheminee" in refuge:
-                del refuge["cheminee"]
-            if "bois" in refuge:
-                del refuge["bois"]
-            if "eau" in refuge:
-                del refuge["eau"]
-            if "couchage" in refuge:
-                del refuge["couchage"]
-            
-            processed_count += 1
+            # Afegir info_eau si el valor està en la llista específica
+            if classification.get("info_eau"):
+                refuge["info_eau"] = value
+                stats['info_eau'] += 1
         
-        # Guardar el resultat
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # Crear el camp info_comp amb els valors processats
+        info_comp["couchage"] = refuge.get("couchage", "")  # No es toca
+        refuge["info_comp"] = info_comp
         
-        print(f"Processament completat!")
-        print(f"- Refugis processats: {processed_count}")
-        print(f"- Refugis amb info_eau: {info_eau_count}")
-        print(f"- Fitxer guardat com: {output_file}")
+        # Eliminar els camps originals del nivell principal
+        for field in SERVICE_FIELDS + ("couchage",):
+            if field in refuge:
+                del refuge[field]
         
         # Estadístiques dels valors normalitzats
-        cheminee_1 = sum(1 for r in data if r.get("info_comp", {}).get("cheminee") == 1)
-        cheminee_0 = sum(1 for r in data if r.get("info_comp", {}).get("cheminee") == 0)
-        bois_1 = sum(1 for r in data if r.get("info_comp", {}).get("bois") == 1)
-        bois_0 = sum(1 for r in data if r.get("info_comp", {}).get("bois") == 0)
-        eau_1 = sum(1 for r in data if r.get("info_comp", {}).get("eau") == 1)
-        eau_0 = sum(1 for r in data if r.get("info_comp", {}).get("eau") == 0)
+        for field in SERVICE_FIELDS:
+            stats[f"{field}_{info_comp[field]}"] += 1
+        stats['processed'] += 1
         
-        print("\nEstadístiques:")
-        print(f"- Cheminee: {cheminee_1} (Sí), {cheminee_0} (No)")
-        print(f"- Bois: {bois_1} (Sí), {bois_0} (No)")
-        print(f"- Eau: {eau_1} (Sí), {eau_0} (No)")
-        print(f"- Tots els camps de serveis moguts a 'info_comp'")
-        
-    except FileNotFoundError:
-        print(f"Error: No s'ha trobat el fitxer {input_file}")
-    except json.JSONDecodeError:
-        print(f"Error: El fitxer {input_file} no és un JSON vàlid")
-    except Exception as e:
-        print(f"Error inesperat: {e}")
+        yield refuge
+
+def new_services_stats():
+    """Comptadors que omple process_services"""
+    return {'processed': 0, 'info_eau': 0,
+            'cheminee_0': 0, 'cheminee_1': 0, 'bois_0': 0, 'bois_1': 0, 'eau_0': 0, 'eau_1': 0}
+
+def print_services_stats(stats, output_file):
+    """Mostra el resum de process_services un cop s'han escrit tots els refugis"""
+    print(f"Processament completat!")
+    print(f"- Refugis processats: {stats['processed']}")
+    print(f"- Refugis amb info_eau: {stats['info_eau']}")
+    print(f"- Fitxer guardat com: {output_file}")
+    
+    print("\nEstadístiques:")
+    print(f"- Cheminee: {stats['cheminee_1']} (Sí), {stats['cheminee_0']} (No)")
+    print(f"- Bois: {stats['bois_1']} (Sí), {stats['bois_0']} (No)")
+    print(f"- Eau: {stats['eau_1']} (Sí), {stats['eau_0']} (No)")
+    print(f"- Tots els camps de serveis moguts a 'info_comp'")
 
+# Patrons per identificar cada grup, compilats en un sol autòmat (una passada per valor)
+COUCHAGE_MATCHER = KeywordMatcher({
+    'matelas': ['matelas', 'mousse'],
+    'bas_flancs': ['bas flanc', 'bat-flanc', 'bat flanc', 'bas-flanc'],
+    'lits': ['lit', 'sommier', 'couchette', 'superpos'],
+    'mezzanine': ['mezzanine', 'étage', 'etage', 'plancher'],
+    # Patrons negatius
+    'negatif': ['non', 'rien', 'néant', 'neant', 'pas de', 'aucun', 'négatif'],
+    'sol_terre': ['sol', 'terre', 'béton', 'beton', 'par terre', 'plancher', 'dalle'],
+    # Paraules que matisen els patrons anteriors
+    'mais': ['mais', 'but'],
+    'sans': ['sans'],
+    'sans_matelas': ['matelas'],
+    'pas_de': ['pas de'],
+})
+
+@lru_cache(maxsize=None)
 def classify_couchage_value(couchage_value):
     """
     Classifica un valor de couchage segons les paraules clau i patrons
     Retorna una tupla (couchage_binary, matelas, bas_flancs, lits, mezzanine, group)
+    El resultat es guarda per a cada valor diferent.
     """
     if not couchage_value or couchage_value.strip() == "":
         return 0, 0, 0, 0, 0, "EMPTY"
     
     value_lower = couchage_value.lower().strip()
     
-    # Patrons per identificar cada grup
-    matelas_patterns = ['matelas', 'mousse']
-    bas_flancs_patterns = ['bas flanc', 'bat-flanc', 'bat flanc', 'bas-flanc']
-    lits_patterns = ['lit', 'sommier', 'couchette', 'superpos']
-    mezzanine_patterns = ['mezzanine', 'étage', 'etage', 'plancher']
-    
-    # Patrons negatius
-    negatif_patterns = ['non', 'rien', 'néant', 'neant', 'pas de', 'aucun', 'négatif']
-    sol_terre_patterns = ['sol', 'terre', 'béton', 'beton', 'par terre', 'plancher', 'dalle']
-    
     # Verificar si és numèric
     try:
         num_value = int(value_lower)
@@ -234,40 +230,26 @@ def classify_couchage_value(couchage_value):
     except ValueError:
         pass
     
+    found = COUCHAGE_MATCHER.labels(value_lower)
+    
     # Verificar patrons negatius primer
-    if any(pattern in value_lower for pattern in negatif_patterns):
+    if 'negatif' in found:
         # Verificar si no és una excepció com "non mais..."
-        if not ('mais' in value_lower or 'but' in value_lower):
+        if 'mais' not in found:
             return 0, 0, 0, 0, 0, "NÉGATIF"
     
-    # Inicialitzar camps binaris
-    matelas = 0
-    bas_flancs = 0
-    lits = 0
-    mezzanine = 0
-    
     # Verificar cada tipus d'equipament
-    if any(pattern in value_lower for pattern in matelas_patterns):
-        # Assegurar-se que no és "sans matelas"
-        if not ('sans' in value_lower and 'matelas' in value_lower):
-            matelas = 1
-    
-    if any(pattern in value_lower for pattern in bas_flancs_patterns):
-        # Assegurar-se que no és "pas de bat-flanc"
-        if not ('pas de' in value_lower or 'sans' in value_lower):
-            bas_flancs = 1
-    
-    if any(pattern in value_lower for pattern in lits_patterns):
-        lits = 1
-    
-    if any(pattern in value_lower for pattern in mezzanine_patterns):
-        mezzanine = 1
+    # (assegurant-se que no és "sans matelas" ni "pas de bat-flanc")
+    matelas = int('matelas' in found and not ('sans' in found and 'sans_matelas' in found))
+    bas_flancs = int('bas_flancs' in found and not ('pas_de' in found or 'sans' in found))
+    lits = int('lits' in found)
+    mezzanine = int('mezzanine' in found)
     
     # Determinar el valor binari de couchage
     if matelas or bas_flancs or lits or mezzanine:
         couchage_binary = 1
         group = "CLASSIFIED"
-    elif any(pattern in value_lower for pattern in sol_terre_patterns):
+    elif 'sol_terre' in found:
         couchage_binary = 0
         group = "SOL/TERRE"
     else:
@@ -277,24 +259,55 @@ def classify_couchage_value(couchage_value):
     
     return couchage_binary, matelas, bas_flancs, lits, mezzanine, group
 
-def process_couchage_classification(data, classification_groups):
+def classify_couchage_with_rules(couchage_value, rules):
+    """
+    Classificació que s'aplica a un valor de couchage (estratègia híbrida):
+    1. Les regles de classify_couchage.py (prioritàries): un grup de
+       ZERO_COUCHAGE_GROUPS dona couchage 0 i un de BED_GROUP_FIELDS, 1.
+    2. Si les regles no el classifiquen, classify_couchage_value.
+    3. Un valor buit es queda amb couchage 0.
+    Retorna {"couchage", "matelas", "bas_flancs", "lits", "mezzanine/etage",
+    "group", "source" ("regles", "valor" o "buit"), "info_couchage"}, on
+    info_couchage indica si el text original es guarda a info_couchage.
+    """
+    groups = rules.groups_of(str(couchage_value))
+    group_set = frozenset(groups)
+    
+    if group_set & ZERO_COUCHAGE_GROUPS:
+        couchage_bin, source, info_couchage = 0, "regles", False
+    elif group_set & BED_GROUP_FIELDS.keys():
+        couchage_bin, source, info_couchage = 1, "regles", bool(couchage_value)
+    elif couchage_value:
+        couchage_bin, matelas, bas_flancs, lits, mezzanine, group = classify_couchage_value(couchage_value)
+        return {"couchage": couchage_bin, "matelas": matelas, "bas_flancs": bas_flancs, "lits": lits,
+                "mezzanine/etage": mezzanine, "group": group, "source": "valor",
+                "info_couchage": couchage_bin == 1 and bool(couchage_value.strip())}
+    else:
+        couchage_bin, source, info_couchage = 0, "buit", False
+    
+    classification = {"couchage": couchage_bin}
+    for group_name, field in BED_GROUP_FIELDS.items():
+        classification[field] = int(group_name in group_set)
+    classification.update(group=", ".join(groups), source=source, info_couchage=info_couchage)
+    return classification
+
+def process_couchage_classification(refuges, rules, couchage_values=None):
     """
     Processa els camps de couchage segons la classificació:
     - Crea camps nous: matelas, bas_flancs, lits, mezzanine/etage
     - Modifica el valor de couchage segons els grups
     - Crea info_couchage quan correspon
+    rules són les regles de classify_couchage.py (valor -> grups).
+    couchage_values és la classificació per valor ja calculada (el camp
+    "couchage" de build_value_dictionary); els valors que no hi siguin es
+    classifiquen amb classify_couchage_with_rules.
+    Rep i retorna un iterador de refugis; el resum es mostra en acabar.
     """
     
     processed_count = 0
     info_couchage_count = 0
-    
-    # Crear mapes de noms de refugis per a cada grup (dels que tenim)
-    matelas_refuges = set(classification_groups.get('MATELAS', []))
-    bas_flancs_refuges = set(classification_groups.get('BAS FLANCS', []))
-    lits_refuges = set(classification_groups.get('LITS', []))
-    mezzanine_refuges = set(classification_groups.get('MEZZANINE/ÉTAGE', []))
-    sol_terre_refuges = set(classification_groups.get('SOL/TERRE', []))
-    negatif_refuges = set(classification_groups.get('NÉGATIF', []))
+    if couchage_values is None:
+        couchage_values = {}
     
     # Estadístiques per grup
     stats = {
@@ -305,79 +318,33 @@ def process_couchage_classification(data, classification_groups):
         'lits_1': 0,
         'mezzanine_1': 0,
         'info_couchage': 0,
-        'classified_by_name': 0,
+        'classified_by_rules': 0,
         'classified_by_value': 0
     }
     
     print(f"\nProcessant classificació de couchage:")
-    print(f"- Refugis coneguts amb matelas: {len(matelas_refuges)}")
-    print(f"- Refugis coneguts amb bas_flancs: {len(bas_flancs_refuges)}")
-    print(f"- Refugis coneguts amb lits: {len(lits_refuges)}")
-    print(f"- Refugis coneguts amb mezzanine: {len(mezzanine_refuges)}")
+    for group_name, field in BED_GROUP_FIELDS.items():
+        print(f"- Valors coneguts amb {field}: {sum(1 for _ in rules.group_values(group_name))}")
     
-    for refuge in data:
-        refuge_name = refuge.get("name", "").strip()
-        
-        # Obtenir el valor actual de couchage
+    for refuge in refuges:
+        # Obtenir el valor actual de couchage i la classificació que li correspon
         current_couchage = refuge.get("info_comp", {}).get("couchage", "")
+        classification = couchage_values.get(current_couchage)
+        if classification is None:
+            classification = couchage_values[current_couchage] = classify_couchage_with_rules(current_couchage, rules)
         
-        # Estratègia híbrida: primer per nom, després per valor
-        classified_by_name = False
-        
-        # Inicialitzar camps
-        new_fields = {
-            "matelas": 0,
-            "bas_flancs": 0,
-            "lits": 0,
-            "mezzanine/etage": 0
-        }
-        
-        # 1. Classificació per nom del refugi (prioritària)
-        new_couchage_value = None
-        
-        if refuge_name in sol_terre_refuges or refuge_name in negatif_refuges:
-            new_couchage_value = 0
-            classified_by_name = True
-            stats['classified_by_name'] += 1
-        elif refuge_name in (matelas_refuges | bas_flancs_refuges | lits_refuges | mezzanine_refuges):
-            new_couchage_value = 1
-            classified_by_name = True
-            stats['classified_by_name'] += 1
-            if current_couchage:
-                refuge["info_couchage"] = current_couchage
-                info_couchage_count += 1
-                stats['info_couchage'] += 1
-        
-        # Assignar camps específics per nom
-        if refuge_name in matelas_refuges:
-            new_fields["matelas"] = 1
-        if refuge_name in bas_flancs_refuges:
-            new_fields["bas_flancs"] = 1
-        if refuge_name in lits_refuges:
-            new_fields["lits"] = 1
-        if refuge_name in mezzanine_refuges:
-            new_fields["mezzanine/etage"] = 1
-        
-        # 2. Si no s'ha classificat per nom, usar classificació per valor
-        if not classified_by_name and current_couchage:
-            couchage_bin, matelas_val, bas_flancs_val, lits_val, mezzanine_val, group = classify_couchage_value(current_couchage)
-            
-            new_couchage_value = couchage_bin
-            new_fields["matelas"] = matelas_val
-            new_fields["bas_flancs"] = bas_flancs_val
-            new_fields["lits"] = lits_val
-            new_fields["mezzanine/etage"] = mezzanine_val
-            
+        if classification["source"] == "regles":
+            stats['classified_by_rules'] += 1
+        elif classification["source"] == "valor":
             stats['classified_by_value'] += 1
-            
-            if couchage_bin == 1 and current_couchage.strip():
-                refuge["info_couchage"] = current_couchage
-                info_couchage_count += 1
-                stats['info_couchage'] += 1
         
-        # 3. Si no hi ha valor de couchage, mantenir valor original o assignar 0
-        if new_couchage_value is None:
-            new_couchage_value = current_couchage if current_couchage else 0
+        new_couchage_value = classification["couchage"]
+        new_fields = {field: classification[field] for field in BED_GROUP_FIELDS.values()}
+        
+        if classification["info_couchage"]:
+            refuge["info_couchage"] = current_couchage
+            info_couchage_count += 1
+            stats['info_couchage'] += 1
         
         # Actualitzar estadístiques
         if new_couchage_value == 0:
@@ -402,10 +369,11 @@ def process_couchage_classification(data, classification_groups):
         refuge["info_comp"].update(new_fields)
         
         processed_count += 1
+        yield refuge
     
     print(f"\nResultats del processament de couchage:")
     print(f"- Refugis processats: {processed_count}")
-    print(f"- Classificats per nom: {stats['classified_by_name']}")
+    print(f"- Classificats per les regles: {stats['classified_by_rules']}")
     print(f"- Classificats per valor: {stats['classified_by_value']}")
     print(f"- Refugis amb couchage = 0: {stats['couchage_0']}")
     print(f"- Refugis amb couchage = 1: {stats['couchage_1']}")
@@ -414,36 +382,41 @@ def process_couchage_classification(data, classification_groups):
     print(f"- Refugis amb lits = 1: {stats['lits_1']}")
     print(f"- Refugis amb mezzanine/etage = 1: {stats['mezzanine_1']}")
     print(f"- Refugis amb info_couchage: {stats['info_couchage']}")
-    
-    return processed_count, info_couchage_count
 
 if __name__ == "__main__":
-    input_file = "refusPyrenees_finished.json"
-    output_file = "refusPyrenees_finished_services.json"
-    classification_file = "classificacio_couchage.txt"
+    input_file = data_path("refusPyrenees_finished.json")
+    output_file = data_path("refusPyrenees_finished_services.json")
     
-    # Processar serveis bàsics
-    process_services(input_file, output_file)
+    # Carregar les regles de classificació de couchage
+    rules = load_classification_rules(CLASSIFICATION_RULES_FILE)
+    if rules is None:
+        print("No s'ha pogut carregar la classificació. Es manté el processament bàsic.")
     
-    # Carregar dades per processar couchage
+    # 1. Diccionari de valors: es classifica un sol cop cada valor diferent
+    # 2. Serveis bàsics i classificació de couchage en una sola passada: cada
+    #    refugi es llegeix, es processa i s'escriu abans de llegir el següent
+    services_stats = new_services_stats()
     try:
-        with open(output_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        value_dictionary, value_counts = build_value_dictionary(iter_refuges(input_file), rules)
+        save_value_dictionary(value_dictionary, value_counts, VALUE_DICTIONARY_FILE)
+        print(f"Diccionari de valors guardat com: {VALUE_DICTIONARY_FILE} "
+              f"({', '.join(f'{field}: {len(values)}' for field, values in value_counts.items())} valors diferents)")
         
-        # Carregar grups de classificació
-        classification_groups = parse_classification_file(classification_file)
-        
-        if classification_groups:
-            # Processar classificació de couchage
-            process_couchage_classification(data, classification_groups)
-            
-            # Guardar el resultat final
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            print(f"\nFitxer final guardat com: {output_file}")
-        else:
-            print("No s'ha pogut carregar la classificació. Es manté el processament bàsic.")
-            
+        refuges = process_services(iter_refuges(input_file), services_stats, value_dictionary)
+        if rules is not None:
+            refuges = process_couchage_classification(refuges, rules, value_dictionary["couchage"])
+        write_refuges(output_file, refuges, indent=2)
+    except FileNotFoundError:
+        print(f"Error: No s'ha trobat el fitxer {input_file}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error: El fitxer {input_file} no és un JSON vàlid ({e})")
+        sys.exit(1)
     except Exception as e:
-        print(f"Error processant la classificació de couchage: {e}")
+        print(f"Error inesperat: {e}")
+        sys.exit(1)
+    else:
+        print()
+        print_services_stats(services_stats, output_file)
+        if rules is not None:
+            print(f"\nFitxer final guardat com: {output_file}")
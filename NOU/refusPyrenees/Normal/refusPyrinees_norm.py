@@ -1,46 +1,52 @@
-import json
+import os
+import sys
+from collections import Counter
 
-# Read the GeoJSON file
-input_file = r"c:\Users\jordi\Desktop\UNI\TFG\INFO\NOU\refusPyrenees\Normal\refusPyrinees.geojson"
-output_file = r"c:\Users\jordi\Desktop\UNI\TFG\INFO\NOU\refusPyrenees\Normal\refusPyrinees_norm.json"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.json_stream import data_path, iter_refuges, write_refuges
 
-# Load the data
-with open(input_file, 'r', encoding='utf-8') as f:
-    geojson_data = json.load(f)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-print(f"Total de features originals: {len(geojson_data['features'])}")
+# Input GeoJSON file and output JSON array
+input_file = os.path.join(SCRIPT_DIR, "refusPyrinees.geojson")
+output_file = data_path(os.path.join(SCRIPT_DIR, "refusPyrinees_norm.json"))
 
-# Transform GeoJSON to JSON array
-json_array = []
-removed_count = 0
+def transform_features(features, stats):
+    """Transform GeoJSON features into refuges one at a time, counting them in stats"""
+    for feature in features:
+        stats['total'] += 1
+        
+        # Check if type_hebergement is "ruine" and skip if it is
+        if feature.get('type_hebergement') == 'ruine':
+            stats['removed'] += 1
+            print(f"Eliminat (ruine): {feature.get('name', 'sense nom')}")
+            continue
+        
+        # Create new feature object
+        new_feature = {}
+        
+        # Copy all properties except "photo"
+        for key, value in feature.items():
+            if key != 'photo':
+                new_feature[key] = value
+        
+        # Rename "type_hebergement" to "type"
+        if 'type_hebergement' in new_feature:
+            new_feature['type'] = new_feature.pop('type_hebergement')
+        
+        if stats['first'] is None:
+            stats['first'] = new_feature
+        stats['types'][new_feature.get('type', '')] += 1
+        yield new_feature
 
-for feature in geojson_data['features']:
-    # Check if type_hebergement is "ruine" and skip if it is
-    if feature.get('type_hebergement') == 'ruine':
-        removed_count += 1
-        print(f"Eliminat (ruine): {feature.get('name', 'sense nom')}")
-        continue
-    
-    # Create new feature object
-    new_feature = {}
-    
-    # Copy all properties except "photo"
-    for key, value in feature.items():
-        if key != 'photo':
-            new_feature[key] = value
-    
-    # Rename "type_hebergement" to "type"
-    if 'type_hebergement' in new_feature:
-        new_feature['type'] = new_feature.pop('type_hebergement')
-    
-    json_array.append(new_feature)
+# Transform GeoJSON to JSON array, streaming the features into the output file
+stats = {'total': 0, 'removed': 0, 'first': None, 'types': Counter()}
+kept_count = write_refuges(output_file, transform_features(iter_refuges(input_file, key='features'), stats), indent=4)
+removed_count = stats['removed']
 
+print(f"Total de features originals: {stats['total']}")
 print(f"Elements eliminats (ruine): {removed_count}")
-print(f"Elements restants: {len(json_array)}")
-
-# Save the transformed data as JSON array
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(json_array, f, ensure_ascii=False, indent=4)
+print(f"Elements restants: {kept_count}")
 
 print(f"\nFitxer creat: {output_file}")
 
@@ -52,18 +58,17 @@ print(f"3. Eliminació del camp 'photo': ✓")
 print(f"4. Canvi 'type_hebergement' → 'type': ✓")
 
 # Show sample of first transformed element
-if json_array:
+first = stats['first']
+if first is not None:
     print(f"\nMostra del primer element transformat:")
-    print(f"- Té coordenades: {'coordinates' in json_array[0]}")
-    print(f"- Té 'type': {'type' in json_array[0]}")
-    print(f"- NO té 'photo': {'photo' not in json_array[0]}")
-    print(f"- NO té 'type_hebergement': {'type_hebergement' not in json_array[0]}")
-    print(f"- Valor de 'type': {json_array[0].get('type', 'N/A')}")
+    print(f"- Té coordenades: {'coordinates' in first}")
+    print(f"- Té 'type': {'type' in first}")
+    print(f"- NO té 'photo': {'photo' not in first}")
+    print(f"- NO té 'type_hebergement': {'type_hebergement' not in first}")
+    print(f"- Valor de 'type': {first.get('type', 'N/A')}")
 
-# Count types in final result
-from collections import Counter
-types = [item.get('type', '') for item in json_array]
-type_counts = Counter(types)
+# Count types in final result (counted while streaming)
+type_counts = stats['types']
 
 print(f"\nTipus finals i nombre d'aparicions:")
 for type_name, count in sorted(type_counts.items(), key=lambda x: x[1], reverse=True):